@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Optional, Set, Tuple
+
+from knowledge_base import file_version
+from knowledge_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """الشكل الموحد للسؤال المستخدم كمفتاح للذاكرة المؤقتة"""
+    return ' '.join(tokenize(question))
+
+
+def char_ngrams(text: str, n: int = 3) -> FrozenSet[str]:
+    padded = f" {text} "
+    return frozenset(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+
+
+@dataclass
+class _Entry:
+    normalized: str
+    ngrams: FrozenSet[str]
+    answer: str
+    created: float
+    # توقيع الكيانات في السؤال الأصلي؛ None لمدخلات قديمة بلا توقيع (مطابقة تامة فقط)
+    entities: Optional[str] = None
+
+
+class AnswerCache:
+    """ذاكرة مؤقتة للإجابات بطبقتين (مطابقة تامة وتقريبية) مع تخزين دائم في SQLite
+
+    المطابقة التقريبية تُقبل فقط إذا أعاد entity_key نفس القيمة للسؤالين: سؤالان متطابقان
+    تقريباً عن جامعتين أو فصلين مختلفين لهما إجابتان مختلفتان.
+    """
+
+    def __init__(self, path: str, kb_path: str, max_entries: int = 5000, ttl: float = 7 * 86400,
+                 fuzzy_threshold: float = 0.85, entity_key: Optional[Callable[[str], str]] = None):
+        self.kb_path = kb_path
+        self.entity_key = entity_key or (lambda question: '')
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self.hits_exact = 0
+        self.hits_fuzzy = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._postings: Dict[str, Set[str]] = {}
+        self._kb_stat: Optional[Tuple[int, int]] = None
+        self.kb_version = ''
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS answers ('
+            'key TEXT PRIMARY KEY, kb_version TEXT, question TEXT, answer TEXT, '
+            'created REAL, last_access REAL, entities TEXT)'
+        )
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(answers)')}
+        if 'entities' not in columns:
+            self._db.execute('ALTER TABLE answers ADD COLUMN entities TEXT')
+        self._check_kb_version()
+        self._load()
+
+    def _key(self, normalized: str) -> str:
+        return hashlib.sha1(f"{self.kb_version}\n{normalized}".encode('utf-8')).hexdigest()
+
+    def _check_kb_version(self) -> None:
+        # فحص رخيص عبر stat؛ إعادة حساب البصمة فقط عند تغير الملف
+        st = os.stat(self.kb_path)
+        stat = (st.st_mtime_ns, st.st_size)
+        if stat == self._kb_stat:
+            return
+        self._kb_stat = stat
+        version = file_version(self.kb_path)
+        if version == self.kb_version:
+            return
+        if self.kb_version:
+            logger.info("تغيرت قاعدة المعرفة، تم إبطال الذاكرة المؤقتة للإجابات")
+        self.kb_version = version
+        self._entries.clear()
+        self._postings.clear()
+        with self._db:
+            self._db.execute('DELETE FROM answers WHERE kb_version != ?', (version,))
+
+    def _load(self) -> None:
+        cutoff = time.time() - self.ttl
+        with self._db:
+            self._db.execute('DELETE FROM answers WHERE created < ?', (cutoff,))
+        rows = self._db.execute(
+            'SELECT key, question, answer, created, entities FROM answers ORDER BY last_access DESC LIMIT ?',
+            (self.max_entries,),
+        ).fetchall()
+        for key, normalized, answer, created, entities in reversed(rows):
+            self._add(key, _Entry(normalized, char_ngrams(normalized), answer, created, entities))
+
+    def _add(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        for gram in entry.ngrams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for gram in entry.ngrams:
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _touch(self, key: str) -> None:
+        self._entries.move_to_end(key)
+        with self._db:
+            self._db.execute('UPDATE answers SET last_access = ? WHERE key = ?', (time.time(), key))
+
+    def _fuzzy_lookup(self, ngrams: FrozenSet[str], entities: str) -> Optional[str]:
+        # عدّ الـ n-grams المشتركة عبر الفهرس المعكوس بدلاً من مقارنة كل المدخلات
+        overlap: Counter = Counter()
+        for gram in ngrams:
+            overlap.update(self._postings.get(gram, ()))
+        best_key, best_score = None, 0.0
+        for key, shared in overlap.items():
+            entry = self._entries[key]
+            if entry.entities != entities:
+                continue
+            score = shared / math.sqrt(len(ngrams) * len(entry.ngrams))
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key if best_score >= self.fuzzy_threshold else None
+
+    def get(self, question: str) -> Optional[str]:
+        """البحث عن إجابة محفوظة لسؤال مطابق أو مشابه"""
+        self._check_kb_version()
+        normalized = normalize_question(question)
+        if not normalized:
+            self.misses += 1
+            return None
+        now = time.time()
+        key = self._key(normalized)
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.created <= self.ttl:
+            self.hits_exact += 1
+            self._touch(key)
+            return entry.answer
+        key = self._fuzzy_lookup(char_ngrams(normalized), self.entity_key(question))
+        if key is not None and now - self._entries[key].created <= self.ttl:
+            self.hits_fuzzy += 1
+            self._touch(key)
+            return self._entries[key].answer
+        self.misses += 1
+        return None
+
+    def put(self, question: str, answer: str) -> None:
+        """حفظ إجابة جديدة مع إخراج الأقدم استخداماً عند امتلاء الذاكرة"""
+        normalized = normalize_question(question)
+        if not normalized or not answer:
+            return
+        now = time.time()
+        key = self._key(normalized)
+        self._remove(key)
+        entities = self.entity_key(question)
+        self._add(key, _Entry(normalized, char_ngrams(normalized), answer, now, entities))
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            old_key = next(iter(self._entries))
+            self._remove(old_key)
+            evicted.append((old_key,))
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, self.kb_version, normalized, answer, now, now, entities),
+            )
+            if evicted:
+                self._db.executemany('DELETE FROM answers WHERE key = ?', evicted)
+
+    def stats(self) -> dict:
+        lookups = self.hits_exact + self.hits_fuzzy + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits_exact': self.hits_exact,
+            'hits_fuzzy': self.hits_fuzzy,
+            'misses': self.misses,
+            'hit_ratio': (self.hits_exact + self.hits_fuzzy) / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        self._db.close()
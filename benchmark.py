@@ -0,0 +1,460 @@
+"""قياس أداء البوت تحت الحمل باستخدام خوادم وهمية محلية
+
+يشغّل التطبيق الحقيقي (Application و ConversationHandler) ويرسل إليه تحديثات مصطنعة
+لآلاف المستخدمين، ثم يحفظ النتائج كملف JSON لمقارنتها بين الإصدارات.
+
+مثال:
+    python benchmark.py --users 2000 --concurrency 200 --telegram-latency 0.02 --output bench.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List
+
+from telegram import Update
+
+from fake_servers import FakeOpenAIServer, FakeTelegramServer, FakeWebhookServer, FakeWorksheet
+from metrics import UPDATES_SHED, LoopLagMonitor
+
+# وثيقة PDF صغيرة يرفعها كل طالب محاكى (نفس المحتوى فيُحفظ مرة واحدة على القرص)
+TRANSCRIPT_FILE_ID = 'transcript'
+TRANSCRIPT_PDF = b'%PDF-1.4\n' + b'0' * 32 * 1024 + b'\n%%EOF\n'
+
+QUESTIONS = [
+    'كم تكاليف الدراسة في ألمانيا؟',
+    'ما هي متطلبات اللغة في جامعة TUM؟',
+    'متى موعد التقديم في LMU؟',
+    'هل يمكن الحصول على منح دراسية؟',
+    'ما هي الوثائق المطلوبة للتقديم؟',
+    'كم مدة دراسة الماجستير؟',
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> dict:
+    """ملخص الزمن بالمللي ثانية"""
+    return {
+        'count': len(values),
+        'mean_ms': round(statistics.fmean(values) * 1000, 3) if values else 0.0,
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(max(values) * 1000, 3) if values else 0.0,
+    }
+
+
+class UpdateFactory:
+    """إنشاء تحديثات Telegram مصطنعة بنفس شكل ما يرسله Bot API"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._update_id = 0
+        self._message_id = 0
+
+    def _ids(self):
+        self._update_id += 1
+        self._message_id += 1
+        return self._update_id, self._message_id
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"طالب{user_id}"}
+
+    def message(self, user_id: int, text: str):
+        update_id, message_id = self._ids()
+        data = {
+            'update_id': update_id,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': self._user(user_id),
+                'text': text,
+            },
+        }
+        if text.startswith('/'):
+            data['message']['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return Update.de_json(data, self.bot)
+
+    def document(self, user_id: int, file_id: str, file_name: str, mime_type: str, size: int):
+        update_id, message_id = self._ids()
+        return Update.de_json({
+            'update_id': update_id,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': self._user(user_id),
+                'document': {'file_id': file_id, 'file_unique_id': file_id, 'file_name': file_name,
+                             'mime_type': mime_type, 'file_size': size},
+            },
+        }, self.bot)
+
+    def callback(self, user_id: int, data: str):
+        update_id, message_id = self._ids()
+        return Update.de_json({
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'from': self._user(user_id),
+                'message': {
+                    'message_id': message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'from': {'id': 999, 'is_bot': True, 'first_name': 'Glovuni'},
+                    'text': 'menu',
+                },
+            },
+        }, self.bot)
+
+
+def user_journey(factory: UpdateFactory, user_id: int, questions: int) -> list:
+    """مسار الطالب الكامل: الترحيب ثم الاستمارة ورفع وثيقة ثم أسئلة حرة"""
+    steps = [
+        ('start', factory.message(user_id, '/start')),
+        ('verify_instagram', factory.callback(user_id, 'verify_instagram')),
+        ('start_application', factory.callback(user_id, 'start_application')),
+        ('get_name', factory.message(user_id, f"طالب تجريبي {user_id}")),
+        ('get_email', factory.message(user_id, f"student{user_id}@example.com")),
+        ('get_phone', factory.message(user_id, f"+9627{user_id:08d}")),
+        ('get_field', factory.callback(user_id, 'field_it')),
+        ('receive_document', factory.document(user_id, TRANSCRIPT_FILE_ID, 'transcript.pdf',
+                                              'application/pdf', len(TRANSCRIPT_PDF))),
+        ('finish_uploads', factory.callback(user_id, 'done_uploads')),
+        ('confirm_submission', factory.callback(user_id, 'confirm_submission')),
+    ]
+    for i in range(questions):
+        steps.append(('ask_question', factory.callback(user_id, 'ask_question')))
+        steps.append(('handle_question', factory.message(user_id, QUESTIONS[(user_id + i) % len(QUESTIONS)])))
+    return steps
+
+
+def configure_environment(args, telegram: FakeTelegramServer, openai_server: FakeOpenAIServer,
+                          webhook: FakeWebhookServer) -> None:
+    # يجب ضبط البيئة قبل استيراد bot لأن الإعدادات تُقرأ عند الاستيراد
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': '123456:BENCHMARK',
+        'TELEGRAM_API_BASE_URL': telegram.base_url,
+        'OPENAI_API_KEY': 'benchmark',
+        'OPENAI_BASE_URL': openai_server.base_url,
+        'MAKE_WEBHOOK_URL': webhook.url,
+        'LLM_STREAMING': '1' if args.streaming else '0',
+        'LLM_MAX_CONCURRENCY': str(args.llm_concurrency),
+        'ANSWER_CACHE_PATH': ':memory:',
+        'SEARCH_INDEX_PATH': os.path.join(tempfile.mkdtemp(prefix='glovuni-search-'), 'search_index'),
+        'OUTBOUND_QUEUE_PATH': ':memory:',
+        'SUBSCRIPTIONS_PATH': ':memory:',
+        'PERSISTENCE_BACKEND': args.persistence,
+        'PERSISTENCE_PATH': args.persistence_path,
+        'UPLOAD_DIR': tempfile.mkdtemp(prefix='glovuni-uploads-'),
+    })
+    if not args.rate_limits:
+        # حدود المعدل ترفض معظم تحديثات المستخدم المحاكى لأنه يرسل كل خطواته دفعة واحدة
+        os.environ.update({'USER_RATE_LIMIT': '0', 'LLM_RATE_LIMIT': '0'})
+
+
+async def measure_conversation_memory(application, factory: UpdateFactory, count: int, first_user: int) -> dict:
+    """متوسط الذاكرة لكل محادثة نشطة (مستخدم متوقف في منتصف الاستمارة)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for user_id in range(first_user, first_user + count):
+        for _, update in user_journey(factory, user_id, 0)[:5]:
+            await application.process_update(update)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return {'conversations': count, 'bytes_per_conversation': round(total / count, 1)}
+
+
+def _legacy_welcome(first_name: str):
+    """بناء رسالة الترحيب ولوحتها كما كانت تُبنى مع كل تحديث قبل ui.py"""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    text = f"""
+🎓 **أهلاً بك يا {first_name} في Glovuni!**
+
+نحن متخصصون في مساعدة الطلاب الدوليين للدراسة في أفضل الجامعات الألمانية والعالمية.
+
+**للاستفادة من خدماتنا:**
+1️⃣ تابع صفحتنا على Instagram
+2️⃣ تحقق من المتابعة
+3️⃣ ملء استمارة التقديم
+
+دعنا نبدأ! 🚀
+    """
+    markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton("📱 تابعنا على إنستقرام", url="https://www.instagram.com/glovuni")],
+        [InlineKeyboardButton("✅ تحقق من المتابعة", callback_data="verify_instagram")],
+        [InlineKeyboardButton("❓ اسأل سؤال", callback_data="ask_question")],
+        [InlineKeyboardButton("📋 معلومات عن الخدمات", callback_data="services")],
+    ])
+    return text, markup
+
+
+def _cached_welcome(first_name: str):
+    import ui
+    return ui.WELCOME.render(first_name=first_name), ui.MAIN_MENU_KEYBOARD
+
+
+def ui_microbenchmark(iterations: int = 20000) -> dict:
+    """مقارنة كلفة تجهيز رسالة الترحيب ولوحتها للإرسال: البناء مع كل تحديث مقابل القوالب الجاهزة
+
+    يقيس الزمن والذاكرة المؤقتة المحجوزة لكل رسالة حتى مرحلة JSON التي يرسلها PTB.
+    """
+    def prepare(build, i):
+        # نفس ما يفعله PTB لكل معامل قبل الإرسال: to_dict ثم json
+        text, markup = build(f"طالب{i}")
+        return text, json.dumps(markup.to_dict())
+
+    results = {}
+    for name, build in (('per_update', _legacy_welcome), ('cached', _cached_welcome)):
+        prepare(build, 0)
+        started = time.perf_counter()
+        for i in range(iterations):
+            prepare(build, i)
+        elapsed = time.perf_counter() - started
+        samples = min(iterations, 2000)
+        tracemalloc.start()
+        transient = 0
+        for i in range(samples):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            prepare(build, i)
+            transient += tracemalloc.get_traced_memory()[1] - current
+        tracemalloc.stop()
+        results[name] = {
+            'us_per_message': round(elapsed / iterations * 1e6, 2),
+            'peak_bytes_per_message': round(transient / samples, 1),
+        }
+    results['speedup'] = round(results['per_update']['us_per_message'] / results['cached']['us_per_message'], 2)
+    return results
+
+
+def qa_memory_benchmark(sessions: int = 10000, turns: int = 8) -> dict:
+    """ذاكرة جلسات الأسئلة المتزامنة: سجل رسائل كامل بلا حدود مقابل QAHistory المضغوط والمحدود"""
+    from qa_history import QAHistory
+
+    answer = ('تختلف التكاليف حسب الجامعة والبرنامج، ومعظم الجامعات الحكومية في ألمانيا مجانية '
+              'مع مساهمة فصلية بسيطة. ننصحك بالتقديم مبكراً وتجهيز شهادة اللغة والوثائق المطلوبة. ') * 8
+
+    def naive(i):
+        messages = []
+        for t in range(turns):
+            messages.append({'role': 'user', 'content': f"{QUESTIONS[(i + t) % len(QUESTIONS)]} ({i})"})
+            messages.append({'role': 'assistant', 'content': f"{answer} ({i}/{t})"})
+        return messages
+
+    def compact(i):
+        history = QAHistory()
+        for t in range(turns):
+            history.add(f"{QUESTIONS[(i + t) % len(QUESTIONS)]} ({i})", f"{answer} ({i}/{t})")
+        return history
+
+    results = {'sessions': sessions, 'turns_per_session': turns}
+    for name, build in (('full_messages', naive), ('qa_history', compact)):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        store = [build(i) for i in range(sessions)]
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        results[name] = {'total_mb': round(used / 1e6, 2), 'bytes_per_session': round(used / sessions, 1)}
+        del store
+    return results
+
+
+class BackgroundServers:
+    """تشغيل الخوادم الوهمية في خيط منفصل بحلقة أحداث خاصة حتى لا تنافس البوت على نفس الحلقة"""
+
+    def __init__(self, *servers):
+        self.servers = servers
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='fake-servers', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        for server in self.servers:
+            asyncio.run_coroutine_threadsafe(server.start(), self.loop).result()
+
+    def stop(self) -> None:
+        for server in self.servers:
+            asyncio.run_coroutine_threadsafe(server.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+async def run_benchmark(args) -> dict:
+    telegram = FakeTelegramServer(latency=args.telegram_latency)
+    openai_server = FakeOpenAIServer(latency=args.openai_latency, token_delay=args.openai_token_delay)
+    webhook = FakeWebhookServer(latency=args.make_latency)
+    telegram.add_file(TRANSCRIPT_FILE_ID, TRANSCRIPT_PDF)
+    servers = BackgroundServers(telegram, openai_server, webhook)
+    servers.start()
+    configure_environment(args, telegram, openai_server, webhook)
+
+    import bot
+
+    worksheet = FakeWorksheet(latency=args.sheets_latency)
+    if args.sheets:
+        from features import onboarding
+        from sheets_sink import SheetsSink
+        onboarding.SHEETS_SINK = SheetsSink(lambda: worksheet, flush_interval=1.0)
+    # سجلات كل طلب HTTP تشوّه القياس
+    logging.getLogger().setLevel(logging.WARNING)
+    application = bot.build_application()
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    factory = UpdateFactory(application.bot)
+
+    errors = 0
+
+    async def count_error(update, context) -> None:
+        nonlocal errors
+        errors += 1
+
+    application.add_error_handler(count_error)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def simulate(user_id: int) -> None:
+        async with semaphore:
+            for name, update in user_journey(factory, user_id, args.questions):
+                start = time.perf_counter()
+                # نفس مسار التحديثات الحقيقية: المجدول ثم المعالجات
+                await application.update_processor.process_update(update, application.process_update(update))
+                latencies[name].append(time.perf_counter() - start)
+
+    lag = LoopLagMonitor(interval=0.01, histogram=None, keep_samples=True)
+    lag.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate(1_000_000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+    await lag.stop()
+
+    # سجل الخادم الوهمي يكبر مع كل طلب ويجب ألا يُحسب ضمن ذاكرة البوت
+    telegram.record_calls = False
+    memory = await measure_conversation_memory(application, factory, args.memory_users, 5_000_000)
+
+    await application.stop()
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+    servers.stop()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'args': vars(args),
+        },
+        'users': args.users,
+        'updates': len(all_latencies),
+        'errors': errors,
+        'shed': {'/'.join(key): value for key, value in UPDATES_SHED.samples().items()},
+        'elapsed_s': round(elapsed, 3),
+        'throughput_updates_per_s': round(len(all_latencies) / elapsed, 1),
+        'handler_latency': {name: summarize(values) for name, values in sorted(latencies.items())},
+        'overall_latency': summarize(all_latencies),
+        'event_loop_lag': summarize(lag.samples),
+        'memory': memory,
+        'backends': {
+            'telegram_calls': len(telegram.calls),
+            'openai_requests': len(openai_server.requests),
+            'make_submissions': len(webhook.received),
+            'sheets_rows': len(worksheet.rows),
+            'sheets_requests': len(worksheet.calls),
+        },
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='قياس أداء معالجات البوت تحت الحمل')
+    parser.add_argument('--users', type=int, default=1000, help='عدد الطلاب المحاكين')
+    parser.add_argument('--concurrency', type=int, default=100, help='عدد المستخدمين النشطين في نفس الوقت')
+    parser.add_argument('--questions', type=int, default=1, help='عدد الأسئلة الحرة لكل مستخدم')
+    parser.add_argument('--telegram-latency', type=float, default=0.01)
+    parser.add_argument('--openai-latency', type=float, default=0.2)
+    parser.add_argument('--openai-token-delay', type=float, default=0.0)
+    parser.add_argument('--make-latency', type=float, default=0.05)
+    parser.add_argument('--sheets', action='store_true', help='تصدير الطلبات إلى ورقة Google Sheets وهمية')
+    parser.add_argument('--sheets-latency', type=float, default=0.3)
+    parser.add_argument('--llm-concurrency', type=int, default=8)
+    parser.add_argument('--streaming', action='store_true', help='تفعيل الرد التدريجي')
+    parser.add_argument('--rate-limits', action='store_true', help='إبقاء حدود المعدل لكل مستخدم وللنموذج')
+    parser.add_argument('--persistence', default='none', choices=['none', 'sqlite'])
+    parser.add_argument('--persistence-path', default='benchmark_state.sqlite3')
+    parser.add_argument('--memory-users', type=int, default=1000, help='عدد المحادثات لقياس الذاكرة')
+    parser.add_argument('--ui-iterations', type=int, default=20000, help='عدد التكرارات لقياس تجهيز الرسائل')
+    parser.add_argument('--qa-sessions', type=int, default=10000, help='عدد جلسات الأسئلة لقياس ذاكرة السجل')
+    parser.add_argument('--micro-only', action='store_true', help='تشغيل القياسات المصغرة فقط (الرسائل وذاكرة السجل)')
+    parser.add_argument('--output', default='bench_output.json', help='ملف حفظ النتائج')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    # عدد صفر يعني تخطي القياس المصغر بدل القسمة على صفر
+    ui_results = qa_results = None
+    if args.ui_iterations > 0:
+        ui_results = ui_microbenchmark(args.ui_iterations)
+        print(f"تجهيز رسالة الترحيب: {ui_results['per_update']['us_per_message']}µs → "
+              f"{ui_results['cached']['us_per_message']}µs، ذاكرة مؤقتة "
+              f"{ui_results['per_update']['peak_bytes_per_message']}B → {ui_results['cached']['peak_bytes_per_message']}B")
+    if args.qa_sessions > 0:
+        qa_results = qa_memory_benchmark(args.qa_sessions)
+        print(f"ذاكرة {qa_results['sessions']} جلسة أسئلة: "
+              f"{qa_results['full_messages']['total_mb']}MB → {qa_results['qa_history']['total_mb']}MB")
+    if args.micro_only:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'commit': _git_commit(), 'ui_render': ui_results, 'qa_memory': qa_results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"النتائج محفوظة في {args.output}")
+        return
+    results = asyncio.run(run_benchmark(args))
+    results['ui_render'] = ui_results
+    results['qa_memory'] = qa_results
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    overall = results['overall_latency']
+    print(f"{results['updates']} تحديث في {results['elapsed_s']} ثانية "
+          f"({results['throughput_updates_per_s']} تحديث/ثانية)، "
+          f"p50={overall['p50_ms']}ms p95={overall['p95_ms']}ms p99={overall['p99_ms']}ms، "
+          f"أخطاء={results['errors']}")
+    print(f"النتائج محفوظة في {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,22 @@
+import time
+STARTED_AT = time.monotonic()  # قبل بقية الاستيرادات لقياس زمن بدء التشغيل كاملاً
+
+import asyncio
 import logging
-import json
 import os
-import requests
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, ConversationHandler, filters, ContextTypes, CallbackQueryHandler
-from telegram.constants import ParseMode
-import openai
+import sys
+from telegram import Update
+from telegram.ext import Application, ContextTypes, ConversationHandler, TypeHandler
+from knowledge_base import KnowledgeBaseStore
+import ui
+import features
+from state_store import create_persistence
+from webhook_server import run_webhook
+from supervisor import run_supervisor, run_worker, shard_path
+from scheduler import FAST_LANE, LLM_LANE, UpdateScheduler
+from http_server import HTTPServer
+from update_log import UpdateRecorder
+from metrics import LoopLagMonitor, StartupClock, count_update, instrument_application, metrics_endpoint
 
 # إعدادات السجلات
 logging.basicConfig(
@@ -16,416 +27,265 @@ logger = logging.getLogger(__name__)
 
 # إعدادات البيئة
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-MAKE_WEBHOOK_URL = os.getenv('MAKE_WEBHOOK_URL', '')  # سيتم تعيينه لاحقاً
-
-# تعيين مفتاح OpenAI
-openai.api_key = OPENAI_API_KEY
-
-# حالات المحادثة
-(VERIFY_INSTAGRAM, GET_NAME, GET_EMAIL, GET_PHONE, GET_FIELD, 
- UPLOAD_DOCUMENTS, CONFIRM_SUBMISSION) = range(7)
-
-# تحميل قاعدة المعرفة
-with open('knowledge_base_comprehensive.json', 'r', encoding='utf-8') as f:
-    KNOWLEDGE_BASE = json.load(f)
-
-# قائمة المستخدمين الذين تم التحقق منهم (في الإنتاج، يجب استخدام قاعدة بيانات)
-verified_users = set()
-
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """بدء المحادثة والترحيب بالمستخدم"""
-    user = update.effective_user
-    
-    # الرسالة الترحيبية
-    welcome_message = f"""
-🎓 **أهلاً بك يا {user.first_name} في Glovuni!**
-
-نحن متخصصون في مساعدة الطلاب الدوليين للدراسة في أفضل الجامعات الألمانية والعالمية.
-
-**للاستفادة من خدماتنا:**
-1️⃣ تابع صفحتنا على Instagram
-2️⃣ تحقق من المتابعة
-3️⃣ ملء استمارة التقديم
-
-دعنا نبدأ! 🚀
-    """
-    
-    # الأزرار
-    keyboard = [
-        [InlineKeyboardButton("📱 تابعنا على إنستقرام", url="https://www.instagram.com/glovuni")],
-        [InlineKeyboardButton("✅ تحقق من المتابعة", callback_data="verify_instagram")],
-        [InlineKeyboardButton("❓ اسأل سؤال", callback_data="ask_question")],
-        [InlineKeyboardButton("📋 معلومات عن الخدمات", callback_data="services")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(welcome_message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
-    return VERIFY_INSTAGRAM
-
-async def verify_instagram(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """التحقق من متابعة Instagram"""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    
-    # رسالة التحقق
-    verification_message = """
-✅ **شكراً لمتابعتك لنا على Instagram!**
-
-تأكد من أنك متابع لصفحتنا @glovuni للحصول على آخر المستجدات والعروض الخاصة.
-
-الآن يمكنك متابعة عملية التقديم معنا! 🎓
-    """
-    
-    # أزرار المتابعة
-    keyboard = [
-        [InlineKeyboardButton("✅ نعم، أنا متابع", callback_data="start_application")],
-        [InlineKeyboardButton("👈 العودة", callback_data="back_to_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(verification_message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
-    return VERIFY_INSTAGRAM
-
-async def start_application(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """بدء استمارة التقديم"""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    verified_users.add(user_id)
-    
-    # حفظ معرف المستخدم في السياق
-    context.user_data['user_id'] = user_id
-    
-    # طلب الاسم
-    message = """
-📝 **شكراً لتحقق من المتابعة!**
-
-الآن سننقل معك خطوة بخطوة لملء استمارة التقديم.
-
-**الخطوة 1️⃣: ما اسمك الكامل؟**
-    """
-    
-    await query.edit_message_text(message, parse_mode=ParseMode.MARKDOWN)
-    return GET_NAME
-
-async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """الحصول على اسم المستخدم"""
-    name = update.message.text
-    context.user_data['name'] = name
-    
-    await update.message.reply_text(f"شكراً {name}! 👋\n\n**الخطوة 2️⃣: ما بريدك الإلكتروني؟**")
-    return GET_EMAIL
-
-async def get_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """الحصول على البريد الإلكتروني"""
-    email = update.message.text
-    context.user_data['email'] = email
-    
-    await update.message.reply_text(f"ممتاز! ✅\n\n**الخطوة 3️⃣: ما رقم هاتفك؟**")
-    return GET_PHONE
-
-async def get_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """الحصول على رقم الهاتف"""
-    phone = update.message.text
-    context.user_data['phone'] = phone
-    
-    # أزرار اختيار التخصص
-    keyboard = [
-        [InlineKeyboardButton("🔬 العلوم والهندسة", callback_data="field_science")],
-        [InlineKeyboardButton("📊 الاقتصاد والإدارة", callback_data="field_business")],
-        [InlineKeyboardButton("🎓 العلوم الإنسانية", callback_data="field_humanities")],
-        [InlineKeyboardButton("💻 تكنولوجيا المعلومات", callback_data="field_it")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(
-        "رائع! 🎯\n\n**الخطوة 4️⃣: ما مجال دراستك المفضل؟**",
-        reply_markup=reply_markup
-    )
-    return GET_FIELD
-
-async def get_field(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """الحصول على مجال الدراسة"""
-    query = update.callback_query
-    await query.answer()
-    
-    field_map = {
-        'field_science': 'العلوم والهندسة',
-        'field_business': 'الاقتصاد والإدارة',
-        'field_humanities': 'العلوم الإنسانية',
-        'field_it': 'تكنولوجيا المعلومات'
-    }
-    
-    field = field_map.get(query.data, 'غير محدد')
-    context.user_data['field'] = field
-    
-    message = f"""
-✅ **تم حفظ بيانات التقديم:**
-
-👤 **الاسم:** {context.user_data['name']}
-📧 **البريد:** {context.user_data['email']}
-📱 **الهاتف:** {context.user_data['phone']}
-🎓 **المجال:** {field}
-
-**الآن سيتم إرسال بيانات التقديم إلى فريقنا للمراجعة.**
-
-شكراً لاختيارك Glovuni! 🎉
-سيتواصل معك فريقنا قريباً لمتابعة الخطوات التالية.
-    """
-    
-    # إرسال البيانات إلى Make.com
-    await send_to_make(context.user_data)
-    
-    keyboard = [
-        [InlineKeyboardButton("❓ اسأل سؤال", callback_data="ask_question")],
-        [InlineKeyboardButton("📋 معلومات عن الخدمات", callback_data="services")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
-    return ConversationHandler.END
-
-async def send_to_make(user_data: dict) -> None:
-    """إرسال البيانات إلى Make.com"""
-    if not MAKE_WEBHOOK_URL:
-        logger.warning("MAKE_WEBHOOK_URL غير محدد")
-        return
-    
-    try:
-        payload = {
-            'name': user_data.get('name'),
-            'email': user_data.get('email'),
-            'phone': user_data.get('phone'),
-            'field': user_data.get('field'),
-            'timestamp': str(user_data.get('timestamp', ''))
-        }
-        
-        response = requests.post(MAKE_WEBHOOK_URL, json=payload, timeout=10)
-        if response.status_code == 200:
-            logger.info(f"تم إرسال البيانات بنجاح: {user_data.get('name')}")
-        else:
-            logger.error(f"خطأ في إرسال البيانات: {response.status_code}")
-    except Exception as e:
-        logger.error(f"خطأ في الاتصال مع Make.com: {e}")
-
-async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """الإجابة على الأسئلة باستخدام AI"""
-    query = update.callback_query
-    await query.answer()
-    
-    message = """
-❓ **اسأل أي سؤال عن الدراسة بالخارج**
-
-يمكنك السؤال عن:
-- 🏫 الجامعات والبرامج
-- 💰 التكاليف والمنح
-- 📝 متطلبات التقديم
-- 🌍 الدول والمدن
-- 📚 التخصصات والمسارات الدراسية
-
-اكتب سؤالك الآن:
-    """
-    
-    keyboard = [
-        [InlineKeyboardButton("👈 العودة", callback_data="back_to_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
-    context.user_data['waiting_for_question'] = True
-
-async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """معالجة الأسئلة والإجابة عليها"""
-    if not context.user_data.get('waiting_for_question'):
+KB_PATH = os.getenv('KB_PATH', 'knowledge_base_comprehensive.json')
+KB_SNAPSHOT_PATH = os.getenv('KB_SNAPSHOT_PATH') or None  # نسخة ثنائية جاهزة لتسريع بدء التشغيل (اختياري)
+KB_RELOAD_INTERVAL = float(os.getenv('KB_RELOAD_INTERVAL', '5'))  # ثواني بين فحوص تعديل الملف (0 للتعطيل)
+FAST_ANSWER_MIN_CONFIDENCE = float(os.getenv('FAST_ANSWER_MIN_CONFIDENCE', '0.75'))  # 1.1 لتعطيل الإجابات الفورية
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', 'search_index')  # فهرس /search المحفوظ (.npy + .json)
+SEARCH_DIM = int(os.getenv('SEARCH_DIM', '1024'))  # أبعاد متجهات البحث
+SEARCH_ANN_THRESHOLD = int(os.getenv('SEARCH_ANN_THRESHOLD', '20000'))  # عدد العناصر الذي يبدأ بعده البحث التقريبي
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))  # أقصى عدد طلبات متزامنة للنموذج
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')  # لخادم Bot API محلي أو وهمي (اختياري)
+TELEGRAM_FILE_BASE_URL = os.getenv('TELEGRAM_FILE_BASE_URL')  # افتراضياً مشتق من TELEGRAM_API_BASE_URL
+BOT_MODE = os.getenv('BOT_MODE', 'polling')  # polling أو webhook أو supervisor (webhook موزع على عدة عمليات)
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+PORT = int(os.getenv('PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # الرابط العام المسجل لدى Telegram (اختياري)
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '16'))  # أقصى عدد تحديثات خفيفة تُعالج في نفس الوقت
+UPDATE_QUEUE_LIMIT = int(os.getenv('UPDATE_QUEUE_LIMIT', '1000'))  # أقصى عدد تحديثات خفيفة بانتظار المعالجة
+LLM_QUEUE_LIMIT = int(os.getenv('LLM_QUEUE_LIMIT', '50'))  # أقصى عدد أسئلة بانتظار النموذج قبل رد "مشغول"
+USER_RATE_LIMIT = float(os.getenv('USER_RATE_LIMIT', '1'))  # تحديثات/ثانية لكل مستخدم (0 للتعطيل)
+USER_RATE_BURST = float(os.getenv('USER_RATE_BURST', '10'))
+LLM_RATE_LIMIT = float(os.getenv('LLM_RATE_LIMIT', '10'))  # أسئلة/ثانية لكل البوت (0 للتعطيل)
+LLM_RATE_BURST = float(os.getenv('LLM_RATE_BURST', '20'))
+DRAIN_TIMEOUT = float(os.getenv('DRAIN_TIMEOUT', '25'))  # مهلة إنهاء التحديثات الجارية عند SIGTERM
+METRICS_PORT = os.getenv('METRICS_PORT', '')  # منفذ /metrics في وضع polling (في وضع webhook يُخدم على PORT)
+PERSISTENCE_BACKEND = os.getenv('PERSISTENCE_BACKEND', 'sqlite')  # sqlite أو redis أو none
+PERSISTENCE_PATH = os.getenv('PERSISTENCE_PATH', 'bot_state.sqlite3')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '5'))  # ثواني بين كل حفظ للحالة
+WARM_UP = os.getenv('WARM_UP', '1') == '1'  # تحميل openai وفهرس البحث في الخلفية بعد بدء استقبال التحديثات
+RECORD_UPDATES_PATH = os.getenv('RECORD_UPDATES_PATH', '')  # سجل التحديثات المجهولة لـ replay.py (فارغ للتعطيل)
+RECORD_UPDATES_SALT = os.getenv('RECORD_UPDATES_SALT', '')  # مفتاح إخفاء المعرفات؛ ثابت ليبقى المستخدم نفسه عبر إعادة التشغيل
+WORKERS = int(os.getenv('WORKERS', '0')) or os.cpu_count() or 1  # عدد العمال في وضع supervisor (افتراضياً عدد الأنوية)
+WORKER_SOCKET_DIR = os.getenv('WORKER_SOCKET_DIR', '/tmp/glovuni-workers')  # مجلد Unix sockets بين المشرف والعمال
+WORKER_ROUTE_TIMEOUT = float(os.getenv('WORKER_ROUTE_TIMEOUT', '5'))  # انتظار العامل المالك قبل رد 503 لـ Telegram
+WORKER_REPORT_INTERVAL = float(os.getenv('WORKER_REPORT_INTERVAL', '30'))  # ثواني بين كل تسجيل لحمل العمال
+WORKER_SOCKET = os.getenv('WORKER_SOCKET', '')  # يضبطه المشرف لكل عامل
+FEATURES = [f.strip() for f in os.getenv('FEATURES', features.DEFAULT_FEATURES).split(',') if f.strip()]  # الميزات المفعلة
+
+# ملفات SQLite التي يملك كل عامل نسخته منها في وضع supervisor (القيم الافتراضية كما في وحدات الميزات)؛
+# حالة المحادثات والطابور والاشتراكات تبقى مع مستخدمي شريحته
+WORKER_STATE_PATHS = {
+    'PERSISTENCE_PATH': 'bot_state.sqlite3',
+    'ANSWER_CACHE_PATH': 'answer_cache.sqlite3',
+    'OUTBOUND_QUEUE_PATH': 'outbound_queue.sqlite3',
+    'SUBSCRIPTIONS_PATH': 'subscriptions.sqlite3',
+}
+
+# حدود لكل البوت (حصص Telegram و OpenAI و Sheets) تُقسم بالتساوي على العمال حتى لا يتضاعف
+# مجموعها مع WORKERS: (القيمة الافتراضية، أدنى نصيب للعامل حتى لا يتوقف تماماً)
+WORKER_SHARED_LIMITS = {
+    'BROADCAST_RATE': (25.0, 0.0),
+    'LLM_RATE_LIMIT': (10.0, 0.0),
+    'LLM_RATE_BURST': (20.0, 1.0),
+    'LLM_MAX_CONCURRENCY': (8, 1),
+    'SHEETS_RATE_LIMIT': (1.0, 0.0),
+}
+
+LOOP_LAG_MONITOR = LoopLagMonitor()
+STARTUP_CLOCK = StartupClock(STARTED_AT)
+WARM_UP_TASK = None
+METRICS_SERVER = HTTPServer('0.0.0.0', int(METRICS_PORT or 0))
+METRICS_SERVER.route('GET', '/metrics', metrics_endpoint)
+UPDATE_RECORDER = UpdateRecorder(RECORD_UPDATES_PATH, RECORD_UPDATES_SALT) if RECORD_UPDATES_PATH else None
+# بعد كل مجموعات المعالجات حتى يرى المسجل user_data بعد معالجة التحديث
+RECORD_GROUP = 100
+
+# تحميل قاعدة المعرفة والتحقق منها وبناء الفهارس مرة واحدة؛
+# KB_STORE.current يُستبدل ذرياً عند تعديل الملف دون إعادة تشغيل البوت
+KB_STORE = KnowledgeBaseStore(KB_PATH, snapshot_path=KB_SNAPSHOT_PATH, poll_interval=KB_RELOAD_INTERVAL)
+
+# ما تتشاركه الميزات؛ وحدات الميزات نفسها تُستورد في build_application حسب FEATURES
+CORE = features.Core(
+    KB_STORE,
+    fast_answer_min_confidence=FAST_ANSWER_MIN_CONFIDENCE,
+    search_index_path=SEARCH_INDEX_PATH,
+    search_dim=SEARCH_DIM,
+    search_ann_threshold=SEARCH_ANN_THRESHOLD,
+)
+FEATURE_MODULES = []
+
+async def on_startup(application: Application) -> None:
+    """تشغيل الخدمات الخلفية بعد تهيئة التطبيق"""
+    for module in FEATURE_MODULES:
+        if hasattr(module, 'on_startup'):
+            await module.on_startup(application, CORE)
+    LOOP_LAG_MONITOR.start()
+    KB_STORE.start()
+    if METRICS_PORT and BOT_MODE == 'polling':
+        await METRICS_SERVER.start()
+    if WARM_UP:
+        # post_init يعمل قبل أن يصبح التطبيق "running" لذلك تُنشأ المهمة مباشرة ويُحتفظ بمرجعها
+        global WARM_UP_TASK
+        WARM_UP_TASK = asyncio.create_task(warm_up())
+    STARTUP_CLOCK.mark('ready')
+
+async def warm_up() -> None:
+    """تحميل المكتبات الثقيلة المؤجلة بعد أن يصبح البوت جاهزاً حتى لا يدفع أول مستخدم ثمنها"""
+    for module in FEATURE_MODULES:
+        if hasattr(module, 'warm_up'):
+            try:
+                await module.warm_up(CORE)
+            except Exception as e:
+                logger.warning(f"تعذر التحميل المسبق لـ {module.__name__}: {type(e).__name__}: {e}")
+
+async def on_shutdown(application: Application) -> None:
+    """إيقاف الخدمات الخلفية وإغلاق الاتصالات"""
+    for module in reversed(FEATURE_MODULES):
+        if hasattr(module, 'on_shutdown'):
+            await module.on_shutdown(application, CORE)
+    await LOOP_LAG_MONITOR.stop()
+    await KB_STORE.stop()
+    await METRICS_SERVER.stop()
+    if UPDATE_RECORDER is not None:
+        UPDATE_RECORDER.close()
+
+def classify_update(application: Application, update: object) -> str:
+    """الأسئلة الحرة التي تنتظرها handle_question تذهب لمسار النموذج وكل شيء آخر للمسار السريع"""
+    if not isinstance(update, Update) or update.message is None or not update.message.text:
+        return FAST_LANE
+    if update.message.text.startswith('/'):
+        return FAST_LANE
+    user_data = application.user_data.get(update.effective_user.id) if update.effective_user else None
+    if not user_data or not user_data.get('waiting_for_question'):
+        return FAST_LANE
+    # نص تنتظره خطوة في محادثة (الاسم، البريد...) تعالجه المحادثة قبل handle_question
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler) and handler.check_update(update):
+                return FAST_LANE
+    # سؤال تجيبه قاعدة المعرفة مباشرة لا يستدعي النموذج ولا يُرفض بحدوده
+    if CORE.fast_answerer.answer(update.message.text) is not None:
+        return FAST_LANE
+    return LLM_LANE
+
+async def reply_busy(update: object, reason: str) -> None:
+    """رد قصير عند رفض تحديث بسبب الضغط أو تجاوز حد المعدل"""
+    if not isinstance(update, Update):
         return
-    
-    question = update.message.text
-    context.user_data['waiting_for_question'] = False
-    
-    # الإجابة الذكية باستخدام OpenAI مع قاعدة المعرفة
-    try:
-        # إنشاء سياق من قاعدة المعرفة
-        knowledge_context = json.dumps(KNOWLEDGE_BASE, ensure_ascii=False, indent=2)
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"""أنت مساعد متخصص في استشارات التعليم العالي بالخارج لشركة Glovuni.
-                    
-قاعدة المعرفة:
-{knowledge_context}
-
-الإجابة يجب أن تكون:
-- مفيدة وشاملة
-- باللغة العربية
-- مستندة على قاعدة المعرفة
-- تشجع المستخدم على التقديم معنا
-- تتضمن معلومات عملية وفعلية"""
-                },
-                {
-                    "role": "user",
-                    "content": question
-                }
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        
-        answer = response.choices[0].message.content
-        
-        keyboard = [
-            [InlineKeyboardButton("❓ سؤال آخر", callback_data="ask_question")],
-            [InlineKeyboardButton("📋 معلومات عن الخدمات", callback_data="services")],
-            [InlineKeyboardButton("👈 العودة", callback_data="back_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(answer, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
-    
-    except Exception as e:
-        logger.error(f"خطأ في OpenAI: {e}")
-        await update.message.reply_text("عذراً، حدث خطأ في معالجة سؤالك. يرجى المحاولة مرة أخرى.")
-
-async def services(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """عرض معلومات الخدمات"""
-    query = update.callback_query
-    await query.answer()
-    
-    message = """
-📋 **خدمات Glovuni:**
-
-1️⃣ **استشارات التقديم**
-   - تقييم ملفك الأكاديمي
-   - اختيار أفضل الجامعات
-   - استراتيجية التقديم
-
-2️⃣ **إعداد الملفات**
-   - ترجمة الوثائق
-   - كتابة خطاب الدافع
-   - إعداد السيرة الذاتية
-
-3️⃣ **متابعة الطلب**
-   - الرد على استفسارات الجامعات
-   - متابعة حالة الطلب
-   - دعم مستمر
-
-4️⃣ **دعم اللغة**
-   - تحضير اختبارات اللغة
-   - دروس تقوية
-   - نصائح للنجاح
-
-5️⃣ **المنح الدراسية**
-   - البحث عن المنح المتاحة
-   - مساعدة في التقديم
-   - متابعة النتائج
-
-🎯 **هدفنا:** مساعدتك في تحقيق حلمك الأكاديمي! 🌟
-    """
-    
-    keyboard = [
-        [InlineKeyboardButton("📝 ابدأ التقديم", callback_data="start_application")],
-        [InlineKeyboardButton("❓ اسأل سؤال", callback_data="ask_question")],
-        [InlineKeyboardButton("👈 العودة", callback_data="back_to_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
-
-async def back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """العودة إلى القائمة الرئيسية"""
-    query = update.callback_query
-    await query.answer()
-    
-    message = """
-🎓 **قائمة Glovuni الرئيسية**
-
-اختر ما تريد:
-    """
-    
-    keyboard = [
-        [InlineKeyboardButton("📱 تابعنا على إنستقرام", url="https://www.instagram.com/glovuni")],
-        [InlineKeyboardButton("✅ تحقق من المتابعة", callback_data="verify_instagram")],
-        [InlineKeyboardButton("❓ اسأل سؤال", callback_data="ask_question")],
-        [InlineKeyboardButton("📋 معلومات عن الخدمات", callback_data="services")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
-
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """أمر المساعدة"""
-    help_text = """
-🆘 **مساعدة Glovuni Bot**
-
-الأوامر المتاحة:
-/start - بدء المحادثة
-/help - عرض هذه المساعدة
-/services - معلومات الخدمات
-/contact - معلومات التواصل
-
-📱 تابعنا على Instagram: @glovuni
-💬 أي استفسار؟ اسأل الآن!
-    """
-    await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
-
-async def contact_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """معلومات التواصل"""
-    contact_text = """
-📞 **معلومات التواصل:**
-
-📱 Instagram: @glovuni
-🌐 Website: www.glovuni.com
-📧 Email: contact@glovuni.com
-
-🕐 ساعات العمل: 24/7
-💬 نحن هنا لمساعدتك!
-    """
-    await update.message.reply_text(contact_text, parse_mode=ParseMode.MARKDOWN)
+    if update.callback_query is not None:
+        await update.callback_query.answer(ui.BUSY_TEXT)
+    elif update.effective_message is not None:
+        await update.effective_message.reply_text(ui.BUSY_TEXT)
+
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """تسجيل الأخطاء غير المعالجة في أي معالج مع نوع التحديث"""
+    kind = type(update).__name__ if update is not None else 'job'
+    logger.error(f"خطأ أثناء معالجة {kind}: {context.error!r}", exc_info=context.error)
+
+def worker_env(index: int) -> dict:
+    """متغيرات البيئة الخاصة بالعامل index: ملفات حالته ونصيبه من الحدود المشتركة"""
+    env = {}
+    for name, default in WORKER_STATE_PATHS.items():
+        path = os.getenv(name, default)
+        if path and path != ':memory:':
+            env[name] = shard_path(path, index)
+    for name, (default, minimum) in WORKER_SHARED_LIMITS.items():
+        value = type(default)(os.getenv(name, str(default)))
+        share = value // WORKERS if isinstance(value, int) else value / WORKERS
+        env[name] = str(max(minimum, share))
+    return env
+
+def build_application() -> Application:
+    """إنشاء التطبيق وتسجيل معالجات الميزات المفعلة في FEATURES"""
+    scheduler = UpdateScheduler(
+        fast_concurrency=UPDATE_CONCURRENCY,
+        llm_concurrency=LLM_MAX_CONCURRENCY,
+        fast_queue=UPDATE_QUEUE_LIMIT,
+        llm_queue=LLM_QUEUE_LIMIT,
+        user_rate=USER_RATE_LIMIT,
+        user_burst=USER_RATE_BURST,
+        llm_rate=LLM_RATE_LIMIT,
+        llm_burst=LLM_RATE_BURST,
+        on_shed=reply_busy,
+    )
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(scheduler)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(TELEGRAM_API_BASE_URL)
+        builder = builder.base_file_url(TELEGRAM_FILE_BASE_URL or TELEGRAM_API_BASE_URL.replace('/bot', '/file/bot'))
+    persistence = create_persistence(
+        PERSISTENCE_BACKEND,
+        PERSISTENCE_PATH,
+        REDIS_URL,
+        update_interval=PERSISTENCE_UPDATE_INTERVAL,
+    )
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
+    # التصنيف يحتاج user_data الخاصة بالتطبيق لذلك يُربط بعد إنشائه
+    scheduler.classify = lambda update: classify_update(application, update)
+    
+    # الميزات المفعلة فقط تُستورد (ومعها مكتباتها وملفاتها)
+    FEATURE_MODULES[:] = features.load(FEATURES)
+    CORE.persistent = persistence is not None
+    CORE.commands = tuple(command for module in FEATURE_MODULES for command in getattr(module, 'COMMANDS', ()))
+    state_names = {ConversationHandler.END: 'END'}
+    for module in FEATURE_MODULES:
+        module.register(application, CORE)
+        state_names.update(getattr(module, 'STATE_NAMES', {}))
+    features.menu.register_fallbacks(application, CORE)
+    logger.info(f"الميزات المفعلة: {', '.join(module.__name__.split('.')[-1] for module in FEATURE_MODULES)}")
+    
+    # قياس زمن كل المعالجات ثم عد التحديثات قبل أي معالج آخر
+    instrument_application(application, state_names)
+    application.add_handler(TypeHandler(Update, count_update), group=-1)
+    application.add_handler(TypeHandler(Update, STARTUP_CLOCK.first_update), group=-2)
+    if UPDATE_RECORDER is not None:
+        application.add_handler(TypeHandler(Update, UPDATE_RECORDER.record), group=RECORD_GROUP)
+    application.add_error_handler(error_handler)
+    
+    return application
 
 def main() -> None:
     """بدء البوت"""
-    # إنشاء التطبيق
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-    
-    # معالج المحادثة
-    conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
-        states={
-            VERIFY_INSTAGRAM: [
-                CallbackQueryHandler(verify_instagram, pattern="verify_instagram"),
-                CallbackQueryHandler(ask_question, pattern="ask_question"),
-                CallbackQueryHandler(services, pattern="services"),
-            ],
-            GET_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_name)],
-            GET_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_email)],
-            GET_PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_phone)],
-            GET_FIELD: [CallbackQueryHandler(get_field, pattern="field_")],
-        },
-        fallbacks=[
-            CallbackQueryHandler(back_to_menu, pattern="back_to_menu"),
-            CommandHandler("start", start),
-        ],
-    )
-    
-    # إضافة المعالجات
-    application.add_handler(conv_handler)
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("contact", contact_command))
-    application.add_handler(CallbackQueryHandler(start_application, pattern="start_application"))
-    application.add_handler(CallbackQueryHandler(ask_question, pattern="ask_question"))
-    application.add_handler(CallbackQueryHandler(services, pattern="services"))
-    application.add_handler(CallbackQueryHandler(back_to_menu, pattern="back_to_menu"))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_question))
+    STARTUP_CLOCK.mark('imports')
+    if BOT_MODE == 'supervisor':
+        # العملية الأمامية لا تبني التطبيق: كل عامل يشغّل bot.py بوضع worker
+        logger.info(f"Telegram Bot supervisor started ({WORKERS} workers)")
+        run_supervisor(
+            [sys.executable, os.path.abspath(__file__)],
+            WORKERS,
+            WORKER_SOCKET_DIR,
+            worker_env=worker_env,
+            listen=WEBHOOK_LISTEN,
+            port=PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            webhook_url=WEBHOOK_URL,
+            bot_token=TELEGRAM_BOT_TOKEN,
+            api_base_url=TELEGRAM_API_BASE_URL,
+            route_timeout=WORKER_ROUTE_TIMEOUT,
+            report_interval=WORKER_REPORT_INTERVAL,
+            drain_timeout=DRAIN_TIMEOUT,
+        )
+        return
+    application = build_application()
     
     # بدء البوت
-    logger.info("Telegram Bot Application started")
-    application.run_polling()
+    logger.info(f"Telegram Bot Application started ({BOT_MODE})")
+    if BOT_MODE == 'webhook':
+        run_webhook(
+            application,
+            listen=WEBHOOK_LISTEN,
+            port=PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            webhook_url=WEBHOOK_URL,
+            drain_timeout=DRAIN_TIMEOUT,
+        )
+    elif BOT_MODE == 'worker':
+        run_worker(application, WORKER_SOCKET, drain_timeout=DRAIN_TIMEOUT)
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
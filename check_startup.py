@@ -0,0 +1,185 @@
+"""فحص زمن بدء تشغيل البوت لمنع رجوع الاستيرادات الثقيلة إلى مسار البدء
+
+يشغّل "import bot" في عملية جديدة مع python -X importtime ويفشل (رمز خروج 1) إذا تجاوز
+زمن الاستيراد الميزانية أو حُمّلت مكتبة يجب أن تبقى مؤجلة (openai و numpy ...).
+مع --first-update يشغّل البوت فعلياً في وضع webhook أمام خادم Telegram وهمي ويقيس
+الزمن من تشغيل العملية حتى إرسال أول رد.
+
+مثال:
+    python check_startup.py --budget-ms 500 --first-update
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from fake_servers import FakeTelegramServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# مكتبات تُحمّل عند أول استخدام فقط؛ ظهورها في مسار البدء تراجع في الأداء
+DEFERRED_MODULES = ('openai', 'numpy', 'program_search', 'gspread', 'google.auth', 'oauth2client', 'requests', 'PIL', 'pypdf')
+
+
+def bot_env(state_dir: str, **extra) -> Dict[str, str]:
+    """متغيرات بيئة تمنع البوت من إنشاء ملفات حالة في مجلد المشروع"""
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN='1:startup-check',
+        ANSWER_CACHE_PATH=':memory:',
+        OUTBOUND_QUEUE_PATH=':memory:',
+        SUBSCRIPTIONS_PATH=':memory:',
+        PERSISTENCE_BACKEND='none',
+        UPLOAD_DIR=os.path.join(state_dir, 'uploads'),
+        SEARCH_INDEX_PATH=os.path.join(state_dir, 'search_index'),
+    )
+    env.update(extra)
+    return env
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """اسم الوحدة -> (الزمن الذاتي، الزمن التراكمي) بالميكروثانية من مخرجات -X importtime"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def profile_imports(env: Dict[str, str], module: str = 'bot') -> Dict[str, Tuple[int, int]]:
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=HERE, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"فشل استيراد {module}:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def top_level(modules: Dict[str, Tuple[int, int]], limit: int) -> List[Tuple[str, int]]:
+    """أثقل الحزم حسب الزمن الذاتي مجمعاً على الاسم الأعلى (telegram.ext.x -> telegram)"""
+    totals: Dict[str, int] = {}
+    for name, (self_us, _) in modules.items():
+        root = name.split('.')[0]
+        totals[root] = totals.get(root, 0) + self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def measure_first_update(env: Dict[str, str], timeout: float = 30.0) -> Dict[str, Optional[float]]:
+    """الزمن من تشغيل عملية البوت حتى جاهزية /healthz وحتى إرسال أول رد على /start"""
+    telegram = FakeTelegramServer()
+    await telegram.start()
+    port = _free_port()
+    env = dict(env, BOT_MODE='webhook', PORT=str(port), WEBHOOK_LISTEN='127.0.0.1',
+               TELEGRAM_API_BASE_URL=telegram.base_url, KB_RELOAD_INTERVAL='0')
+    base = f"http://127.0.0.1:{port}"
+    update = {
+        'update_id': 1,
+        'message': {
+            'message_id': 1, 'date': int(time.time()), 'text': '/start',
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'startup'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+        },
+    }
+    result: Dict[str, Optional[float]] = {'healthy': None, 'first_reply': None}
+    started = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, 'bot.py', cwd=HERE, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        async with httpx.AsyncClient(timeout=2.0) as client:
+            deadline = started + timeout
+            while time.monotonic() < deadline and process.returncode is None:
+                try:
+                    if (await client.get(f"{base}/healthz")).status_code == 200:
+                        result['healthy'] = time.monotonic() - started
+                        break
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.01)
+            if result['healthy'] is None:
+                return result
+            await client.post(f"{base}{env.get('WEBHOOK_PATH', '/telegram')}", json=update)
+            while time.monotonic() < deadline:
+                if any(method == 'sendMessage' for method, _ in telegram.calls):
+                    result['first_reply'] = time.monotonic() - started
+                    break
+                await asyncio.sleep(0.005)
+            metrics = (await client.get(f"{base}/metrics")).text
+            for line in metrics.splitlines():
+                if line.startswith('glovuni_startup_seconds{'):
+                    phase = line.split('"')[1]
+                    result[f"bot_{phase}"] = float(line.rsplit(' ', 1)[1])
+    finally:
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+        await telegram.stop()
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='فحص زمن بدء تشغيل البوت والاستيرادات المؤجلة')
+    parser.add_argument('--budget-ms', type=float, default=600, help='أقصى زمن مسموح لاستيراد bot')
+    parser.add_argument('--forbid', default=','.join(DEFERRED_MODULES), help='وحدات يجب ألا تُحمّل عند البدء')
+    parser.add_argument('--top', type=int, default=10, help='عدد الحزم الأثقل المعروضة')
+    parser.add_argument('--first-update', action='store_true', help='قياس الزمن حتى أول رد فعلي')
+    parser.add_argument('--first-update-budget-ms', type=float, default=0, help='0 لعدم الفحص')
+    parser.add_argument('--output', help='حفظ النتائج كملف JSON')
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix='glovuni-startup-') as state_dir:
+        env = bot_env(state_dir)
+        modules = profile_imports(env)
+        total_ms = modules['bot'][1] / 1000
+        print(f"import bot: {total_ms:.0f}ms (الميزانية {args.budget_ms:.0f}ms)")
+        for name, self_us in top_level(modules, args.top):
+            print(f"  {self_us / 1000:8.1f}ms  {name}")
+        if total_ms > args.budget_ms:
+            failures.append(f"زمن الاستيراد {total_ms:.0f}ms أكبر من الميزانية {args.budget_ms:.0f}ms")
+        loaded = [name for name in filter(None, args.forbid.split(',')) if name in modules]
+        if loaded:
+            failures.append(f"وحدات يجب أن تبقى مؤجلة حُمّلت عند البدء: {', '.join(loaded)}")
+
+        report = {'import_ms': round(total_ms, 1), 'top_modules': top_level(modules, args.top), 'deferred_loaded': loaded}
+        if args.first_update:
+            timings = asyncio.run(measure_first_update(env))
+            report['first_update'] = timings
+            if timings['first_reply'] is None:
+                failures.append("لم يصل أي رد من البوت")
+            else:
+                first_ms = timings['first_reply'] * 1000
+                print(f"healthz بعد {timings['healthy'] * 1000:.0f}ms، أول رد بعد {first_ms:.0f}ms")
+                if args.first_update_budget_ms and first_ms > args.first_update_budget_ms:
+                    failures.append(f"أول رد بعد {first_ms:.0f}ms أكبر من الميزانية {args.first_update_budget_ms:.0f}ms")
+
+    report['failures'] = failures
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    for failure in failures:
+        print(f"فشل: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
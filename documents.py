@@ -0,0 +1,234 @@
+"""استلام وثائق الطلاب (شهادات، كشوف درجات، شهادات لغة) ومعالجتها في الخلفية
+
+التنزيل يتم على أجزاء مباشرة إلى القرص مع حساب sha256 أثناء التنزيل، ثم تُستخرج الصورة
+المصغرة ونص ملفات PDF في عمليات منفصلة. Pillow و pypdf اختياريتان: بدونهما تُحفظ الوثيقة
+دون صورة مصغرة أو نص.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_TYPES = {
+    'application/pdf': '.pdf',
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+}
+
+_MAGIC = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+)
+
+
+class DocumentRejected(Exception):
+    """وثيقة مرفوضة؛ نص الاستثناء يُعرض للطالب"""
+
+
+def sniff_type(head: bytes) -> Optional[str]:
+    """نوع الملف من أول بايتات المحتوى بدلاً من الثقة بالامتداد أو mime المرسل"""
+    for magic, mime_type in _MAGIC:
+        if head.startswith(magic):
+            return mime_type
+    return None
+
+
+def make_thumbnail(path: str, out_path: str, size: Tuple[int, int] = (320, 320)) -> Optional[str]:
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(path) as image:
+        image.thumbnail(size)
+        image.convert('RGB').save(out_path, 'JPEG', quality=80)
+    return out_path
+
+
+def extract_pdf_text(path: str, max_chars: int = 2000) -> Optional[str]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    reader = PdfReader(path)
+    parts, total = [], 0
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        parts.append(text)
+        total += len(text)
+        if total >= max_chars:
+            break
+    return ' '.join(' '.join(parts).split())[:max_chars]
+
+
+def process_document(path: str, mime_type: str, thumbnail_path: str) -> dict:
+    """تُنفذ في عملية منفصلة: عمل CPU لا يجب أن يحجب حلقة أحداث البوت"""
+    result = {'thumbnail': None, 'text_excerpt': None}
+    try:
+        if mime_type == 'application/pdf':
+            result['text_excerpt'] = extract_pdf_text(path)
+        else:
+            result['thumbnail'] = make_thumbnail(path, thumbnail_path)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+@dataclass
+class StoredDocument:
+    file_name: str
+    mime_type: str
+    size: int
+    sha256: str
+    path: str
+    thumbnail: Optional[str] = None
+    text_excerpt: Optional[str] = None
+
+    def manifest_entry(self) -> dict:
+        entry = asdict(self)
+        entry['path'] = os.path.basename(self.path)
+        entry['thumbnail'] = os.path.basename(self.thumbnail) if self.thumbnail else None
+        if self.text_excerpt:
+            entry['text_excerpt'] = self.text_excerpt[:300]
+        return entry
+
+
+@dataclass
+class UploadResult:
+    file_name: str
+    document: Optional[StoredDocument] = None
+    error: Optional[str] = None
+
+
+class DocumentPipeline:
+    """تنزيل ومعالجة الوثائق في الخلفية بعدد عمال محدود
+
+    المعالج يعيد الرد للطالب فوراً؛ التنزيل محدود بـ download_concurrency والمعالجة بعدد
+    عمليات ثابت حتى لا تحجز الملفات الكبيرة موارد محادثات الآخرين.
+    """
+
+    def __init__(self, storage_dir: str = 'uploads', max_size: int = 10 * 1024 * 1024,
+                 download_concurrency: int = 4, process_workers: int = 2,
+                 chunk_size: int = 64 * 1024, timeout: float = 60.0):
+        self.storage_dir = storage_dir
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.process_workers = process_workers
+        self._download_semaphore = asyncio.Semaphore(download_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[int, List[asyncio.Task]] = {}
+
+    def validate(self, file_name: str, mime_type: Optional[str], size: Optional[int]) -> None:
+        """فحص سريع من بيانات Telegram قبل التنزيل"""
+        if mime_type not in ALLOWED_TYPES:
+            raise DocumentRejected(f"نوع الملف {file_name} غير مدعوم؛ يرجى إرسال PDF أو صورة JPG/PNG")
+        if size is not None and size > self.max_size:
+            raise DocumentRejected(
+                f"حجم الملف {file_name} أكبر من الحد المسموح ({self.max_size // (1024 * 1024)} ميغابايت)"
+            )
+
+    async def start(self) -> None:
+        os.makedirs(self.storage_dir, exist_ok=True)
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        tasks = [task for tasks in self._pending.values() for task in tasks]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def submit(self, user_id: int, telegram_file, file_name: str, mime_type: str) -> None:
+        """جدولة تنزيل ومعالجة وثيقة (telegram_file: Document أو PhotoSize)"""
+        task = asyncio.create_task(self._ingest(telegram_file, file_name, mime_type))
+        self._pending.setdefault(user_id, []).append(task)
+
+    def pending(self, user_id: int) -> int:
+        return sum(1 for task in self._pending.get(user_id, ()) if not task.done())
+
+    async def collect(self, user_id: int, timeout: float = 60.0) -> List[UploadResult]:
+        """انتظار وثائق المستخدم الجارية وإرجاع نتائجها (مرة واحدة لكل وثيقة)"""
+        tasks = self._pending.pop(user_id, [])
+        if not tasks:
+            return []
+        done, still_running = await asyncio.wait(tasks, timeout=timeout)
+        if still_running:
+            self._pending[user_id] = list(still_running)
+        return [task.result() for task in tasks if task in done]
+
+    async def _ingest(self, telegram_file, file_name: str, mime_type: str) -> UploadResult:
+        try:
+            async with self._download_semaphore:
+                file = await telegram_file.get_file()
+                tmp_path, size, digest, sniffed = await self._download(file.file_path)
+            if sniffed != mime_type:
+                os.unlink(tmp_path)
+                raise DocumentRejected(f"محتوى الملف {file_name} لا يطابق نوعه")
+            path = os.path.join(self.storage_dir, digest + ALLOWED_TYPES[mime_type])
+            if os.path.exists(path):
+                # نفس المحتوى مرفوع مسبقاً (من هذا الطالب أو غيره): نكتفي بنسخة واحدة
+                os.unlink(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+            document = StoredDocument(file_name, mime_type, size, digest, path)
+            await self._process(document)
+            return UploadResult(file_name, document)
+        except DocumentRejected as e:
+            return UploadResult(file_name, error=str(e))
+        except Exception as e:
+            # رسالة HTTPStatusError تتضمن رابط الملف وفيه توكن البوت
+            detail = f"HTTP {e.response.status_code}" if isinstance(e, httpx.HTTPStatusError) else str(e)
+            logger.error(f"فشل استلام الوثيقة {file_name}: {type(e).__name__}: {detail}")
+            return UploadResult(file_name, error=f"تعذر استلام {file_name}، يرجى إعادة المحاولة")
+
+    async def _download(self, url: str) -> Tuple[str, int, str, Optional[str]]:
+        """تنزيل الملف على أجزاء إلى ملف مؤقت مع حساب sha256 والتحقق من الحجم أثناء التنزيل"""
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        fd, tmp_path = tempfile.mkstemp(dir=self.storage_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                async with self._client.stream('GET', url) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        size += len(chunk)
+                        if size > self.max_size:
+                            raise DocumentRejected("حجم الملف أكبر من الحد المسموح")
+                        if len(head) < 16:
+                            head += chunk[:16]
+                        digest.update(chunk)
+                        out.write(chunk)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return tmp_path, size, digest.hexdigest(), sniff_type(head)
+
+    async def _process(self, document: StoredDocument) -> None:
+        if self.process_workers <= 0:
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        thumbnail_path = os.path.join(self.storage_dir, document.sha256 + '.thumb.jpg')
+        result = await asyncio.get_running_loop().run_in_executor(
+            self._pool, process_document, document.path, document.mime_type, thumbnail_path
+        )
+        if result.get('error'):
+            logger.warning(f"تعذرت معالجة {document.file_name}: {result['error']}")
+        document.thumbnail = result.get('thumbnail')
+        document.text_excerpt = result.get('text_excerpt')
@@ -0,0 +1,336 @@
+"""خوادم وهمية محلية تحاكي الخدمات الخارجية للاختبار وقياس الأداء"""
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl
+
+from http_server import HTTPServer, Request, Response
+
+
+class FakeOpenAIServer:
+    """خادم متوافق مع OpenAI Chat Completions مع زمن استجابة وأخطاء قابلة للضبط"""
+
+    def __init__(self, answer: str = 'هذه إجابة تجريبية من الخادم الوهمي.', latency: float = 0.0,
+                 token_delay: float = 0.0, fail_first: int = 0, fail_status: int = 429,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.answer = answer
+        self.latency = latency
+        self.token_delay = token_delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests: List[dict] = []
+        self.server = HTTPServer(host, port)
+        self.server.route('POST', '/v1/chat/completions', self._chat_completions)
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.server.url}/v1"
+
+    async def start(self) -> None:
+        await self.server.start()
+
+    async def stop(self) -> None:
+        await self.server.stop()
+
+    def _usage(self, body: dict) -> dict:
+        prompt_tokens = sum(len(m.get('content') or '') for m in body.get('messages', [])) // 3
+        completion_tokens = len(self.answer) // 3
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+
+    async def _chat_completions(self, request: Request) -> Response:
+        body = request.json()
+        self.requests.append(body)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_first > 0:
+            self.fail_first -= 1
+            return Response.json({'error': {'message': 'simulated failure', 'type': 'server_error'}},
+                                 status=self.fail_status)
+        created = int(time.time())
+        if body.get('stream'):
+            return Response(content_type='text/event-stream', stream=self._stream(body, created))
+        return Response.json({
+            'id': f"chatcmpl-fake-{len(self.requests)}",
+            'object': 'chat.completion',
+            'created': created,
+            'model': body.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': self.answer},
+                'finish_reason': 'stop',
+            }],
+            'usage': self._usage(body),
+        })
+
+    async def _stream(self, body: dict, created: int):
+        words = self.answer.split(' ')
+        for i, word in enumerate(words):
+            piece = word if i == 0 else ' ' + word
+            chunk = {
+                'id': f"chatcmpl-fake-{len(self.requests)}",
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': body.get('model', 'fake'),
+                'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}],
+            }
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8')
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+        yield b'data: [DONE]\n\n'
+
+
+class FakeTelegramServer:
+    """خادم يحاكي Telegram Bot API ويسجل كل استدعاء يرسله البوت"""
+
+    def __init__(self, latency: float = 0.0, bot_id: int = 999, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.bot_id = bot_id
+        self.record_calls = True
+        self.calls: List[tuple] = []
+        self._message_id = 0
+        # file_id -> محتوى الملف لمحاكاة getFile وتنزيل الوثائق
+        self.files: Dict[str, bytes] = {}
+        self.server = HTTPServer(host, port)
+        self.server.route('POST', '/bot*', self._handle)
+        self.server.route('GET', '/bot*', self._handle)
+        self.server.route('GET', '/file/bot*', self._download)
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.server.url}/bot"
+
+    def add_file(self, file_id: str, content: bytes) -> None:
+        self.files[file_id] = content
+
+    async def start(self) -> None:
+        await self.server.start()
+
+    async def stop(self) -> None:
+        await self.server.stop()
+
+    @staticmethod
+    def _params(request: Request) -> dict:
+        content_type = request.headers.get('content-type', '')
+        if 'json' in content_type:
+            return request.json() or {}
+        params = {}
+        if 'x-www-form-urlencoded' in content_type:
+            for key, value in parse_qsl(request.body.decode('utf-8'), keep_blank_values=True):
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    params[key] = value
+        return params
+
+    def _message(self, chat_id, text: str = '', message_id: Optional[int] = None) -> dict:
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id or 0), 'type': 'private'},
+            'from': {'id': self.bot_id, 'is_bot': True, 'first_name': 'Glovuni'},
+            'text': text,
+        }
+
+    async def _handle(self, request: Request) -> Response:
+        method = request.path.rsplit('/', 1)[-1]
+        params = self._params(request)
+        if self.record_calls:
+            self.calls.append((method, params))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == 'getMe':
+            result = {'id': self.bot_id, 'is_bot': True, 'first_name': 'Glovuni', 'username': 'glovuni_bot',
+                      'can_join_groups': False, 'can_read_all_group_messages': False,
+                      'supports_inline_queries': False}
+        elif method == 'sendMessage':
+            result = self._message(params.get('chat_id'), params.get('text', ''))
+        elif method in ('editMessageText', 'editMessageReplyMarkup'):
+            result = self._message(params.get('chat_id'), params.get('text', ''), params.get('message_id'))
+        elif method == 'getUpdates':
+            await asyncio.sleep(min(float(params.get('timeout') or 0), 1.0))
+            result = []
+        elif method == 'getFile':
+            file_id = str(params.get('file_id'))
+            if file_id not in self.files:
+                return Response.json({'ok': False, 'error_code': 400,
+                                      'description': 'Bad Request: invalid file_id'}, status=400)
+            result = {'file_id': file_id, 'file_unique_id': file_id,
+                      'file_size': len(self.files[file_id]), 'file_path': f"documents/{file_id}"}
+        elif method == 'getWebhookInfo':
+            result = {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        else:
+            result = True
+        return Response.json({'ok': True, 'result': result})
+
+    async def _download(self, request: Request) -> Response:
+        file_id = request.path.rsplit('/', 1)[-1]
+        if file_id not in self.files:
+            return Response.text('Not Found', status=404)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return Response(200, self.files[file_id], 'application/octet-stream')
+
+    def sent_texts(self, chat_id: Optional[int] = None) -> List[str]:
+        """نصوص الرسائل المرسلة أو المعدلة (لمحادثة معينة إن حددت)"""
+        return [
+            params.get('text', '') for method, params in self.calls
+            if method in ('sendMessage', 'editMessageText')
+            and (chat_id is None or int(params.get('chat_id') or 0) == chat_id)
+        ]
+
+
+class FakeWebhookServer:
+    """خادم يحاكي webhook خارجي (مثل Make.com) ويسجل كل ما يصله"""
+
+    def __init__(self, latency: float = 0.0, fail_first: int = 0, fail_status: int = 503,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.received: List = []
+        self.server = HTTPServer(host, port)
+        self.server.route('POST', '/webhook', self._receive)
+
+    @property
+    def url(self) -> str:
+        return f"{self.server.url}/webhook"
+
+    async def start(self) -> None:
+        await self.server.start()
+
+    async def stop(self) -> None:
+        await self.server.stop()
+
+    async def _receive(self, request: Request) -> Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_first > 0:
+            self.fail_first -= 1
+            return Response.text('', self.fail_status)
+        self.received.append(request.json())
+        return Response.text('Accepted')
+
+
+class FakeRedisServer:
+    """خادم بديل محلي يتحدث بروتوكول Redis (RESP) ويدعم أوامر الـ hash الأساسية"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.hashes: dict = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    @staticmethod
+    def _bulk(value: Optional[bytes]) -> bytes:
+        return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def _execute(self, args: List[bytes]) -> bytes:
+        command = args[0].upper()
+        if command in (b'PING', b'AUTH', b'SELECT'):
+            return b'+OK\r\n' if command != b'PING' else b'+PONG\r\n'
+        if command == b'HSET':
+            table = self.hashes.setdefault(args[1], {})
+            added = 0
+            for i in range(2, len(args), 2):
+                added += args[i] not in table
+                table[args[i]] = args[i + 1]
+            return b':%d\r\n' % added
+        if command == b'HGET':
+            return self._bulk(self.hashes.get(args[1], {}).get(args[2]))
+        if command == b'HDEL':
+            table = self.hashes.get(args[1], {})
+            removed = sum(table.pop(key, None) is not None for key in args[2:])
+            return b':%d\r\n' % removed
+        if command == b'HGETALL':
+            table = self.hashes.get(args[1], {})
+            items = [self._bulk(v) for pair in table.items() for v in pair]
+            return b'*%d\r\n' % len(items) + b''.join(items)
+        if command == b'DEL':
+            removed = sum(self.hashes.pop(key, None) is not None for key in args[1:])
+            return b':%d\r\n' % removed
+        return b'-ERR unknown command\r\n'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                count = int(line[1:-2])
+                args = []
+                for _ in range(count):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(self._execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class FakeQuotaExceeded(Exception):
+    """يحاكي خطأ 429 من Sheets API"""
+
+
+class FakeWorksheet:
+    """بديل محلي لـ gspread.Worksheet يحاكي زمن الاستجابة وحصة الطلبات في الدقيقة
+
+    الاستدعاءات محجوبة (time.sleep) مثل gspread الحقيقية.
+    """
+
+    def __init__(self, latency: float = 0.0, requests_per_minute: int = 60, fail_first: int = 0):
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.fail_first = fail_first
+        self.rows: List[list] = []
+        self.calls: List[float] = []
+        self.rejected = 0
+
+    def append_rows(self, values, value_input_option: str = 'RAW', **kwargs) -> dict:
+        now = time.monotonic()
+        self.calls = [t for t in self.calls if now - t < 60]
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_first > 0:
+            self.fail_first -= 1
+            raise ConnectionError('fake sheets unavailable')
+        if self.requests_per_minute and len(self.calls) >= self.requests_per_minute:
+            self.rejected += 1
+            raise FakeQuotaExceeded('Quota exceeded for quota metric Write requests')
+        self.calls.append(now)
+        self.rows.extend(list(row) for row in values)
+        return {'updates': {'updatedRows': len(values)}}
+
+
+async def run_fake_openai(answer: Optional[str] = None, port: int = 8099) -> None:
+    """تشغيل الخادم الوهمي بشكل مستقل: python fake_servers.py"""
+    server = FakeOpenAIServer(answer or FakeOpenAIServer().answer, latency=0.5, token_delay=0.05, port=port)
+    await server.start()
+    print(f"OPENAI_BASE_URL={server.base_url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(run_fake_openai())
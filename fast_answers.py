@@ -0,0 +1,297 @@
+"""إجابات فورية للأسئلة المنظمة (موعد، رسوم، لغة...) مباشرة من حقول قاعدة المعرفة دون النموذج"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from knowledge_base import Country, KnowledgeBase, University
+from knowledge_index import normalized_words
+
+# بادئات تلتصق بالكلمة في السؤال (بألمانيا، للماجستير، والرسوم)
+_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال', 'و', 'ب', 'ل', 'ف', 'ك')
+
+DEGREE_ALIASES = {
+    'bachelor': ('بكالوريوس', 'جامعي', 'bachelor', 'bachelors', 'undergraduate', 'bsc', 'ba'),
+    'master': ('ماجستير', 'ماستر', 'master', 'masters', 'msc', 'ma', 'graduate'),
+    'phd': ('دكتوراه', 'دكتوراة', 'phd', 'doctorate'),
+}
+
+ATTRIBUTE_ALIASES = {
+    'deadline': ('موعد', 'مواعيد', 'اخر موعد', 'deadline', 'deadlines'),
+    'tuition': ('تكاليف', 'تكلفه', 'رسوم', 'اقساط', 'قسط', 'tuition', 'fees', 'fee', 'cost', 'costs'),
+    'language': ('لغه', 'اللغه', 'ايلتس', 'توفل', 'ielts', 'toefl', 'language'),
+    'documents': ('وثائق', 'مستندات', 'اوراق', 'documents', 'papers'),
+    'programs': ('تخصصات', 'برامج', 'programs', 'majors', 'courses'),
+    'ranking': ('تصنيف', 'ترتيب', 'ranking', 'rank'),
+    'cities': ('مدن', 'cities'),
+    'website': ('رابط', 'موقع', 'website', 'link'),
+}
+
+TERM_ALIASES = {
+    'winter': ('شتوي', 'الشتوي', 'winter'),
+    'summer': ('صيفي', 'الصيفي', 'summer'),
+}
+
+# أسماء إضافية لا تظهر في قاعدة المعرفة نفسها
+COUNTRY_ALIASES = {
+    'germany': ('germany', 'المانيا'),
+    'turkey': ('turkey', 'turkiye', 'تركيا'),
+    'uk': ('uk', 'britain', 'england', 'united kingdom', 'بريطانيا', 'انجلترا', 'انكلترا'),
+    'georgia': ('georgia', 'جورجيا'),
+    'cyprus': ('cyprus', 'قبرص'),
+    'malaysia': ('malaysia', 'ماليزيا'),
+}
+UNIVERSITY_ALIASES = {
+    'university_of_wurzburg': ('wurzburg', 'wuerzburg', 'فورتسبورغ'),
+}
+
+# كلمات شائعة في الأسئلة المنظمة لا تغير معناها
+FILLER_WORDS = frozenset({
+    'اخر', 'تقديم', 'التقديم', 'قبول', 'فصل', 'الفصل', 'دراسه', 'الدراسه', 'جامعه', 'الجامعه', 'متطلبات',
+    'المطلوبه', 'مطلوبه', 'شروط', 'سنويه', 'سنوي', 'ايش', 'شو', 'شنو', 'اعرف', 'اريد', 'ممكن', 'درجه',
+    'university', 'apply', 'application', 'semester', 'intake', 'requirements', 'required', 'study',
+    'at', 'when', 'which', 'are', 'do', 'does', 'need', 'i', 's', 'much', 'tell', 'me', 'about',
+    'degree', 'program', 'there', 'its', 'their',
+})
+
+_ABBREVIATION_RE = re.compile(r'\(([A-Za-z]{2,})\)')
+
+_MATCH_FIELDS = {
+    'country': 'countries', 'university': 'universities', 'degree': 'degrees',
+    'attribute': 'attributes', 'term': 'terms',
+}
+_DEGREE_LABELS = {'bachelor': 'البكالوريوس', 'master': 'الماجستير', 'phd': 'الدكتوراه'}
+_TERM_LABELS = {'winter': 'الفصل الشتوي', 'summer': 'الفصل الصيفي', 'general': 'جميع الفصول'}
+
+
+def _variants(word: str) -> Iterator[str]:
+    yield word
+    for prefix in _PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 2:
+            yield word[len(prefix):]
+
+
+@dataclass
+class Match:
+    """الكيانات المستخرجة من السؤال ومدى تغطيتها لكلماته"""
+    countries: List[str] = field(default_factory=list)
+    universities: List[str] = field(default_factory=list)
+    degrees: List[str] = field(default_factory=list)
+    attributes: List[str] = field(default_factory=list)
+    terms: List[str] = field(default_factory=list)
+    matched_words: int = 0
+    total_words: int = 0
+
+    @property
+    def confidence(self) -> float:
+        if not self.total_words or len(set(self.attributes)) != 1:
+            return 0.0
+        if len(set(self.universities)) > 1 or len(set(self.countries)) > 1 or len(set(self.degrees)) > 1:
+            return 0.0
+        if not self.universities and not self.countries:
+            return 0.0
+        return self.matched_words / self.total_words
+
+    def signature(self) -> str:
+        """الكيانات المذكورة في السؤال كنص ثابت (سؤالان عن جامعتين مختلفتين لهما توقيعان مختلفان)"""
+        return ';'.join(f"{name}={','.join(sorted(set(getattr(self, name))))}" for name in _MATCH_FIELDS.values())
+
+
+@dataclass(frozen=True)
+class FastAnswer:
+    intent: str
+    text: str
+    confidence: float
+
+
+class FastAnswerer:
+    """مطابقة النية والكيانات بالعربية والإنجليزية وتوليد إجابة من قالب ثابت
+
+    يُبنى مرة واحدة لكل نسخة من قاعدة المعرفة؛ المطابقة بحث في قاموس لكل كلمة.
+    """
+
+    def __init__(self, kb: KnowledgeBase, min_confidence: float = 0.75):
+        self.kb = kb
+        self.min_confidence = min_confidence
+        # أول كلمة في العبارة -> [(كلمات العبارة، النوع، القيمة)] والأطول أولاً
+        self._lexicon: Dict[str, List[Tuple[Tuple[str, ...], str, str]]] = {}
+        self._build_lexicon()
+
+    def _add(self, phrase: str, kind: str, value: str) -> None:
+        words = tuple(normalized_words(phrase))
+        if not words:
+            return
+        entries = self._lexicon.setdefault(words[0], [])
+        for i, (existing_words, existing_kind, existing_value) in enumerate(entries):
+            if existing_words == words and existing_kind == kind and existing_value != value:
+                # اسم مشترك بين كيانين (مثلاً مدينة لجامعتين) لا يصلح للمطابقة
+                entries[i] = (words, kind, '')
+                return
+        entries.append((words, kind, value))
+        entries.sort(key=lambda entry: -len(entry[0]))
+
+    def _build_lexicon(self) -> None:
+        for kind, table in (('degree', DEGREE_ALIASES), ('attribute', ATTRIBUTE_ALIASES), ('term', TERM_ALIASES)):
+            for value, aliases in table.items():
+                for alias in aliases:
+                    self._add(alias, kind, value)
+        for key, country in self.kb.countries.items():
+            for alias in (country.name, key.replace('_', ' ')) + COUNTRY_ALIASES.get(key, ()):
+                self._add(alias, 'country', key)
+        for key, university in self.kb.universities.items():
+            for alias in self._university_aliases(university):
+                self._add(alias, 'university', key)
+
+    @staticmethod
+    def _university_aliases(university: University) -> List[str]:
+        aliases = [university.key.replace('_', ' ')] + list(UNIVERSITY_ALIASES.get(university.key, ()))
+        abbreviation = _ABBREVIATION_RE.search(university.name)
+        if abbreviation:
+            aliases.append(abbreviation.group(1))
+        words = normalized_words(_ABBREVIATION_RE.sub('', university.name))
+        if words and words[0] == 'جامعه':
+            words = words[1:]
+        if words:
+            aliases.append(' '.join(words))
+            aliases.append(' '.join(words[:2]))
+        return aliases
+
+    def _match_at(self, words: List[str], start: int) -> Optional[Tuple[int, str, str]]:
+        for variant in _variants(words[start]):
+            for phrase, kind, value in self._lexicon.get(variant, ()):
+                end = start + len(phrase)
+                if end > len(words):
+                    continue
+                if all(phrase[j] in _variants(words[start + j]) for j in range(1, len(phrase))):
+                    return len(phrase), kind, value
+        return None
+
+    def match(self, question: str) -> Match:
+        words = normalized_words(question, stopwords=False)
+        result = Match(total_words=len(words))
+        i = 0
+        while i < len(words):
+            found = self._match_at(words, i)
+            if found is not None and found[2]:
+                length, kind, value = found
+                getattr(result, _MATCH_FIELDS[kind]).append(value)
+                result.matched_words += length
+                i += length
+                continue
+            if any(variant in FILLER_WORDS for variant in _variants(words[i])):
+                result.matched_words += 1
+            i += 1
+        return result
+
+    def entities(self, question: str) -> str:
+        return self.match(question).signature()
+
+    def answer(self, question: str, min_confidence: Optional[float] = None) -> Optional[FastAnswer]:
+        """إجابة جاهزة أو None إذا كانت الثقة منخفضة أو المعلومة غير موجودة"""
+        match = self.match(question)
+        confidence = match.confidence
+        if confidence < (self.min_confidence if min_confidence is None else min_confidence):
+            return None
+        attribute = match.attributes[0]
+        degree = match.degrees[0] if match.degrees else None
+        term = match.terms[0] if match.terms else None
+        if match.universities:
+            university = self.kb.universities[match.universities[0]]
+            if match.countries and match.countries[0] != university.country_key:
+                return None
+            render = getattr(self, f"_university_{attribute}", None)
+            text = render(university, degree, term) if render else None
+        else:
+            country = self.kb.countries[match.countries[0]]
+            render = getattr(self, f"_country_{attribute}", None)
+            text = render(country, degree, term) if render else None
+        if not text:
+            return None
+        return FastAnswer(attribute, text, confidence)
+
+    # قوالب الإجابات على مستوى الجامعة
+
+    def _university_deadline(self, university: University, degree, term) -> Optional[str]:
+        deadlines = [d for d in university.deadlines if term is None or d.term in (term, 'general')]
+        if not deadlines:
+            return None
+        lines = [f"⏰ مواعيد التقديم في {university.name}:"]
+        lines += [f"• {_TERM_LABELS[d.term]}: {d.text}" for d in deadlines]
+        return '\n'.join(lines)
+
+    def _university_tuition(self, university: University, degree, term) -> Optional[str]:
+        if not university.tuition:
+            return None
+        return f"💰 الرسوم الدراسية في {university.name}:\n{university.tuition}"
+
+    def _university_language(self, university: University, degree, term) -> Optional[str]:
+        if not university.language_requirement:
+            return None
+        return f"🗣 متطلبات اللغة في {university.name}:\n{university.language_requirement}"
+
+    def _university_documents(self, university: University, degree, term) -> Optional[str]:
+        if not university.documents:
+            return None
+        lines = [f"📄 الوثائق المطلوبة للتقديم في {university.name}:"]
+        lines += [f"• {document}" for document in university.documents]
+        return '\n'.join(lines)
+
+    def _university_programs(self, university: University, degree, term) -> Optional[str]:
+        degrees = [degree] if degree else list(university.programs)
+        lines = [f"🎓 البرامج المتاحة في {university.name}:"]
+        for d in degrees:
+            names = university.programs.get(d)
+            if names:
+                lines.append(f"{_DEGREE_LABELS[d]}: {'، '.join(names)}")
+        return '\n'.join(lines) if len(lines) > 1 else None
+
+    def _university_ranking(self, university: University, degree, term) -> Optional[str]:
+        if university.ranking is None:
+            return None
+        return f"🏆 تصنيف {university.name} عالمياً: {university.ranking}"
+
+    def _university_website(self, university: University, degree, term) -> Optional[str]:
+        if not university.website and not university.application_link:
+            return None
+        lines = [f"🌐 {university.name}:"]
+        if university.website:
+            lines.append(f"الموقع: {university.website}")
+        if university.application_link:
+            lines.append(f"رابط التقديم: {university.application_link}")
+        return '\n'.join(lines)
+
+    # قوالب الإجابات على مستوى الدولة
+
+    def _country_deadline(self, country: Country, degree, term) -> Optional[str]:
+        lines = [f"⏰ مواعيد التقديم في جامعات {country.name}:"]
+        for university in country.universities.values():
+            for d in university.deadlines:
+                if term is None or d.term in (term, 'general'):
+                    lines.append(f"• {university.name} ({_TERM_LABELS[d.term]}): {d.text}")
+        return '\n'.join(lines) if len(lines) > 1 else None
+
+    def _country_tuition(self, country: Country, degree, term) -> Optional[str]:
+        if degree and degree in country.tuition_range:
+            return f"💰 الرسوم الدراسية لدرجة {_DEGREE_LABELS[degree]} في {country.name}: {country.tuition_range[degree]}"
+        if country.tuition_range and not degree:
+            lines = [f"💰 الرسوم الدراسية في {country.name}:"]
+            lines += [f"• {_DEGREE_LABELS[d]}: {text}" for d, text in country.tuition_range.items()]
+            return '\n'.join(lines)
+        if country.tuition and not degree:
+            return f"💰 الرسوم الدراسية في {country.name}:\n{country.tuition}"
+        return None
+
+    def _country_programs(self, country: Country, degree, term) -> Optional[str]:
+        degrees = [degree] if degree else list(_DEGREE_LABELS)
+        lines = [f"🎓 البرامج المتاحة في {country.name}:"]
+        for d in degrees:
+            names = sorted({p.name for p in self.kb.by_degree.get(d, ()) if p.country_key == country.key})
+            if names:
+                lines.append(f"{_DEGREE_LABELS[d]}: {'، '.join(names)}")
+        if len(lines) == 1 and country.specialties and not degree:
+            lines.append('، '.join(country.specialties))
+        return '\n'.join(lines) if len(lines) > 1 else None
+
+    def _country_cities(self, country: Country, degree, term) -> Optional[str]:
+        if not country.cities:
+            return None
+        return f"🏙 أبرز المدن الدراسية في {country.name}: {'، '.join(country.cities)}"
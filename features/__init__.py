@@ -0,0 +1,117 @@
+"""ميزات البوت القابلة للتفعيل عبر FEATURES (الاستمارة، الأسئلة، الخدمات، التواصل...)
+
+كل ميزة وحدة مستقلة تُستورد فقط إذا كانت مفعلة، فلا تُحمّل مكتباتها ولا تُفتح ملفاتها
+ولا تُقرأ متغيرات بيئتها في النشرات التي لا تحتاجها. الوحدة تعرّف:
+
+    COMMANDS                               أسماء الأوامر التي تظهر في /help (نصوصها في ui.COMMAND_HELP)
+    STATE_NAMES                            أسماء حالات المحادثة كما تظهر في المقاييس (اختياري)
+    register(application, core)            تسجيل المعالجات
+    async on_startup(application, core)    تشغيل الخدمات الخلفية (اختياري)
+    async on_shutdown(application, core)   إيقافها (اختياري)
+    async warm_up(core)                    تحميل مسبق في الخلفية بعد بدء التشغيل (اختياري)
+
+الميزة menu (المساعدة والعودة للقائمة) تُحمّل دائماً.
+"""
+import asyncio
+import importlib
+from types import ModuleType
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from fast_answers import FastAnswerer
+from knowledge_base import KnowledgeBase, KnowledgeBaseStore
+
+AVAILABLE = ('onboarding', 'qa', 'services', 'contact', 'search', 'follow', 'echo')
+DEFAULT_FEATURES = 'onboarding,qa,services,contact,search,follow'
+
+
+def load(names: Iterable[str]) -> List[ModuleType]:
+    """استيراد وحدات الميزات المطلوبة بالترتيب؛ menu أخيراً حتى لا تسبق معالجاتها معالجات الميزات"""
+    modules = []
+    for name in names:
+        if name not in AVAILABLE:
+            raise ValueError(f"ميزة غير معروفة في FEATURES: {name} (المتاح: {', '.join(AVAILABLE)})")
+        module = importlib.import_module(f'features.{name}')
+        if module not in modules:
+            modules.append(module)
+    modules.append(importlib.import_module('features.menu'))
+    return modules
+
+
+class Core:
+    """ما تتشاركه الميزات: قاعدة المعرفة والفهارس المشتقة منها وإعدادات التطبيق
+
+    الإجابات الفورية وفهرس /search يُبنيان عند أول استخدام ويُعاد بناؤهما فقط إن كانا
+    محمّلين عند تعديل ملف قاعدة المعرفة.
+    """
+
+    def __init__(self, kb_store: KnowledgeBaseStore, persistent: bool = False,
+                 fast_answer_min_confidence: float = 0.75, search_index_path: Optional[str] = None,
+                 search_dim: int = 1024, search_ann_threshold: int = 20000):
+        self.kb_store = kb_store
+        self.persistent = persistent
+        self.fast_answer_min_confidence = fast_answer_min_confidence
+        self.search_index_path = search_index_path
+        self.search_dim = search_dim
+        self.search_ann_threshold = search_ann_threshold
+        self.commands: Tuple[str, ...] = ()
+        self._fast_answerer: Optional[FastAnswerer] = None
+        self._search_index = None
+        self._search_index_task: Optional[asyncio.Future] = None
+        kb_store.add_listener(self._on_reload)
+
+    @property
+    def kb(self) -> KnowledgeBase:
+        return self.kb_store.current
+
+    @property
+    def fast_answerer(self) -> FastAnswerer:
+        """إجابات فورية من حقول قاعدة المعرفة للأسئلة المنظمة"""
+        if self._fast_answerer is None:
+            self._fast_answerer = FastAnswerer(self.kb, self.fast_answer_min_confidence)
+        return self._fast_answerer
+
+    async def search_index(self):
+        """فهرس متجهات البرامج والجامعات؛ يُفتح من القرص إن كان لنفس نسخة قاعدة المعرفة
+
+        البناء (ومعه استيراد NumPy) في خيط، والطلبات المتزامنة قبل اكتماله (التحميل المسبق
+        وأول /search) تنتظر نفس البناء.
+        """
+        if self._search_index is not None:
+            return self._search_index
+        if self._search_index_task is None or self._search_index_task.done():
+            self._search_index_task = asyncio.ensure_future(self._load_search_index())
+        return await asyncio.shield(self._search_index_task)
+
+    async def _load_search_index(self):
+        kb = self.kb
+        index = await asyncio.to_thread(self._build_search_index, kb)
+        # إذا تغيرت قاعدة المعرفة أثناء البناء لا يُحفظ الفهرس القديم؛ الطلب التالي يبني الجديد
+        if self._search_index is None and kb is self.kb:
+            self._search_index = index
+        return index
+
+    def _build_search_index(self, kb: KnowledgeBase):
+        # NumPy يُستورد هنا فقط حتى لا يؤخر بدء التشغيل
+        from program_search import HashingEmbedder, RandomProjectionANN, SearchIndex
+        return SearchIndex.for_knowledge_base(
+            kb,
+            self.search_index_path,
+            embedder=HashingEmbedder(self.search_dim),
+            ann=RandomProjectionANN(),
+            brute_force_limit=self.search_ann_threshold,
+        )
+
+    async def _on_reload(self, kb: KnowledgeBase) -> Optional[Callable[[], None]]:
+        # البناء (ومعه NumPy لفهرس البحث) في خيط حتى لا تتوقف كل المحادثات أثناءه
+        fast_answerer = search_index = None
+        if self._fast_answerer is not None:
+            fast_answerer = await asyncio.to_thread(FastAnswerer, kb, self.fast_answer_min_confidence)
+        if self._search_index is not None:
+            search_index = await asyncio.to_thread(self._build_search_index, kb)
+
+        def commit() -> None:
+            if fast_answerer is not None:
+                self._fast_answerer = fast_answerer
+            if search_index is not None:
+                self._search_index = search_index
+        return commit
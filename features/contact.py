@@ -0,0 +1,17 @@
+"""معلومات التواصل"""
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import CommandHandler, ContextTypes
+
+import ui
+
+COMMANDS = ('contact',)
+
+
+async def contact_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """معلومات التواصل"""
+    await update.message.reply_text(ui.CONTACT_TEXT, parse_mode=ParseMode.MARKDOWN)
+
+
+def register(application, core) -> None:
+    application.add_handler(CommandHandler("contact", contact_command))
@@ -0,0 +1,36 @@
+"""الوضع الخفيف: ترحيب ورد ثابت على الرسائل دون قاعدة معرفة أو نموذج
+
+يُشغّل وحده (FEATURES=echo أو bot_simple.py) كبديل رخيص عند تعطل OpenAI أو للتجربة.
+"""
+import logging
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes, MessageHandler, filters
+
+import ui
+
+logger = logging.getLogger(__name__)
+
+COMMANDS = ('start', 'about')
+
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """معالج أمر /start"""
+    logger.info(f"تم استقبال /start من {update.effective_user.first_name}")
+    await update.message.reply_text(ui.ECHO_WELCOME.render(first_name=update.effective_user.first_name))
+
+
+async def about_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """معالج أمر /about"""
+    await update.message.reply_text(ui.ABOUT_TEXT)
+
+
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """معالج الرسائل النصية"""
+    await update.message.reply_text(ui.ECHO_REPLY.render(text=update.message.text))
+
+
+def register(application, core) -> None:
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("about", about_command))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
@@ -0,0 +1,105 @@
+"""تذكير المشتركين بمواعيد التقديم: /follow و /unfollow و /following
+
+كومة أحداث ومهمة JobQueue واحدة مهما زاد عدد المشتركين.
+"""
+import os
+
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import CommandHandler, ContextTypes
+
+import ui
+from reminders import ReminderScheduler, SendPacer, SubscriptionStore, program_target, university_target
+
+COMMANDS = ('follow', 'following', 'unfollow')
+
+SUBSCRIPTIONS_PATH = os.getenv('SUBSCRIPTIONS_PATH', 'subscriptions.sqlite3')  # اشتراكات تذكير المواعيد
+REMINDER_DAYS = [int(d) for d in os.getenv('REMINDER_DAYS', '30,7,1').split(',') if d.strip()]  # أيام التذكير قبل الموعد
+REMINDER_HOUR = int(os.getenv('REMINDER_HOUR', '9'))  # ساعة إرسال التذكيرات (UTC)
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', '500'))  # مشتركون يُقرؤون من القاعدة في كل دفعة
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '25'))  # رسائل تذكير في الثانية (حد Telegram للبث نحو 30)
+
+SUBSCRIPTIONS = SubscriptionStore(SUBSCRIPTIONS_PATH)
+REMINDERS = ReminderScheduler(
+    SUBSCRIPTIONS,
+    # الدفعة الأولى ثانية واحدة من المعدل حتى لا تتجاوز عدة عمال حد Telegram معاً
+    SendPacer(rate=BROADCAST_RATE, burst=BROADCAST_RATE, on_blocked=SUBSCRIPTIONS.unsubscribe),
+    days_before=REMINDER_DAYS,
+    hour=REMINDER_HOUR,
+    batch_size=REMINDER_BATCH_SIZE,
+)
+
+CORE = None
+
+
+async def resolve_follow_target(text: str):
+    """(الهدف، الاسم المعروض) لجامعة أو برنامج من نص المستخدم، أو None"""
+    universities = set(CORE.fast_answerer.match(text).universities)
+    kb = CORE.kb
+    if len(universities) == 1:
+        university = kb.universities[universities.pop()]
+        return university_target(university.key), university.name
+    index = await CORE.search_index()
+    from program_search import parse_query
+    results = index.search(parse_query(text), top_k=1, min_score=0.5, kinds=('program',))
+    if results:
+        name = results[0].entry.title
+        return program_target(name), name
+    return None
+
+
+async def follow_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """الاشتراك في تذكيرات مواعيد جامعة أو برنامج: /follow TUM أو /follow الذكاء الاصطناعي"""
+    text = ' '.join(context.args or ())
+    if not text:
+        await update.message.reply_text(ui.FOLLOW_USAGE_TEXT, parse_mode=ParseMode.MARKDOWN)
+        return
+    target = await resolve_follow_target(text)
+    if target is None:
+        await update.message.reply_text(ui.FOLLOW_NOT_FOUND.render(text=text))
+        return
+    SUBSCRIPTIONS.subscribe(update.effective_user.id, *target)
+    await update.message.reply_text(ui.FOLLOWED.render(label=target[1]))
+
+
+async def unfollow_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """إلغاء اشتراك واحد أو كل الاشتراكات عند عدم تحديد اسم"""
+    text = ' '.join(context.args or ())
+    user_id = update.effective_user.id
+    if not text:
+        SUBSCRIPTIONS.unsubscribe(user_id)
+        await update.message.reply_text(ui.UNFOLLOWED_ALL_TEXT)
+        return
+    target = await resolve_follow_target(text)
+    if target is None or not SUBSCRIPTIONS.unsubscribe(user_id, target[0]):
+        await update.message.reply_text(ui.NOT_FOLLOWING.render(text=text))
+        return
+    await update.message.reply_text(ui.UNFOLLOWED.render(label=target[1]))
+
+
+async def following_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """قائمة الجامعات والبرامج التي يتابعها المستخدم"""
+    subscriptions = SUBSCRIPTIONS.subscriptions(update.effective_user.id)
+    if not subscriptions:
+        await update.message.reply_text(ui.FOLLOW_USAGE_TEXT, parse_mode=ParseMode.MARKDOWN)
+        return
+    labels = '\n'.join(f"• {label}" for _, label in subscriptions)
+    await update.message.reply_text(ui.FOLLOWING_LIST.render(labels=labels))
+
+
+def register(application, core) -> None:
+    global CORE
+    if CORE is None:
+        core.kb_store.add_listener(REMINDERS.prepare_reload)
+    CORE = core
+    application.add_handler(CommandHandler("follow", follow_command))
+    application.add_handler(CommandHandler("unfollow", unfollow_command))
+    application.add_handler(CommandHandler("following", following_command))
+
+
+async def on_startup(application, core) -> None:
+    REMINDERS.start(application, core.kb)
+
+
+async def on_shutdown(application, core) -> None:
+    await REMINDERS.stop()
@@ -0,0 +1,48 @@
+"""المساعدة والعودة للقائمة الرئيسية؛ تُحمّل مع كل مجموعة ميزات"""
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes
+
+import ui
+
+COMMANDS = ('help',)
+
+HELP_TEXT = ui.help_text(())
+
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """أمر المساعدة"""
+    await update.message.reply_text(HELP_TEXT, parse_mode=ParseMode.MARKDOWN)
+
+
+def leave_question_mode(user_data: dict) -> None:
+    """الخروج من وضع الأسئلة وإنهاء سجل المتابعة (العودة للقائمة أو بدء الاستمارة)"""
+    user_data['waiting_for_question'] = False
+    user_data.pop('qa_history', None)
+
+
+async def back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """العودة إلى القائمة الرئيسية"""
+    query = update.callback_query
+    await query.answer()
+
+    leave_question_mode(context.user_data)
+
+    await query.edit_message_text(ui.MAIN_MENU_TEXT, reply_markup=ui.MAIN_MENU_KEYBOARD, parse_mode=ParseMode.MARKDOWN)
+
+
+async def unavailable(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """زر لميزة غير مفعلة في هذا النشر: إيقاف مؤشر التحميل بدلاً من تجاهل الضغطة"""
+    await update.callback_query.answer(ui.UNAVAILABLE_TEXT)
+
+
+def register(application, core) -> None:
+    global HELP_TEXT
+    HELP_TEXT = ui.help_text(core.commands)
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CallbackQueryHandler(back_to_menu, pattern="back_to_menu"))
+
+
+def register_fallbacks(application, core) -> None:
+    """يُسجل بعد كل الميزات حتى لا يلتقط أزرارها"""
+    application.add_handler(CallbackQueryHandler(unavailable))
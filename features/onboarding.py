@@ -0,0 +1,323 @@
+"""استمارة التقديم: الترحيب، التحقق من المتابعة، بيانات الطالب، رفع الوثائق ثم الإرسال
+
+الطلبات تُرسل عبر طابور دائم إلى Make.com وتُصدّر بدفعات إلى Google Sheets (اختياري).
+"""
+import logging
+import os
+from datetime import datetime, timezone
+
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes, ConversationHandler, MessageHandler, filters
+
+import ui
+from documents import DocumentPipeline, DocumentRejected
+from features.menu import back_to_menu, leave_question_mode
+from metrics import REGISTRY, Gauge
+from outbound_queue import OutboundQueue
+from sheets_sink import SheetsSink, open_worksheet, submission_row
+
+logger = logging.getLogger(__name__)
+
+COMMANDS = ('start',)
+
+MAKE_WEBHOOK_URL = os.getenv('MAKE_WEBHOOK_URL', '')  # سيتم تعيينه لاحقاً
+OUTBOUND_QUEUE_PATH = os.getenv('OUTBOUND_QUEUE_PATH', 'outbound_queue.sqlite3')  # طابور الإرسال على القرص
+MAKE_WEBHOOK_WORKERS = int(os.getenv('MAKE_WEBHOOK_WORKERS', '4'))
+MAKE_WEBHOOK_BATCH_SIZE = int(os.getenv('MAKE_WEBHOOK_BATCH_SIZE', '1'))  # أكبر من 1 إذا كان الـ webhook يقبل مصفوفة
+MAKE_WEBHOOK_MAX_ATTEMPTS = int(os.getenv('MAKE_WEBHOOK_MAX_ATTEMPTS', '8'))
+GOOGLE_CREDS_JSON = os.getenv('GOOGLE_CREDS_JSON', '')  # بيانات حساب الخدمة لتصدير الطلبات إلى Google Sheets
+GOOGLE_SHEET_KEY = os.getenv('GOOGLE_SHEET_KEY', '')  # معرف جدول البيانات (من رابطه)
+GOOGLE_WORKSHEET = os.getenv('GOOGLE_WORKSHEET', '')  # اسم ورقة العمل (افتراضياً الورقة الأولى)
+SHEETS_BATCH_SIZE = int(os.getenv('SHEETS_BATCH_SIZE', '50'))
+SHEETS_FLUSH_INTERVAL = float(os.getenv('SHEETS_FLUSH_INTERVAL', '5'))  # أقصى مدة بقاء صف في المخزن
+SHEETS_RATE_LIMIT = float(os.getenv('SHEETS_RATE_LIMIT', '1'))  # طلبات كتابة في الثانية (حصة Sheets: 60 في الدقيقة)
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'uploads')  # مجلد حفظ وثائق الطلاب
+DOC_MAX_SIZE = int(os.getenv('DOC_MAX_SIZE', str(10 * 1024 * 1024)))  # أقصى حجم للوثيقة بالبايت
+DOC_DOWNLOAD_CONCURRENCY = int(os.getenv('DOC_DOWNLOAD_CONCURRENCY', '4'))  # أقصى عدد تنزيلات متزامنة
+DOC_PROCESS_WORKERS = int(os.getenv('DOC_PROCESS_WORKERS', '2'))  # عمليات الصور المصغرة واستخراج النص (0 للتعطيل)
+
+# طابور دائم لإرسال طلبات التقديم إلى Make.com دون انتظار الرد
+OUTBOUND_QUEUE = OutboundQueue(
+    MAKE_WEBHOOK_URL,
+    OUTBOUND_QUEUE_PATH,
+    workers=MAKE_WEBHOOK_WORKERS,
+    batch_size=MAKE_WEBHOOK_BATCH_SIZE,
+    max_attempts=MAKE_WEBHOOK_MAX_ATTEMPTS,
+)
+
+# تصدير طلبات التقديم إلى Google Sheets بدفعات (اختياري)
+SHEETS_SINK = SheetsSink(
+    lambda: open_worksheet(GOOGLE_CREDS_JSON, GOOGLE_SHEET_KEY, GOOGLE_WORKSHEET),
+    batch_size=SHEETS_BATCH_SIZE,
+    flush_interval=SHEETS_FLUSH_INTERVAL,
+    rate=SHEETS_RATE_LIMIT,
+) if GOOGLE_CREDS_JSON and GOOGLE_SHEET_KEY else None
+
+# تنزيل ومعالجة وثائق الطلاب في الخلفية
+DOCUMENTS = DocumentPipeline(
+    UPLOAD_DIR,
+    max_size=DOC_MAX_SIZE,
+    download_concurrency=DOC_DOWNLOAD_CONCURRENCY,
+    process_workers=DOC_PROCESS_WORKERS,
+)
+
+REGISTRY.register(Gauge('glovuni_outbound_queue_pending', 'Submissions waiting for delivery.',
+                        function=OUTBOUND_QUEUE.pending))
+
+# حالات المحادثة
+(VERIFY_INSTAGRAM, GET_NAME, GET_EMAIL, GET_PHONE, GET_FIELD,
+ UPLOAD_DOCUMENTS, CONFIRM_SUBMISSION) = range(7)
+
+# أسماء الحالات كما تظهر في المقاييس
+STATE_NAMES = {
+    VERIFY_INSTAGRAM: 'VERIFY_INSTAGRAM',
+    GET_NAME: 'GET_NAME',
+    GET_EMAIL: 'GET_EMAIL',
+    GET_PHONE: 'GET_PHONE',
+    GET_FIELD: 'GET_FIELD',
+    UPLOAD_DOCUMENTS: 'UPLOAD_DOCUMENTS',
+    CONFIRM_SUBMISSION: 'CONFIRM_SUBMISSION',
+}
+
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """بدء المحادثة والترحيب بالمستخدم"""
+    user = update.effective_user
+    leave_question_mode(context.user_data)
+
+    welcome_message = ui.WELCOME.render(first_name=user.first_name)
+    await update.message.reply_text(welcome_message, reply_markup=ui.MAIN_MENU_KEYBOARD, parse_mode=ParseMode.MARKDOWN)
+    return VERIFY_INSTAGRAM
+
+
+async def verify_instagram(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """التحقق من متابعة Instagram"""
+    query = update.callback_query
+    await query.answer()
+
+    await query.edit_message_text(ui.VERIFY_TEXT, reply_markup=ui.VERIFY_KEYBOARD, parse_mode=ParseMode.MARKDOWN)
+    return VERIFY_INSTAGRAM
+
+
+async def start_application(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """بدء استمارة التقديم"""
+    query = update.callback_query
+    await query.answer()
+
+    user_id = query.from_user.id
+    # نص الاسم والبريد والهاتف ليس سؤالاً للنموذج
+    leave_question_mode(context.user_data)
+
+    # حفظ معرف المستخدم وحالة التحقق في السياق (تُحفظ عبر طبقة الحفظ)
+    context.user_data['user_id'] = user_id
+    context.user_data['verified'] = True
+
+    # طلب الاسم
+    await query.edit_message_text(ui.APPLICATION_START_TEXT, parse_mode=ParseMode.MARKDOWN)
+    return GET_NAME
+
+
+async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """الحصول على اسم المستخدم"""
+    name = update.message.text
+    context.user_data['name'] = name
+
+    await update.message.reply_text(ui.NAME_RECEIVED.render(name=name))
+    return GET_EMAIL
+
+
+async def get_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """الحصول على البريد الإلكتروني"""
+    email = update.message.text
+    context.user_data['email'] = email
+
+    await update.message.reply_text(ui.EMAIL_RECEIVED)
+    return GET_PHONE
+
+
+async def get_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """الحصول على رقم الهاتف"""
+    phone = update.message.text
+    context.user_data['phone'] = phone
+
+    # أزرار اختيار التخصص
+    await update.message.reply_text(ui.PHONE_RECEIVED, reply_markup=ui.FIELD_KEYBOARD)
+    return GET_FIELD
+
+
+async def get_field(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """الحصول على مجال الدراسة"""
+    query = update.callback_query
+    await query.answer()
+
+    field = ui.FIELD_NAMES.get(query.data, 'غير محدد')
+    context.user_data['field'] = field
+
+    message = ui.SUBMISSION_SUMMARY.render(
+        name=context.user_data['name'],
+        email=context.user_data['email'],
+        phone=context.user_data['phone'],
+        field=field,
+    )
+    context.user_data['documents'] = []
+
+    await query.edit_message_text(message + ui.UPLOAD_PROMPT_TEXT, reply_markup=ui.UPLOAD_KEYBOARD, parse_mode=ParseMode.MARKDOWN)
+    return UPLOAD_DOCUMENTS
+
+
+async def receive_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """استلام وثيقة أو صورة؛ التنزيل والمعالجة يتمان في الخلفية والرد فوري"""
+    message = update.message
+    if message.document is not None:
+        telegram_file = message.document
+        file_name = telegram_file.file_name or telegram_file.file_unique_id
+        mime_type = telegram_file.mime_type
+    else:
+        # أكبر دقة متاحة من الصورة
+        telegram_file = message.photo[-1]
+        file_name = f"photo_{telegram_file.file_unique_id}.jpg"
+        mime_type = 'image/jpeg'
+
+    try:
+        DOCUMENTS.validate(file_name, mime_type, telegram_file.file_size)
+    except DocumentRejected as e:
+        await message.reply_text(f"❌ {e}", reply_markup=ui.UPLOAD_KEYBOARD)
+        return UPLOAD_DOCUMENTS
+
+    DOCUMENTS.submit(update.effective_user.id, telegram_file, file_name, mime_type)
+    await message.reply_text(ui.DOCUMENT_RECEIVED.render(file_name=file_name), reply_markup=ui.UPLOAD_KEYBOARD)
+    return UPLOAD_DOCUMENTS
+
+
+async def collect_documents(user_id: int, user_data: dict) -> list:
+    """ضم الوثائق المكتملة إلى بيانات المستخدم وإرجاع رسائل الوثائق التي فشلت"""
+    documents = user_data.setdefault('documents', [])
+    seen = {document['sha256'] for document in documents}
+    errors = []
+    for result in await DOCUMENTS.collect(user_id):
+        if result.error:
+            errors.append(result.error)
+        elif result.document.sha256 not in seen:
+            seen.add(result.document.sha256)
+            documents.append(result.document.manifest_entry())
+    return errors
+
+
+async def finish_uploads(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """انتظار الوثائق الجارية ثم عرض الطلب للتأكيد"""
+    query = update.callback_query
+    await query.answer()
+
+    errors = await collect_documents(update.effective_user.id, context.user_data)
+    documents = context.user_data.get('documents') or []
+    lines = [f"✅ {document['file_name']}" for document in documents]
+    lines += [f"❌ {error}" for error in errors]
+    message = ui.CONFIRM_TEXT.render(
+        name=context.user_data.get('name'),
+        field=context.user_data.get('field'),
+        documents='\n'.join(lines) or ui.NO_DOCUMENTS_TEXT,
+    )
+
+    await query.edit_message_text(message, reply_markup=ui.CONFIRM_KEYBOARD, parse_mode=ParseMode.MARKDOWN)
+    return CONFIRM_SUBMISSION
+
+
+async def upload_more(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """العودة لرفع وثائق إضافية قبل الإرسال"""
+    query = update.callback_query
+    await query.answer()
+
+    await query.edit_message_text(ui.UPLOAD_MORE_TEXT, reply_markup=ui.UPLOAD_KEYBOARD)
+    return UPLOAD_DOCUMENTS
+
+
+async def confirm_submission(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """إرسال الطلب مع قائمة الوثائق إلى Make.com و Google Sheets"""
+    query = update.callback_query
+    await query.answer()
+
+    # وثائق وصلت بعد شاشة المراجعة
+    await collect_documents(update.effective_user.id, context.user_data)
+    submission = build_submission(context.user_data)
+    submission['documents'] = context.user_data.pop('documents', None) or []
+    await send_to_make(submission)
+    if SHEETS_SINK is not None:
+        SHEETS_SINK.add(submission_row(submission))
+
+    await query.edit_message_text(ui.SUBMITTED_TEXT, reply_markup=ui.SUBMITTED_KEYBOARD, parse_mode=ParseMode.MARKDOWN)
+    return ConversationHandler.END
+
+
+def build_submission(user_data: dict) -> dict:
+    """بيانات طلب التقديم كما تُرسل إلى Make.com و Google Sheets"""
+    return {
+        'name': user_data.get('name'),
+        'email': user_data.get('email'),
+        'phone': user_data.get('phone'),
+        'field': user_data.get('field'),
+        'timestamp': str(user_data.get('timestamp') or datetime.now(timezone.utc).isoformat())
+    }
+
+
+async def send_to_make(payload: dict) -> None:
+    """إضافة بيانات التقديم إلى طابور الإرسال إلى Make.com"""
+    if not MAKE_WEBHOOK_URL:
+        logger.warning("MAKE_WEBHOOK_URL غير محدد")
+        return
+
+    # الحفظ على القرص فوري؛ الإرسال وإعادة المحاولة تتم في الخلفية
+    OUTBOUND_QUEUE.enqueue(payload)
+    logger.info(f"تمت إضافة طلب التقديم إلى طابور الإرسال: {payload.get('name')}")
+
+
+def register(application, core) -> None:
+    # معالج المحادثة
+    conv_handler = ConversationHandler(
+        entry_points=[
+            CommandHandler("start", start),
+            CallbackQueryHandler(start_application, pattern="start_application"),
+        ],
+        states={
+            # أزرار الأسئلة والخدمات في القائمة تعالجها ميزاتها إن كانت مفعلة
+            VERIFY_INSTAGRAM: [
+                CallbackQueryHandler(verify_instagram, pattern="verify_instagram"),
+                CallbackQueryHandler(start_application, pattern="start_application"),
+            ],
+            GET_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_name)],
+            GET_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_email)],
+            GET_PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_phone)],
+            GET_FIELD: [CallbackQueryHandler(get_field, pattern="field_")],
+            UPLOAD_DOCUMENTS: [
+                MessageHandler(filters.Document.ALL | filters.PHOTO, receive_document),
+                CallbackQueryHandler(finish_uploads, pattern="^(done_uploads|skip_uploads)$"),
+            ],
+            CONFIRM_SUBMISSION: [
+                CallbackQueryHandler(confirm_submission, pattern="^confirm_submission$"),
+                CallbackQueryHandler(upload_more, pattern="^upload_more$"),
+            ],
+        },
+        fallbacks=[
+            CallbackQueryHandler(back_to_menu, pattern="back_to_menu"),
+            CommandHandler("start", start),
+        ],
+        name="application_form",
+        persistent=core.persistent,
+    )
+    application.add_handler(conv_handler)
+    application.add_handler(CallbackQueryHandler(start_application, pattern="start_application"))
+
+
+async def on_startup(application, core) -> None:
+    if MAKE_WEBHOOK_URL:
+        await OUTBOUND_QUEUE.start()
+    if SHEETS_SINK is not None:
+        SHEETS_SINK.start()
+    await DOCUMENTS.start()
+
+
+async def on_shutdown(application, core) -> None:
+    await OUTBOUND_QUEUE.stop()
+    if SHEETS_SINK is not None:
+        await SHEETS_SINK.stop()
+    await DOCUMENTS.stop()
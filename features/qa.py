@@ -0,0 +1,225 @@
+"""الأسئلة الحرة: إجابات فورية من قاعدة المعرفة، ثم الذاكرة المؤقتة، ثم النموذج
+
+قاطع الدائرة يحول الأسئلة إلى الوضع المخفف (إجابات قاعدة المعرفة فقط) عندما تكثر أخطاء
+النموذج أو يبطؤ، ويعود تلقائياً بعد نجاح طلب تجربة.
+"""
+import logging
+import os
+
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import CallbackQueryHandler, ContextTypes, MessageHandler, filters
+
+import ui
+from answer_cache import AnswerCache
+from llm_gateway import CircuitBreaker, CircuitOpenError, LLMGateway, stream_reply
+from metrics import FAST_ANSWERS, QA_DEGRADED, REGISTRY, Gauge
+from qa_history import QAHistory
+
+logger = logging.getLogger(__name__)
+
+COMMANDS = ()
+
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None  # لخادم متوافق مع OpenAI (مثلاً خادم وهمي محلي)
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))  # أقصى عدد طلبات متزامنة للنموذج
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))  # مهلة كل طلب بالثواني
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_STREAMING = os.getenv('LLM_STREAMING', '1') == '1'  # تعديل الرد تدريجياً مع وصول الإجابة
+LLM_BREAKER_WINDOW = int(os.getenv('LLM_BREAKER_WINDOW', '20'))  # عدد آخر الطلبات المحتسبة (0 لتعطيل القاطع)
+LLM_BREAKER_MIN_CALLS = int(os.getenv('LLM_BREAKER_MIN_CALLS', '5'))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv('LLM_BREAKER_FAILURE_RATE', '0.5'))  # نسبة الطلبات الفاشلة أو البطيئة لفتح القاطع
+LLM_BREAKER_SLOW_SECONDS = float(os.getenv('LLM_BREAKER_SLOW_SECONDS', '15'))  # الطلب الأبطأ من هذا يُعد فاشلاً
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv('LLM_BREAKER_OPEN_SECONDS', '30'))  # مدة الوضع المخفف قبل طلب تجربة
+KB_CONTEXT_TOKEN_BUDGET = int(os.getenv('KB_CONTEXT_TOKEN_BUDGET', '800'))  # الحد الأقصى لسياق قاعدة المعرفة
+KB_TOP_K = int(os.getenv('KB_TOP_K', '5'))  # عدد الأجزاء المسترجعة لكل سؤال
+QA_MULTI_TURN = os.getenv('QA_MULTI_TURN', '1') == '1'  # إبقاء وضع الأسئلة مفتوحاً لأسئلة المتابعة
+QA_HISTORY_TURNS = int(os.getenv('QA_HISTORY_TURNS', '6'))  # عدد الأدوار الأخيرة المرسلة كاملة للنموذج
+QA_HISTORY_TOKEN_BUDGET = int(os.getenv('QA_HISTORY_TOKEN_BUDGET', '1200'))
+QA_SUMMARY_TOKEN_BUDGET = int(os.getenv('QA_SUMMARY_TOKEN_BUDGET', '200'))  # ملخص الأدوار الأقدم
+QA_SESSION_TTL = float(os.getenv('QA_SESSION_TTL', '1800'))  # بعدها يبدأ السجل من جديد
+ANSWER_CACHE_PATH = os.getenv('ANSWER_CACHE_PATH', 'answer_cache.sqlite3')
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '5000'))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', str(7 * 86400)))  # صلاحية الإجابة بالثواني
+ANSWER_CACHE_FUZZY_THRESHOLD = float(os.getenv('ANSWER_CACHE_FUZZY_THRESHOLD', '0.85'))  # حد التشابه للمطابقة التقريبية
+
+# في الوضع المخفف تُقبل إجابة فورية بثقة أقل من المعتاد بدلاً من لا شيء
+DEGRADED_MIN_CONFIDENCE = 0.2
+DEGRADED_EXCERPT_CHARS = 700
+
+# بوابة OpenAI غير المتزامنة (لا تحجب حلقة الأحداث)
+LLM_GATEWAY = LLMGateway(
+    OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
+    model=OPENAI_MODEL,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    timeout=LLM_TIMEOUT,
+    max_retries=LLM_MAX_RETRIES,
+    breaker=CircuitBreaker(
+        window=LLM_BREAKER_WINDOW,
+        min_calls=LLM_BREAKER_MIN_CALLS,
+        failure_rate=LLM_BREAKER_FAILURE_RATE,
+        slow_call_seconds=LLM_BREAKER_SLOW_SECONDS,
+        open_seconds=LLM_BREAKER_OPEN_SECONDS,
+    ) if LLM_BREAKER_WINDOW > 0 else None,
+)
+
+ANSWER_CACHE = None
+
+CORE = None
+
+
+async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """الإجابة على الأسئلة باستخدام AI"""
+    query = update.callback_query
+    await query.answer()
+
+    await query.edit_message_text(ui.ASK_QUESTION_TEXT, reply_markup=ui.BACK_KEYBOARD, parse_mode=ParseMode.MARKDOWN)
+    context.user_data['waiting_for_question'] = True
+
+
+def get_qa_history(user_data: dict) -> QAHistory:
+    """سجل أسئلة المستخدم مع تصفيره بعد فترة الخمول"""
+    history = user_data.get('qa_history')
+    if history is None or history.expired(QA_SESSION_TTL):
+        history = user_data['qa_history'] = QAHistory()
+    return history
+
+
+def remember_answer(history: QAHistory, question: str, answer: str) -> None:
+    history.add(
+        question,
+        answer,
+        max_turns=QA_HISTORY_TURNS,
+        token_budget=QA_HISTORY_TOKEN_BUDGET,
+        summary_tokens=QA_SUMMARY_TOKEN_BUDGET,
+    )
+
+
+def degraded_answer(question: str) -> str:
+    """إجابة دون النموذج: إجابة فورية بثقة أقل، أو أقرب جزء من قاعدة المعرفة، أو نص ثابت"""
+    fast_answer = CORE.fast_answerer.answer(question, min_confidence=DEGRADED_MIN_CONFIDENCE)
+    if fast_answer:
+        QA_DEGRADED.inc(source='fast_answer')
+        return fast_answer.text
+    results = CORE.kb.index.search(question, top_k=1)
+    if results:
+        QA_DEGRADED.inc(source='knowledge_base')
+        # السطر الأول من الجزء هو مساره في قاعدة المعرفة ([faq] ...)
+        excerpt = results[0][1].text.split('\n', 1)[-1]
+        if len(excerpt) > DEGRADED_EXCERPT_CHARS:
+            excerpt = excerpt[:DEGRADED_EXCERPT_CHARS].rstrip() + '…'
+        return ui.QA_DEGRADED.render(excerpt=excerpt)
+    QA_DEGRADED.inc(source='static')
+    return ui.QA_UNAVAILABLE_TEXT
+
+
+async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """معالجة الأسئلة والإجابة عليها"""
+    if not context.user_data.get('waiting_for_question'):
+        return
+
+    question = update.message.text
+    # في وضع المتابعة يبقى المستخدم في وضع الأسئلة حتى يعود للقائمة
+    context.user_data['waiting_for_question'] = QA_MULTI_TURN
+    history = get_qa_history(context.user_data) if QA_MULTI_TURN else QAHistory()
+
+    reply_markup = ui.ANSWER_KEYBOARD
+
+    # سؤال عن حقل محدد (موعد، رسوم، لغة...) تتم إجابته من قاعدة المعرفة مباشرة
+    fast_answer = CORE.fast_answerer.answer(question)
+    if fast_answer:
+        FAST_ANSWERS.inc(intent=fast_answer.intent)
+        await update.message.reply_text(fast_answer.text, reply_markup=reply_markup)
+        remember_answer(history, question, fast_answer.text)
+        return
+
+    # إجابة محفوظة لسؤال مطابق أو مشابه دون استدعاء النموذج
+    # (فقط للسؤال الأول؛ إجابة سؤال المتابعة تعتمد على ما قبله)
+    if not history:
+        cached_answer = ANSWER_CACHE.get(question)
+        if cached_answer:
+            await update.message.reply_text(cached_answer, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+            remember_answer(history, question, cached_answer)
+            return
+
+    # الإجابة الذكية باستخدام OpenAI مع قاعدة المعرفة
+    try:
+        # استرجاع الأجزاء ذات الصلة بالسؤال فقط من قاعدة المعرفة؛
+        # سؤال المتابعة القصير يُكمل بالسؤال السابق ليجد نفس الجامعة أو الدولة
+        retrieval_query = ' '.join(filter(None, (history.last_question(), question)))
+        knowledge_context = CORE.kb.index.build_context(retrieval_query, KB_CONTEXT_TOKEN_BUDGET, KB_TOP_K)
+
+        messages = [
+            {
+                "role": "system",
+                "content": f"""أنت مساعد متخصص في استشارات التعليم العالي بالخارج لشركة Glovuni.
+
+قاعدة المعرفة:
+{knowledge_context}
+
+الإجابة يجب أن تكون:
+- مفيدة وشاملة
+- باللغة العربية
+- مستندة على قاعدة المعرفة
+- تشجع المستخدم على التقديم معنا
+- تتضمن معلومات عملية وفعلية"""
+            },
+            *history.messages(),
+            {
+                "role": "user",
+                "content": question
+            }
+        ]
+
+        if LLM_STREAMING:
+            answer = await stream_reply(
+                update.message,
+                LLM_GATEWAY.stream(messages, max_tokens=500, temperature=0.7),
+                reply_markup=reply_markup,
+            )
+        else:
+            answer = await LLM_GATEWAY.complete(messages, max_tokens=500, temperature=0.7)
+            await update.message.reply_text(answer, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+
+        if not history:
+            ANSWER_CACHE.put(question, answer)
+        remember_answer(history, question, answer)
+
+    except CircuitOpenError:
+        # لا يُحفظ في الذاكرة المؤقتة ولا في السجل: ليست إجابة النموذج
+        await update.message.reply_text(degraded_answer(question), reply_markup=reply_markup)
+
+    except Exception as e:
+        logger.error(f"خطأ في OpenAI: {e}")
+        await update.message.reply_text(ui.QUESTION_ERROR_TEXT)
+
+
+def register(application, core) -> None:
+    global ANSWER_CACHE, CORE
+    CORE = core
+    if ANSWER_CACHE is None:
+        # ذاكرة مؤقتة للإجابات المتكررة؛ تُبطل تلقائياً عند تعديل ملف قاعدة المعرفة
+        ANSWER_CACHE = AnswerCache(
+            ANSWER_CACHE_PATH,
+            core.kb_store.path,
+            max_entries=ANSWER_CACHE_MAX_ENTRIES,
+            ttl=ANSWER_CACHE_TTL,
+            fuzzy_threshold=ANSWER_CACHE_FUZZY_THRESHOLD,
+            # المطابقة التقريبية فقط بين أسئلة عن نفس الجامعة/الدولة/الدرجة/الفصل
+            entity_key=lambda question: CORE.fast_answerer.entities(question),
+        )
+        REGISTRY.register(Gauge('glovuni_answer_cache_hit_ratio', 'Answer cache hit ratio.',
+                                function=lambda: ANSWER_CACHE.stats()['hit_ratio']))
+    application.add_handler(CallbackQueryHandler(ask_question, pattern="ask_question"))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_question))
+
+
+async def warm_up(core) -> None:
+    await LLM_GATEWAY.warm_up()
+    core.fast_answerer
+
+
+async def on_shutdown(application, core) -> None:
+    await LLM_GATEWAY.close()
@@ -0,0 +1,46 @@
+"""البحث الدلالي في البرامج والجامعات: /search"""
+import os
+
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import CommandHandler, ContextTypes
+
+import ui
+
+COMMANDS = ('search',)
+
+SEARCH_TOP_K = int(os.getenv('SEARCH_TOP_K', '5'))
+SEARCH_CHEAP_TUITION = float(os.getenv('SEARCH_CHEAP_TUITION', '3000'))  # سقف الرسوم لكلمات مثل "رخيص" و cheap
+
+CORE = None
+
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """بحث دلالي في البرامج والجامعات: /search ماجستير هندسة بالإنجليزي رخيص"""
+    text = ' '.join(context.args or ())
+    if not text:
+        await update.message.reply_text(ui.SEARCH_USAGE_TEXT, parse_mode=ParseMode.MARKDOWN)
+        return
+
+    # قبل استيراد program_search: الفهرس يستورد NumPy في خيط إن لم يكن محملاً
+    index = await CORE.search_index()
+    from program_search import describe_query, format_results, parse_query
+    query = parse_query(text, cheap_tuition=SEARCH_CHEAP_TUITION)
+    results = index.search(query, top_k=SEARCH_TOP_K)
+    filters = describe_query(query)
+    if not results:
+        await update.message.reply_text(ui.SEARCH_NO_RESULTS.render(filters=filters or '-'))
+        return
+
+    header = ui.SEARCH_RESULTS_HEADER.render(filters=f" ({filters})" if filters else '')
+    await update.message.reply_text(header + format_results(CORE.kb, results), reply_markup=ui.ANSWER_KEYBOARD)
+
+
+def register(application, core) -> None:
+    global CORE
+    CORE = core
+    application.add_handler(CommandHandler("search", search_command))
+
+
+async def warm_up(core) -> None:
+    await core.search_index()
@@ -0,0 +1,26 @@
+"""معلومات خدمات Glovuni (زر القائمة والأمر /services)"""
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes
+
+import ui
+
+COMMANDS = ('services',)
+
+
+async def services(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """عرض معلومات الخدمات"""
+    query = update.callback_query
+    await query.answer()
+
+    await query.edit_message_text(ui.SERVICES_TEXT, reply_markup=ui.SERVICES_KEYBOARD, parse_mode=ParseMode.MARKDOWN)
+
+
+async def services_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """أمر /services"""
+    await update.message.reply_text(ui.SERVICES_TEXT, reply_markup=ui.SERVICES_KEYBOARD, parse_mode=ParseMode.MARKDOWN)
+
+
+def register(application, core) -> None:
+    application.add_handler(CommandHandler("services", services_command))
+    application.add_handler(CallbackQueryHandler(services, pattern="services"))
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {
+    200: 'OK', 202: 'Accepted', 204: 'No Content', 400: 'Bad Request', 401: 'Unauthorized',
+    403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed', 408: 'Request Timeout', 413: 'Payload Too Large',
+    429: 'Too Many Requests', 500: 'Internal Server Error', 502: 'Bad Gateway',
+    503: 'Service Unavailable',
+}
+
+
+@dataclass
+class Request:
+    """طلب HTTP بعد تحليله"""
+    method: str
+    path: str
+    query: Dict[str, list]
+    headers: Dict[str, str]
+    body: bytes = b''
+
+    def json(self):
+        return json.loads(self.body or b'null')
+
+
+@dataclass
+class Response:
+    """رد HTTP؛ إذا كان stream مولّداً غير متزامن يُرسل الجسم بترميز chunked"""
+    status: int = 200
+    body: bytes = b''
+    content_type: str = 'text/plain; charset=utf-8'
+    headers: Dict[str, str] = field(default_factory=dict)
+    stream: Optional[AsyncIterator[bytes]] = None
+
+    @classmethod
+    def json(cls, data, status: int = 200) -> 'Response':
+        return cls(status, json.dumps(data, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+    @classmethod
+    def text(cls, text: str, status: int = 200) -> 'Response':
+        return cls(status, text.encode('utf-8'))
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class HTTPServer:
+    """خادم HTTP/1.1 صغير مبني على asyncio يكفي للـ webhooks والمقاييس والخوادم الوهمية
+
+    الاتصال الذي لا يرسل رأس طلب كامل خلال header_timeout (بما فيه انتظار الطلب التالي
+    على اتصال keep-alive) يُغلق، والجسم الذي لا يكتمل خلال body_timeout يُرد عليه بـ 408،
+    حتى لا يحجز عميل بطيء أو خامل اتصالاً إلى الأبد.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, max_body_size: int = 1024 * 1024,
+                 header_timeout: float = 30.0, body_timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.max_body_size = max_body_size
+        self.header_timeout = header_timeout
+        self.body_timeout = body_timeout
+        self._routes: Dict[Tuple[str, str], Handler] = {}
+        self._prefix_routes: list = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def route(self, method: str, path: str, handler: Handler) -> None:
+        """تسجيل معالج لمسار؛ المسار المنتهي بـ * يطابق أي مسار يبدأ به"""
+        if path.endswith('*'):
+            self._prefix_routes.append((method.upper(), path[:-1], handler))
+        else:
+            self._routes[(method.upper(), path)] = handler
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"خادم HTTP يستمع على {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _resolve(self, method: str, path: str) -> Union[Handler, int]:
+        handler = self._routes.get((method, path))
+        if handler is not None:
+            return handler
+        for route_method, prefix, handler in self._prefix_routes:
+            if route_method == method and path.startswith(prefix):
+                return handler
+        known_path = any(p == path for _, p in self._routes) or any(
+            path.startswith(prefix) for _, prefix, _ in self._prefix_routes
+        )
+        return 405 if known_path else 404
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Union[Request, int, None]:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.header_timeout)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.TimeoutError):
+            return None
+        except asyncio.LimitOverrunError:
+            return 413
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            return 400
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            return 400
+        if length < 0:
+            return 400
+        if length > self.max_body_size:
+            return 413
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), self.body_timeout) if length else b''
+        except asyncio.TimeoutError:
+            return 408
+        parts = urlsplit(target)
+        return Request(method.upper(), parts.path, parse_qs(parts.query), headers, body)
+
+    async def _write_response(self, writer: asyncio.StreamWriter, response: Response, keep_alive: bool) -> None:
+        reason = _REASONS.get(response.status, 'Unknown')
+        headers = {'Content-Type': response.content_type, **response.headers}
+        headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        if response.stream is None:
+            headers['Content-Length'] = str(len(response.body))
+        else:
+            headers['Transfer-Encoding'] = 'chunked'
+        head = f"HTTP/1.1 {response.status} {reason}\r\n"
+        head += ''.join(f"{k}: {v}\r\n" for k, v in headers.items()) + '\r\n'
+        writer.write(head.encode('latin-1'))
+        if response.stream is None:
+            writer.write(response.body)
+        else:
+            async for chunk in response.stream:
+                if chunk:
+                    writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b'\r\n')
+                    await writer.drain()
+            writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                if isinstance(request, int):
+                    await self._write_response(writer, Response.text('', request), keep_alive=False)
+                    break
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                handler = self._resolve(request.method, request.path)
+                if isinstance(handler, int):
+                    response = Response.text('', handler)
+                else:
+                    try:
+                        response = await handler(request)
+                    except Exception as e:
+                        logger.error(f"خطأ في معالجة {request.method} {request.path}: {e}")
+                        response = Response.text('', 500)
+                await self._write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,441 @@
+"""قاعدة المعرفة: مخطط typed مع تحقق وفهارس جاهزة وإعادة تحميل فورية عند تعديل الملف
+
+الاستخدام من سطر الأوامر:
+    python knowledge_base.py validate knowledge_base.json knowledge_base_comprehensive.json
+    python knowledge_base.py compile knowledge_base_comprehensive.json kb.snapshot
+"""
+import asyncio
+import calendar
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from knowledge_index import KnowledgeIndex, normalize_arabic
+
+logger = logging.getLogger(__name__)
+
+DEGREES = ('bachelor', 'master', 'phd')
+SNAPSHOT_FORMAT = 1
+
+_MONTHS = {
+    'يناير': 1, 'فبراير': 2, 'مارس': 3, 'ابريل': 4, 'مايو': 5, 'يونيو': 6, 'يوليو': 7,
+    'اغسطس': 8, 'سبتمبر': 9, 'اكتوبر': 10, 'نوفمبر': 11, 'ديسمبر': 12,
+    'كانون الثاني': 1, 'شباط': 2, 'اذار': 3, 'نيسان': 4, 'ايار': 5, 'حزيران': 6, 'تموز': 7,
+    'اب': 8, 'ايلول': 9, 'تشرين الاول': 10, 'تشرين الثاني': 11, 'كانون الاول': 12,
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7,
+    'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+}
+_DATE_RE = re.compile(r'(\d{1,2})\s+([^\d]+?)(?:\s+(\d{4}))?\s*$')
+
+
+class KnowledgeBaseError(ValueError):
+    """ملف قاعدة المعرفة لا يطابق المخطط"""
+
+    def __init__(self, path: str, problems: List[str]):
+        self.problems = problems
+        super().__init__(f"{path}: " + '; '.join(problems))
+
+
+def file_version(path: str) -> str:
+    """بصمة محتوى ملف قاعدة المعرفة"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def parse_deadline(text: str) -> Optional[Tuple[int, int, Optional[int]]]:
+    """تحويل نص مثل '15 يوليو 2026' إلى (يوم، شهر، سنة أو None)"""
+    match = _DATE_RE.match(normalize_arabic(text.strip()))
+    if not match:
+        return None
+    month = _MONTHS.get(match.group(2).strip())
+    if month is None:
+        return None
+    day = int(match.group(1))
+    year = int(match.group(3)) if match.group(3) else None
+    try:
+        date(year or 2000, month, day)
+    except ValueError:
+        return None
+    return day, month, year
+
+
+@dataclass(frozen=True)
+class Deadline:
+    country_key: str
+    university_key: str
+    term: str  # winter أو summer أو general
+    text: str
+    day: int
+    month: int
+    year: Optional[int] = None
+
+    def _in_year(self, year: int) -> date:
+        # موعد سنوي في 29 فبراير يكون 28 فبراير في السنوات غير الكبيسة
+        if (self.month, self.day) == (2, 29) and not calendar.isleap(year):
+            return date(year, 2, 28)
+        return date(year, self.month, self.day)
+
+    def next_date(self, today: date) -> Optional[date]:
+        """تاريخ الموعد القادم؛ المواعيد بدون سنة تتكرر سنوياً"""
+        if self.year is not None:
+            return date(self.year, self.month, self.day)
+        candidate = self._in_year(today.year)
+        return candidate if candidate >= today else self._in_year(today.year + 1)
+
+
+@dataclass(frozen=True)
+class Program:
+    name: str
+    degree: str
+    country_key: str
+    university_key: str
+
+
+@dataclass(frozen=True)
+class University:
+    key: str
+    country_key: str
+    name: str
+    ranking: Optional[int] = None
+    website: Optional[str] = None
+    application_link: Optional[str] = None
+    programs: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    deadlines: Tuple[Deadline, ...] = ()
+    language_requirement: Optional[str] = None
+    documents: Tuple[str, ...] = ()
+    tuition: Optional[str] = None
+    conditional_admission: Optional[bool] = None
+
+
+@dataclass(frozen=True)
+class Country:
+    key: str
+    name: str
+    description: Optional[str] = None
+    tuition: Optional[str] = None
+    tuition_range: Dict[str, str] = field(default_factory=dict)
+    cities: Tuple[str, ...] = ()
+    specialties: Tuple[str, ...] = ()
+    universities: Dict[str, University] = field(default_factory=dict)
+
+
+class KnowledgeBase:
+    """نسخة ثابتة (immutable) من قاعدة المعرفة مع كل الفهارس المشتقة منها"""
+
+    def __init__(self, raw: dict, version: str, countries: Dict[str, Country]):
+        self.raw = raw
+        self.version = version
+        self.countries = countries
+        self.universities: Dict[str, University] = {}
+        self.by_country: Dict[str, Tuple[University, ...]] = {}
+        self.by_program: Dict[str, Tuple[Program, ...]] = {}
+        self.by_degree: Dict[str, Tuple[Program, ...]] = {}
+        self.deadlines: Tuple[Deadline, ...] = ()
+        self.index = KnowledgeIndex(raw)
+        self._upcoming_cache: Tuple[Optional[date], Tuple[Tuple[date, Deadline], ...]] = (None, ())
+        self._build_indexes()
+
+    def _build_indexes(self) -> None:
+        by_program: Dict[str, List[Program]] = {}
+        by_degree: Dict[str, List[Program]] = {}
+        deadlines = []
+        for country in self.countries.values():
+            self.by_country[country.key] = tuple(country.universities.values())
+            for university in country.universities.values():
+                self.universities[university.key] = university
+                deadlines.extend(university.deadlines)
+                for degree, names in university.programs.items():
+                    for name in names:
+                        program = Program(name, degree, country.key, university.key)
+                        by_program.setdefault(normalize_arabic(name), []).append(program)
+                        by_degree.setdefault(degree, []).append(program)
+        self.by_program = {k: tuple(v) for k, v in by_program.items()}
+        self.by_degree = {k: tuple(v) for k, v in by_degree.items()}
+        self.deadlines = tuple(deadlines)
+
+    def programs_named(self, name: str) -> Tuple[Program, ...]:
+        return self.by_program.get(normalize_arabic(name), ())
+
+    def upcoming_deadlines(self, today: Optional[date] = None, within_days: Optional[int] = None,
+                           limit: Optional[int] = None) -> List[Tuple[date, Deadline]]:
+        """المواعيد القادمة مرتبة زمنياً؛ الترتيب يُحسب مرة واحدة لكل يوم"""
+        today = today or date.today()
+        cached_day, ordered = self._upcoming_cache
+        if cached_day != today:
+            dated = ((d.next_date(today), d) for d in self.deadlines)
+            ordered = tuple(sorted(((when, d) for when, d in dated if when >= today), key=lambda item: item[0]))
+            self._upcoming_cache = (today, ordered)
+        result = ordered
+        if within_days is not None:
+            horizon = today + timedelta(days=within_days)
+            result = tuple(item for item in result if item[0] <= horizon)
+        return list(result[:limit] if limit else result)
+
+
+def _string_list(value, path: str, problems: List[str]) -> Tuple[str, ...]:
+    if value is None:
+        return ()
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        problems.append(f"{path} يجب أن يكون قائمة نصوص")
+        return ()
+    return tuple(value)
+
+
+def _optional_str(value, path: str, problems: List[str]) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    problems.append(f"{path} يجب أن يكون نصاً")
+    return None
+
+
+def _parse_university(country_key: str, key: str, data, problems: List[str]) -> Optional[University]:
+    path = f"countries.{country_key}.universities.{key}"
+    if not isinstance(data, dict):
+        problems.append(f"{path} يجب أن يكون كائناً")
+        return None
+    if not isinstance(data.get('name'), str):
+        problems.append(f"{path}.name مطلوب")
+        return None
+    ranking = data.get('ranking')
+    if ranking is not None and (not isinstance(ranking, int) or isinstance(ranking, bool)):
+        problems.append(f"{path}.ranking يجب أن يكون رقماً صحيحاً")
+        ranking = None
+    programs = {}
+    raw_programs = data.get('programs') or {}
+    if not isinstance(raw_programs, dict):
+        problems.append(f"{path}.programs يجب أن يكون كائناً")
+        raw_programs = {}
+    for degree, names in raw_programs.items():
+        if degree not in DEGREES:
+            problems.append(f"{path}.programs.{degree} درجة غير معروفة")
+            continue
+        programs[degree] = _string_list(names, f"{path}.programs.{degree}", problems)
+    deadlines = []
+    for term, field_name in (('winter', 'application_deadline_winter'),
+                             ('summer', 'application_deadline_summer'),
+                             ('general', 'application_deadline')):
+        text = data.get(field_name)
+        if text is None:
+            continue
+        parsed = parse_deadline(text) if isinstance(text, str) else None
+        if parsed is None:
+            problems.append(f"{path}.{field_name} تاريخ غير مفهوم: {text!r}")
+            continue
+        deadlines.append(Deadline(country_key, key, term, text, *parsed))
+    requirements = data.get('requirements') or {}
+    if not isinstance(requirements, dict):
+        problems.append(f"{path}.requirements يجب أن يكون كائناً")
+        requirements = {}
+    conditional = data.get('conditional_admission')
+    if conditional is not None and not isinstance(conditional, bool):
+        problems.append(f"{path}.conditional_admission يجب أن يكون true/false")
+        conditional = None
+    return University(
+        key=key,
+        country_key=country_key,
+        name=data['name'],
+        ranking=ranking,
+        website=_optional_str(data.get('website'), f"{path}.website", problems),
+        application_link=_optional_str(data.get('application_link'), f"{path}.application_link", problems),
+        programs=programs,
+        deadlines=tuple(deadlines),
+        language_requirement=_optional_str(requirements.get('language'), f"{path}.requirements.language", problems),
+        documents=_string_list(requirements.get('documents'), f"{path}.requirements.documents", problems),
+        tuition=_optional_str(data.get('tuition'), f"{path}.tuition", problems),
+        conditional_admission=conditional,
+    )
+
+
+def _parse_country(key: str, data, problems: List[str]) -> Optional[Country]:
+    path = f"countries.{key}"
+    if not isinstance(data, dict) or not isinstance(data.get('name'), str):
+        problems.append(f"{path}.name مطلوب")
+        return None
+    tuition_range = data.get('tuition_range') or {}
+    if not isinstance(tuition_range, dict) or not all(
+        degree in DEGREES and isinstance(text, str) for degree, text in tuition_range.items()
+    ):
+        problems.append(f"{path}.tuition_range يجب أن يربط الدرجات بنصوص")
+        tuition_range = {}
+    universities = {}
+    raw_universities = data.get('universities') or {}
+    if not isinstance(raw_universities, dict):
+        problems.append(f"{path}.universities يجب أن يكون كائناً")
+        raw_universities = {}
+    for uni_key, uni_data in raw_universities.items():
+        university = _parse_university(key, uni_key, uni_data, problems)
+        if university is not None:
+            universities[uni_key] = university
+    return Country(
+        key=key,
+        name=data['name'],
+        description=_optional_str(data.get('description'), f"{path}.description", problems),
+        tuition=_optional_str(data.get('tuition_fees') or data.get('note'), f"{path}.tuition_fees", problems),
+        tuition_range=dict(tuition_range),
+        cities=_string_list(data.get('popular_cities') or data.get('main_cities'), f"{path}.cities", problems),
+        specialties=_string_list(data.get('specialties'), f"{path}.specialties", problems),
+        universities=universities,
+    )
+
+
+def parse_knowledge_base(raw, path: str = '<memory>', version: str = '') -> KnowledgeBase:
+    """التحقق من البيانات وبناء KnowledgeBase؛ يرفع KnowledgeBaseError بكل المشاكل دفعة واحدة"""
+    problems: List[str] = []
+    if not isinstance(raw, dict):
+        raise KnowledgeBaseError(path, ['الجذر يجب أن يكون كائناً'])
+    countries_raw = raw.get('countries')
+    if not isinstance(countries_raw, dict) or not countries_raw:
+        problems.append('countries مطلوب ويجب أن يكون كائناً غير فارغ')
+        countries_raw = {}
+    countries = {}
+    for key, data in countries_raw.items():
+        country = _parse_country(key, data, problems)
+        if country is not None:
+            countries[key] = country
+    if problems:
+        raise KnowledgeBaseError(path, problems)
+    return KnowledgeBase(raw, version, countries)
+
+
+def load_knowledge_base(path: str) -> KnowledgeBase:
+    with open(path, 'rb') as f:
+        content = f.read()
+    version = hashlib.sha256(content).hexdigest()[:16]
+    return parse_knowledge_base(json.loads(content.decode('utf-8')), path, version)
+
+
+def write_snapshot(kb: KnowledgeBase, snapshot_path: str) -> None:
+    """حفظ نسخة ثنائية جاهزة (مع الفهارس) لتسريع بدء التشغيل"""
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((SNAPSHOT_FORMAT, kb.version, kb), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
+
+
+def read_snapshot(snapshot_path: str, expected_version: str) -> Optional[KnowledgeBase]:
+    """قراءة النسخة الثنائية فقط إذا كانت مبنية من نفس محتوى الملف الحالي"""
+    try:
+        with open(snapshot_path, 'rb') as f:
+            fmt, version, kb = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+        return None
+    if fmt != SNAPSHOT_FORMAT or version != expected_version:
+        return None
+    return kb
+
+
+# يجهّز ما يشتقه المستمع من النسخة الجديدة (في خيط منفصل) ويعيد دالة سريعة تستبدله، أو None
+ReloadListener = Callable[['KnowledgeBase'], Awaitable[Optional[Callable[[], None]]]]
+
+
+class KnowledgeBaseStore:
+    """يحمل النسخة الحالية من قاعدة المعرفة ويستبدلها ذرياً عند تعديل الملف
+
+    القراءة عبر store.current لا تحتاج أي قفل: الاستبدال هو تعيين مرجع واحد لكائن ثابت.
+    عند إعادة التحميل يجهّز كل مستمع فهارسه من النسخة الجديدة أولاً، ثم تُستبدل النسخة وكل
+    الفهارس معاً دون أي await بينها، فلا يرى أي معالج قاعدة معرفة جديدة مع فهارس قديمة.
+    """
+
+    def __init__(self, path: str, snapshot_path: Optional[str] = None, poll_interval: float = 5.0):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.poll_interval = poll_interval
+        self._listeners: List[ReloadListener] = []
+        self._stat = self._file_stat()
+        self.current: KnowledgeBase = self._load()
+        self._task: Optional[asyncio.Task] = None
+
+    def _file_stat(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self) -> KnowledgeBase:
+        if self.snapshot_path:
+            kb = read_snapshot(self.snapshot_path, file_version(self.path))
+            if kb is not None:
+                logger.info(f"تم تحميل قاعدة المعرفة من النسخة الجاهزة {self.snapshot_path}")
+                return kb
+        kb = load_knowledge_base(self.path)
+        if self.snapshot_path:
+            try:
+                write_snapshot(kb, self.snapshot_path)
+            except OSError as e:
+                logger.warning(f"تعذر حفظ النسخة الجاهزة من قاعدة المعرفة: {e}")
+        return kb
+
+    def add_listener(self, callback: ReloadListener) -> None:
+        """استدعاء callback مع كل إعادة تحميل ناجحة (انظر ReloadListener)"""
+        self._listeners.append(callback)
+
+    async def reload_if_changed(self) -> bool:
+        stat = self._file_stat()
+        if stat == self._stat:
+            return False
+        self._stat = stat
+        try:
+            # التحليل وبناء الفهارس خارج حلقة الأحداث
+            kb = await asyncio.to_thread(self._load)
+        except (OSError, ValueError) as e:
+            logger.error(f"تعذر إعادة تحميل قاعدة المعرفة، الإبقاء على النسخة السابقة: {e}")
+            return False
+        if kb.version == self.current.version:
+            return False
+        commits = []
+        for callback in self._listeners:
+            commit = await callback(kb)
+            if commit is not None:
+                commits.append(commit)
+        self.current = kb
+        for commit in commits:
+            commit()
+        logger.info(f"تمت إعادة تحميل قاعدة المعرفة (الإصدار {kb.version})")
+        return True
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.reload_if_changed()
+            except OSError as e:
+                logger.error(f"تعذر فحص ملف قاعدة المعرفة: {e}")
+
+    def start(self) -> None:
+        if self.poll_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) >= 2 and argv[0] == 'validate':
+        failed = False
+        for path in argv[1:]:
+            try:
+                kb = load_knowledge_base(path)
+                print(f"{path}: صالح ({len(kb.countries)} دولة، {len(kb.universities)} جامعة، "
+                      f"{sum(len(p) for p in kb.by_degree.values())} برنامج، {len(kb.deadlines)} موعد)")
+            except (OSError, ValueError) as e:
+                failed = True
+                print(f"خطأ: {e}")
+        return 1 if failed else 0
+    if len(argv) == 3 and argv[0] == 'compile':
+        write_snapshot(load_knowledge_base(argv[1]), argv[2])
+        print(f"تم حفظ {argv[2]}")
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
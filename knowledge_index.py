@@ -0,0 +1,164 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# تشكيل وتطويل
+_DIACRITICS_RE = re.compile(r'[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+_CHAR_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+
+# بادئات شائعة تُزال من الكلمات العربية (الأطول أولاً)
+_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+
+_STOPWORDS = frozenset({
+    'في', 'من', 'الي', 'علي', 'عن', 'ما', 'هي', 'هو', 'هل', 'كم', 'كيف', 'او', 'و',
+    'ان', 'مع', 'هذا', 'هذه', 'ذلك', 'التي', 'الذي', 'اي', 'لا', 'متي', 'اين', 'عند',
+    'the', 'a', 'an', 'of', 'in', 'for', 'to', 'and', 'or', 'is', 'what', 'how',
+})
+
+
+def normalize_arabic(text: str) -> str:
+    """توحيد أشكال الحروف العربية وإزالة التشكيل"""
+    text = _DIACRITICS_RE.sub('', text)
+    return text.translate(_CHAR_MAP).lower()
+
+
+def _stem(token: str) -> str:
+    for prefix in _PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            return token[len(prefix):]
+    return token
+
+
+def normalized_words(text: str, stopwords: bool = True) -> List[str]:
+    """كلمات النص بعد توحيد الحروف دون اشتقاق؛ stopwords=False يحذف كلمات التوقف"""
+    words = _TOKEN_RE.findall(normalize_arabic(text))
+    return words if stopwords else [word for word in words if word not in _STOPWORDS]
+
+
+def tokenize(text: str) -> List[str]:
+    """تقسيم النص إلى كلمات مطبّعة بدون كلمات التوقف"""
+    return [_stem(token) for token in normalized_words(text, stopwords=False)]
+
+
+def estimate_tokens(text: str) -> int:
+    """تقدير تقريبي لعدد tokens النموذج (حوالي 3 أحرف لكل token للنص العربي)"""
+    return len(text) // 3 + 1
+
+
+@dataclass
+class Chunk:
+    """جزء صغير من قاعدة المعرفة يُرسل كوحدة واحدة للنموذج"""
+    path: str
+    text: str
+    tokens: int = 0
+    term_freqs: Counter = field(default_factory=Counter)
+    length: int = 0
+
+
+def _format_value(value) -> str:
+    if isinstance(value, list):
+        return '، '.join(_format_value(v) for v in value)
+    if isinstance(value, dict):
+        return '؛ '.join(f"{k}: {_format_value(v)}" for k, v in value.items())
+    if isinstance(value, bool):
+        return 'نعم' if value else 'لا'
+    return str(value)
+
+
+def _entity_chunk(path: str, entity: dict, skip: Tuple[str, ...] = ()) -> Chunk:
+    lines = [f"[{path}]"]
+    for key, value in entity.items():
+        if key in skip:
+            continue
+        lines.append(f"{key}: {_format_value(value)}")
+    return Chunk(path=path, text='\n'.join(lines))
+
+
+def flatten_knowledge_base(kb: dict) -> List[Chunk]:
+    """تحويل الشجرة (دول ← جامعات ← برامج/متطلبات/مواعيد) إلى أجزاء صغيرة مستقلة"""
+    chunks = []
+    for section, content in kb.items():
+        if section == 'countries' and isinstance(content, dict):
+            for country_key, country in content.items():
+                country_path = f"countries/{country_key}"
+                chunks.append(_entity_chunk(country_path, country, skip=('universities',)))
+                country_name = country.get('name', country_key)
+                for uni_key, uni in country.get('universities', {}).items():
+                    chunk = _entity_chunk(f"{country_path}/{uni_key}", uni)
+                    # اسم الدولة يساعد في مطابقة أسئلة مثل "جامعات ألمانيا"
+                    chunk.text += f"\ncountry: {country_name}"
+                    chunks.append(chunk)
+        elif section == 'faq' and isinstance(content, dict):
+            for key, question in content.items():
+                if key.startswith('q'):
+                    answer = content.get('a' + key[1:], '')
+                    chunks.append(Chunk(path=f"faq/{key}", text=f"[faq]\nس: {question}\nج: {answer}"))
+        elif isinstance(content, dict) and all(isinstance(v, dict) for v in content.values()):
+            for key, value in content.items():
+                chunks.append(_entity_chunk(f"{section}/{key}", value))
+        else:
+            chunks.append(Chunk(path=section, text=f"[{section}]\n{_format_value(content)}"))
+    return chunks
+
+
+class KnowledgeIndex:
+    """فهرس BM25 لقاعدة المعرفة يُبنى مرة واحدة عند بدء التشغيل"""
+
+    def __init__(self, kb: dict, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = flatten_knowledge_base(kb)
+        doc_freqs: Counter = Counter()
+        for chunk in self.chunks:
+            terms = tokenize(chunk.text.replace('_', ' '))
+            chunk.term_freqs = Counter(terms)
+            chunk.length = len(terms)
+            chunk.tokens = estimate_tokens(chunk.text)
+            doc_freqs.update(chunk.term_freqs.keys())
+        total = len(self.chunks) or 1
+        self.avg_length = sum(c.length for c in self.chunks) / total
+        self.idf: Dict[str, float] = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+        # الجزء الافتراضي عندما لا يطابق السؤال أي شيء
+        self._fallback = [c for c in self.chunks if c.path == 'company']
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[float, Chunk]]:
+        """إرجاع أفضل الأجزاء المطابقة للسؤال مرتبة حسب درجة BM25"""
+        terms = set(tokenize(query))
+        scored = []
+        for chunk in self.chunks:
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * chunk.length / (self.avg_length or 1))
+            for term in terms:
+                tf = chunk.term_freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scored.append((score, chunk))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:top_k]
+
+    def build_context(self, query: str, token_budget: int, top_k: int = 5) -> str:
+        """تجميع سياق قاعدة المعرفة للسؤال ضمن ميزانية محددة من tokens"""
+        selected = [chunk for _, chunk in self.search(query, top_k)] or self._fallback
+        parts = []
+        used = 0
+        for chunk in selected:
+            if parts and used + chunk.tokens > token_budget:
+                break
+            parts.append(chunk.text)
+            used += chunk.tokens
+        return '\n\n'.join(parts)
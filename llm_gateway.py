@@ -0,0 +1,268 @@
+import asyncio
+import importlib
+import logging
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, List, Optional
+
+from telegram import InlineKeyboardMarkup, Message
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+
+from knowledge_index import estimate_tokens
+from metrics import LLM_CIRCUIT_OPEN, LLM_LATENCY, LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+
+class LLMGatewayError(Exception):
+    """فشل طلب النموذج بعد استنفاد المحاولات"""
+
+
+class CircuitOpenError(LLMGatewayError):
+    """قاطع الدائرة مفتوح: الطلب رُفض دون إرساله للنموذج"""
+
+
+class CircuitBreaker:
+    """قاطع دائرة لطلبات النموذج يفتح عند ارتفاع نسبة الطلبات الفاشلة أو البطيئة
+
+    آخر window طلباً تُحفظ كنجاح/فشل (الطلب الأبطأ من slow_call_seconds يُعد فاشلاً).
+    عند تجاوز failure_rate يُرفض كل طلب لمدة open_seconds، ثم يُسمح بطلب تجربة واحد:
+    نجاحه يغلق الدائرة وفشله يعيد فتحها.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+    def __init__(self, window: int = 20, min_calls: int = 5, failure_rate: float = 0.5,
+                 slow_call_seconds: float = 10.0, open_seconds: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._results = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.open_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def rejects(self) -> bool:
+        """هل سيُرفض الطلب الآن؟ دون حجز طلب التجربة (لفحص مبكر قبل إرسال أي شيء)"""
+        state = self.state
+        return state == self.OPEN or (state == self.HALF_OPEN and self._probing)
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            LLM_CIRCUIT_OPEN.set(0.5)
+            return True
+        return False
+
+    def record(self, ok: bool, duration: float) -> None:
+        failed = not ok or duration >= self.slow_call_seconds
+        if self._opened_at is not None:
+            # نتائج الطلبات التي بدأت قبل فتح الدائرة لا تُحتسب؛ المهم هو طلب التجربة فقط
+            if not self._probing:
+                return
+            self._probing = False
+            if failed:
+                self._open('فشل طلب التجربة')
+            else:
+                self._opened_at = None
+                self._results.clear()
+                LLM_CIRCUIT_OPEN.set(0)
+                logger.info("أُغلق قاطع دائرة النموذج، عودة الإجابات الذكية")
+            return
+        self._results.append(failed)
+        failures = sum(self._results)
+        if len(self._results) >= self.min_calls and failures / len(self._results) >= self.failure_rate:
+            self._open(f"{failures} من آخر {len(self._results)} طلبات فاشلة أو بطيئة")
+
+    def _open(self, reason: str) -> None:
+        self._opened_at = self._clock()
+        LLM_CIRCUIT_OPEN.set(1)
+        logger.warning(f"فُتح قاطع دائرة النموذج لمدة {self.open_seconds:.0f} ثانية: {reason}")
+
+
+def _is_retryable(error: Exception) -> bool:
+    # أخطاء الاتصال والمهلة و 429 و 5xx مؤقتة ويمكن إعادة المحاولة بعدها
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class LLMGateway:
+    """بوابة غير متزامنة لـ OpenAI مع حد للطلبات المتزامنة ومهلة وإعادة محاولة
+
+    مكتبة openai (وهي من أبطأ الاستيرادات) لا تُحمّل إلا مع أول طلب للنموذج حتى لا تؤخر بدء التشغيل.
+    """
+
+    def __init__(self, api_key: Optional[str], base_url: Optional[str] = None,
+                 model: str = 'gpt-3.5-turbo', max_concurrency: int = 8, timeout: float = 30.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._api_key = api_key
+        self._base_url = base_url
+        self._client = None
+        self.breaker = breaker
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+
+            # إعادة المحاولة تتم هنا وليس داخل مكتبة openai حتى نتحكم بالتأخير العشوائي
+            self._client = openai.AsyncOpenAI(api_key=self._api_key or 'missing', base_url=self._base_url,
+                                              timeout=self.timeout, max_retries=0)
+        return self._client
+
+    async def warm_up(self) -> None:
+        """استيراد openai في خيط منفصل بعد بدء التشغيل حتى لا يدفع أول سؤال ثمن الاستيراد"""
+        await asyncio.to_thread(importlib.import_module, 'openai')
+        self.client
+
+    def _check_breaker(self) -> None:
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError("قاطع دائرة النموذج مفتوح")
+
+    def _backoff(self, attempt: int) -> float:
+        # تأخير أسي مع jitter كامل لتجنب تزامن إعادة المحاولات
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _create(self, messages: List[dict], stream: bool, **kwargs):
+        kwargs.setdefault('model', self.model)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await asyncio.wait_for(
+                    self.client.chat.completions.create(messages=messages, stream=stream, **kwargs),
+                    timeout=self.timeout,
+                )
+            except Exception as e:
+                if not _is_retryable(e) or attempt == self.max_retries:
+                    raise LLMGatewayError(str(e) or type(e).__name__) from e
+                delay = self._backoff(attempt)
+                logger.warning(f"فشل طلب OpenAI ({e!r})، إعادة المحاولة بعد {delay:.2f} ثانية")
+                await asyncio.sleep(delay)
+
+    async def complete(self, messages: List[dict], **kwargs) -> str:
+        """طلب إجابة كاملة"""
+        self._check_breaker()
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            async with self._semaphore:
+                response = await self._create(messages, stream=False, **kwargs)
+            outcome = 'ok'
+        finally:
+            elapsed = time.perf_counter() - start
+            LLM_LATENCY.observe(elapsed, mode='complete', outcome=outcome)
+            if self.breaker is not None:
+                self.breaker.record(outcome == 'ok', elapsed)
+        if response.usage is not None:
+            LLM_TOKENS.inc(response.usage.prompt_tokens, kind='prompt')
+            LLM_TOKENS.inc(response.usage.completion_tokens, kind='completion')
+        return response.choices[0].message.content or ''
+
+    def stream(self, messages: List[dict], **kwargs) -> AsyncIterator[str]:
+        """طلب الإجابة كأجزاء نصية فور وصولها من النموذج
+
+        حالة قاطع الدائرة تُفحص عند الاستدعاء (CircuitOpenError فوراً) وليس عند أول جزء،
+        حتى لا تُرسل رسالة "⏳" ثم تُحذف. الفحص هنا للقراءة فقط؛ طلب التجربة يُحجز ويُسجل
+        داخل المولد نفسه، فلا يبقى محجوزاً إذا لم يبدأ المولد أبداً.
+        """
+        if self.breaker is not None and self.breaker.rejects():
+            raise CircuitOpenError("قاطع دائرة النموذج مفتوح")
+        return self._stream(messages, **kwargs)
+
+    async def _stream(self, messages: List[dict], **kwargs) -> AsyncIterator[str]:
+        # قبل try: الرفض هنا لا يُسجل كنتيجة (وإلا أنهى طلب تجربة يجري في مكان آخر)
+        self._check_breaker()
+        start = time.perf_counter()
+        outcome = 'error'
+        text = ''
+        try:
+            async with self._semaphore:
+                # إعادة المحاولة ممكنة فقط قبل وصول أول جزء
+                response = await self._create(messages, stream=True, **kwargs)
+                try:
+                    async for chunk in response:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            text += chunk.choices[0].delta.content
+                            yield chunk.choices[0].delta.content
+                except Exception as e:
+                    raise LLMGatewayError(str(e) or type(e).__name__) from e
+            outcome = 'ok'
+        finally:
+            elapsed = time.perf_counter() - start
+            LLM_LATENCY.observe(elapsed, mode='stream', outcome=outcome)
+            if self.breaker is not None:
+                self.breaker.record(outcome == 'ok', elapsed)
+            # الردود المتدفقة لا تتضمن usage في هذا الإصدار من الواجهة، لذا نقدّرها
+            LLM_TOKENS.inc(sum(estimate_tokens(m.get('content') or '') for m in messages), kind='prompt')
+            LLM_TOKENS.inc(estimate_tokens(text) if text else 0, kind='completion')
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+async def _edit(message: Message, text: str, reply_markup=None, parse_mode=None) -> None:
+    try:
+        await message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    except RetryAfter as e:
+        await asyncio.sleep(e.retry_after)
+        await message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    except BadRequest as e:
+        if 'not modified' in str(e).lower():
+            return
+        if parse_mode is None:
+            raise
+        # نص Markdown غير صالح من النموذج: إرساله كنص عادي
+        await message.edit_text(text, reply_markup=reply_markup)
+
+
+async def stream_reply(message: Message, chunks: AsyncIterator[str],
+                       reply_markup: Optional[InlineKeyboardMarkup] = None,
+                       edit_interval: float = 1.0, placeholder: str = '⏳ ...') -> str:
+    """إرسال رد فوري ثم تعديله تدريجياً مع وصول أجزاء الإجابة"""
+    sent = await message.reply_text(placeholder)
+    text = ''
+    last_edit = time.monotonic()
+    shown = ''
+    try:
+        async for piece in chunks:
+            text += piece
+            now = time.monotonic()
+            # تيليجرام يحد من تعديل الرسائل؛ نعدّل مرة كل edit_interval على الأكثر
+            if now - last_edit >= edit_interval and text.strip() and text != shown:
+                await _edit(sent, text + ' ▌')
+                shown = text
+                last_edit = now
+    except Exception:
+        # إغلاق المولد فوراً ليُسجل نتيجة الطلب في قاطع الدائرة، ثم حذف الرسالة المؤقتة
+        # ليتولى المستدعي إرسال رسالة الخطأ
+        await chunks.aclose()
+        await sent.delete()
+        raise
+    await _edit(sent, text or placeholder, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+    return text
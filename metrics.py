@@ -0,0 +1,288 @@
+"""مقاييس Prometheus بدون اعتماديات خارجية مع أدوات لقياس زمن المعالجات"""
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from telegram.ext import ConversationHandler
+
+from http_server import Request, Response
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        if self._function is not None:
+            lines.append(f"{self.name} {self._function()}")
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # لكل مجموعة labels: عدادات الـ buckets ثم المجموع ثم العدد
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[0][index] += 1
+        state[1] += value
+        state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, (bucket_counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            inf_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    'glovuni_handler_latency_seconds', 'Handler callback latency.', ['handler']))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    'glovuni_handler_errors_total', 'Handler callbacks that raised.', ['handler']))
+UPDATES = REGISTRY.register(Counter(
+    'glovuni_updates_total', 'Received updates by type.', ['type']))
+UPDATES_SHED = REGISTRY.register(Counter(
+    'glovuni_updates_shed_total', 'Updates rejected by the scheduler.', ['lane', 'reason']))
+LANE_DEPTH = REGISTRY.register(Gauge(
+    'glovuni_scheduler_queue_depth', 'Updates waiting for a free slot in each scheduler lane.', ['lane']))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    'glovuni_startup_seconds', 'Seconds from process start to each startup phase.', ['phase']))
+STATE_TRANSITIONS = REGISTRY.register(Counter(
+    'glovuni_conversation_transitions_total', 'Conversation state returned by handlers.', ['handler', 'state']))
+LLM_LATENCY = REGISTRY.register(Histogram(
+    'glovuni_llm_request_seconds', 'LLM completion latency.', ['mode', 'outcome']))
+FAST_ANSWERS = REGISTRY.register(Counter(
+    'glovuni_fast_answers_total', 'Questions answered from structured knowledge base fields.', ['intent']))
+LLM_CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    'glovuni_llm_circuit_open', 'LLM circuit breaker state (0 closed, 0.5 half-open, 1 open).'))
+QA_DEGRADED = REGISTRY.register(Counter(
+    'glovuni_qa_degraded_total', 'Questions answered without the LLM while its circuit was open.', ['source']))
+LLM_TOKENS = REGISTRY.register(Counter(
+    'glovuni_llm_tokens_total', 'LLM tokens (estimated when streaming).', ['kind']))
+WEBHOOK_DELIVERIES = REGISTRY.register(Counter(
+    'glovuni_webhook_deliveries_total', 'Outbound webhook delivery outcomes.', ['outcome']))
+WEBHOOK_LATENCY = REGISTRY.register(Histogram(
+    'glovuni_webhook_delivery_seconds', 'Outbound webhook request latency.'))
+SHEETS_ROWS = REGISTRY.register(Counter(
+    'glovuni_sheets_rows_total', 'Submission rows sent to Google Sheets by outcome.', ['outcome']))
+REMINDERS_SENT = REGISTRY.register(Counter(
+    'glovuni_reminders_total', 'Deadline reminder messages by outcome.', ['outcome']))
+EVENT_LOOP_LAG = REGISTRY.register(Histogram(
+    'glovuni_event_loop_lag_seconds', 'Delay between scheduled and actual loop wakeups.',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)))
+
+
+def instrument(callback: Callable, state_names: Optional[Dict[object, str]] = None) -> Callable:
+    """تغليف معالج لقياس زمنه وتسجيل الحالة التي يعيدها"""
+    if getattr(callback, '__instrumented__', False):
+        return callback
+    name = callback.__name__
+    state_names = state_names or {}
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            result = await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, handler=name)
+        if result is not None:
+            STATE_TRANSITIONS.inc(handler=name, state=state_names.get(result, str(result)))
+        return result
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_application(application, state_names: Optional[Dict[object, str]] = None) -> None:
+    """تغليف كل المعالجات المسجلة في التطبيق بما فيها معالجات ConversationHandler"""
+    def walk(handlers):
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                walk(handler.entry_points)
+                for state_handlers in handler.states.values():
+                    walk(state_handlers)
+                walk(handler.fallbacks)
+            else:
+                handler.callback = instrument(handler.callback, state_names)
+
+    for group in application.handlers.values():
+        walk(group)
+
+
+_UPDATE_TYPES = ('message', 'edited_message', 'callback_query', 'inline_query', 'channel_post',
+                 'my_chat_member', 'chat_member', 'pre_checkout_query', 'poll_answer')
+
+
+async def count_update(update, context) -> None:
+    """معالج TypeHandler يعمل قبل بقية المعالجات لعد التحديثات حسب النوع"""
+    for kind in _UPDATE_TYPES:
+        if getattr(update, kind, None) is not None:
+            UPDATES.inc(type=kind)
+            return
+    UPDATES.inc(type='other')
+
+
+class StartupClock:
+    """زمن كل مرحلة من مراحل بدء التشغيل منذ بداية استيراد البوت (imports ثم ready ثم first_update)"""
+
+    def __init__(self, started: float):
+        self.started = started
+        self._first_update_seen = False
+
+    def mark(self, phase: str) -> float:
+        elapsed = time.monotonic() - self.started
+        STARTUP_SECONDS.set(round(elapsed, 4), phase=phase)
+        logger.info(f"بدء التشغيل: {phase} بعد {elapsed * 1000:.0f}ms")
+        return elapsed
+
+    async def first_update(self, update, context) -> None:
+        """معالج TypeHandler يسجل زمن وصول أول تحديث ثم لا يفعل شيئاً"""
+        if not self._first_update_seen:
+            self._first_update_seen = True
+            self.mark('first_update')
+
+
+class LoopLagMonitor:
+    """قياس تأخر حلقة الأحداث: الفرق بين موعد الاستيقاظ المتوقع والفعلي"""
+
+    def __init__(self, interval: float = 0.1, histogram: Optional[Histogram] = EVENT_LOOP_LAG,
+                 keep_samples: bool = False):
+        self.interval = interval
+        self.histogram = histogram
+        self.samples: List[float] = []
+        self.keep_samples = keep_samples
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            if self.histogram is not None:
+                self.histogram.observe(lag)
+            if self.keep_samples:
+                self.samples.append(lag)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(body=REGISTRY.render().encode('utf-8'), content_type='text/plain; version=0.0.4')
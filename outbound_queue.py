@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import time
+from typing import List, Optional, Set, Tuple
+
+import httpx
+
+from metrics import WEBHOOK_DELIVERIES, WEBHOOK_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# أخطاء 4xx نهائية عدا انتهاء المهلة وتجاوز الحد
+_RETRYABLE_STATUS = {408, 425, 429}
+
+
+class OutboundQueue:
+    """طابور دائم لإرسال البيانات إلى webhook خارجي (Make.com) مع إعادة محاولة وسجل للفاشل"""
+
+    def __init__(self, url: str, path: str, workers: int = 4, batch_size: int = 1,
+                 max_attempts: int = 8, backoff_base: float = 2.0, backoff_max: float = 600.0,
+                 timeout: float = 10.0):
+        self.url = url
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dead_lettered = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, attempts INTEGER DEFAULT 0, '
+            'next_attempt REAL NOT NULL, last_error TEXT, created REAL NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS dead_letter ('
+            'id INTEGER PRIMARY KEY, payload TEXT NOT NULL, attempts INTEGER, last_error TEXT, '
+            'created REAL, failed_at REAL)'
+        )
+        self._db.commit()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._batches: Optional[asyncio.Queue] = None
+        self._inflight: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def enqueue(self, payload: dict) -> int:
+        """حفظ الرسالة على القرص أولاً ثم إيقاظ العمال؛ لا ينتظر الإرسال"""
+        now = time.time()
+        with self._db:
+            cursor = self._db.execute(
+                'INSERT INTO outbox (payload, next_attempt, created) VALUES (?, ?, ?)',
+                (json.dumps(payload, ensure_ascii=False), now, now),
+            )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return cursor.lastrowid
+
+    def pending(self) -> int:
+        return self._db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def dead_letters(self, limit: int = 100) -> List[dict]:
+        rows = self._db.execute(
+            'SELECT id, payload, attempts, last_error, failed_at FROM dead_letter ORDER BY id DESC LIMIT ?',
+            (limit,),
+        ).fetchall()
+        return [
+            {'id': r[0], 'payload': json.loads(r[1]), 'attempts': r[2], 'last_error': r[3], 'failed_at': r[4]}
+            for r in rows
+        ]
+
+    def requeue_dead_letters(self) -> int:
+        """إعادة الرسائل الفاشلة إلى الطابور بعد إصلاح المشكلة"""
+        now = time.time()
+        with self._db:
+            count = self._db.execute(
+                'INSERT INTO outbox (payload, next_attempt, created) '
+                'SELECT payload, ?, created FROM dead_letter', (now,)
+            ).rowcount
+            self._db.execute('DELETE FROM dead_letter')
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return count
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._batches = asyncio.Queue(maxsize=self.workers * 2)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+        )
+        self._tasks = [asyncio.create_task(self._dispatch())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"طابور الإرسال يعمل ({self.pending()} رسالة معلقة)")
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        """إيقاف العمال؛ الرسائل غير المرسلة تبقى على القرص للتشغيل التالي"""
+        if self._batches is not None and not self._batches.empty():
+            try:
+                await asyncio.wait_for(self._batches.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _claim_due(self) -> Tuple[List[Tuple[int, str, int]], Optional[float]]:
+        now = time.time()
+        rows = self._db.execute(
+            'SELECT id, payload, attempts FROM outbox WHERE next_attempt <= ? ORDER BY id LIMIT ?',
+            (now, self.batch_size * self.workers * 4 + len(self._inflight)),
+        ).fetchall()
+        due = [row for row in rows if row[0] not in self._inflight]
+        next_due = self._db.execute(
+            'SELECT MIN(next_attempt) FROM outbox WHERE next_attempt > ?', (now,)
+        ).fetchone()[0]
+        return due, next_due
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._wakeup.clear()
+            due, next_due = self._claim_due()
+            for i in range(0, len(due), self.batch_size):
+                batch = due[i:i + self.batch_size]
+                self._inflight.update(row[0] for row in batch)
+                await self._batches.put(batch)
+            if due:
+                continue
+            wait = 60.0 if next_due is None else max(0.05, next_due - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        while True:
+            batch = await self._batches.get()
+            try:
+                await self._deliver(batch)
+            except Exception as e:
+                # حتى تسجيل الفشل لم ينجح (قاعدة البيانات مثلاً): انتظار قبل إعادة المطالبة بنفس
+                # الرسائل بدلاً من تكرارها فوراً بلا توقف
+                logger.error(f"خطأ غير متوقع في طابور الإرسال: {e!r}")
+                await asyncio.sleep(self.backoff_base)
+            finally:
+                self._inflight.difference_update(row[0] for row in batch)
+                self._batches.task_done()
+                self._wakeup.set()
+
+    async def _deliver(self, batch: List[Tuple[int, str, int]]) -> None:
+        error, retryable = None, True
+        start = time.perf_counter()
+        try:
+            payloads = [json.loads(row[1]) for row in batch]
+            # عند تفعيل التجميع يُرسل الطلب كمصفوفة JSON
+            body = payloads if self.batch_size > 1 else payloads[0]
+            response = await self._client.post(self.url, json=body)
+            WEBHOOK_LATENCY.observe(time.perf_counter() - start)
+            if 200 <= response.status_code < 300:
+                with self._db:
+                    self._db.executemany('DELETE FROM outbox WHERE id = ?', [(row[0],) for row in batch])
+                self.delivered += len(batch)
+                WEBHOOK_DELIVERIES.inc(len(batch), outcome='delivered')
+                logger.info(f"تم إرسال {len(batch)} رسالة بنجاح")
+                return
+            error = f"HTTP {response.status_code}"
+            retryable = response.status_code >= 500 or response.status_code in _RETRYABLE_STATUS
+        except (httpx.InvalidURL, httpx.UnsupportedProtocol, ValueError) as e:
+            # رابط أو محتوى غير صالح لن يصلح بإعادة المحاولة
+            error, retryable = f"{type(e).__name__}: {e}", False
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+        except Exception as e:
+            # أي خطأ آخر (SQLite عند حذف المرسل مثلاً) يُعامل كفشل مؤقت مع الانتظار المتزايد
+            logger.exception(f"خطأ غير متوقع أثناء إرسال {len(batch)} رسالة")
+            error = f"{type(e).__name__}: {e}"
+        self.failed_attempts += len(batch)
+        self._record_failure(batch, error, retryable)
+
+    def _record_failure(self, batch: List[Tuple[int, str, int]], error: str, retryable: bool) -> None:
+        now = time.time()
+        with self._db:
+            for row_id, payload, attempts in batch:
+                attempts += 1
+                if not retryable or attempts >= self.max_attempts:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO dead_letter SELECT id, payload, ?, ?, created, ? '
+                        'FROM outbox WHERE id = ?', (attempts, error, now, row_id),
+                    )
+                    self._db.execute('DELETE FROM outbox WHERE id = ?', (row_id,))
+                    self.dead_lettered += 1
+                    WEBHOOK_DELIVERIES.inc(outcome='dead_letter')
+                    logger.error(f"فشل إرسال الرسالة {row_id} نهائياً ({error})، نقلت إلى dead_letter")
+                    continue
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                delay *= random.uniform(0.5, 1.0)
+                WEBHOOK_DELIVERIES.inc(outcome='retry')
+                self._db.execute(
+                    'UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?',
+                    (attempts, now + delay, error, row_id),
+                )
+                logger.warning(f"فشل إرسال الرسالة {row_id} ({error})، إعادة المحاولة بعد {delay:.1f} ثانية")
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending(),
+            'inflight': len(self._inflight),
+            'delivered': self.delivered,
+            'failed_attempts': self.failed_attempts,
+            'dead_lettered': self.dead_lettered,
+        }
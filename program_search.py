@@ -0,0 +1,455 @@
+"""بحث دلالي محلي في البرامج والجامعات والدول (/search) بمتجهات NumPy دون أي خدمة خارجية
+
+كل عنصر في الكتالوج يُحوّل إلى متجه n-grams مُجزّأ (hashing trick) ويُحفظ الفهرس في ملف
+.npy يُفتح بـ memory-map عند التشغيل، فلا يُعاد الحساب ما دامت قاعدة المعرفة لم تتغير.
+البحث cosine كامل (brute force) للكتالوجات الصغيرة، ومن بعد حد معين يُستخدم فهرس تقريبي (ANN)
+قابل للاستبدال؛ أي كائن ينفذ build/query يصلح (مثلاً غلاف حول hnswlib أو faiss).
+
+ملاحظة: الرسوم تُقارن بالأرقام كما كُتبت في قاعدة المعرفة (باليورو غالباً) دون تحويل عملات.
+"""
+import json
+import logging
+import os
+import re
+import zlib
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from fast_answers import DEGREE_ALIASES
+from knowledge_base import DEGREES, KnowledgeBase
+from knowledge_index import normalize_arabic, tokenize
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT = 1
+
+LANG_GERMAN = 1
+LANG_ENGLISH = 2
+LANG_TURKISH = 4
+
+_LANGUAGE_MARKERS = {
+    LANG_ENGLISH: ('ielts', 'toefl', 'انجليزي', 'انجليزيه', 'انكليزي', 'english', 'cambridge'),
+    LANG_GERMAN: ('الماني', 'المانيه', 'dsh', 'testdaf', 'goethe', 'german'),
+    LANG_TURKISH: ('تركي', 'التركيه', 'tomer', 'turkish'),
+}
+LANGUAGE_NAMES = {LANG_ENGLISH: 'الإنجليزية', LANG_GERMAN: 'الألمانية', LANG_TURKISH: 'التركية'}
+
+# كلمات الاستعلام التي تحدد مرشحاً بدلاً من أن تكون جزءاً من المعنى
+_LANGUAGE_WORDS = {
+    LANG_ENGLISH: ('english', 'انجليزي', 'بالانجليزي', 'بالانجليزيه', 'الانجليزيه', 'انجليزيه', 'بالانكليزي'),
+    LANG_GERMAN: ('german', 'الماني', 'بالالماني', 'بالالمانيه', 'الالمانيه'),
+    LANG_TURKISH: ('turkish', 'تركي', 'بالتركي', 'بالتركيه'),
+}
+_FREE_WORDS = ('free', 'مجاني', 'مجانيه', 'ببلاش')
+_CHEAP_WORDS = ('cheap', 'cheapest', 'affordable', 'budget', 'low-cost', 'رخيص', 'رخيصه', 'ارخص',
+                'منخفض', 'منخفضه', 'اقتصادي')
+_CEILING_RE = re.compile(
+    r'(?:under|below|max|less than|up to|<|اقل من|تحت|حتي|لا تتجاوز|بحدود)\s*(?:€|eur|euro|يورو)?\s*(\d[\d,]*)'
+)
+_NUMBER_RE = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+# مصطلحات إنجليزية شائعة في أسئلة الطلاب مقابل صيغتها في قاعدة المعرفة (العربية)
+QUERY_SYNONYMS = {
+    'engineering': 'هندسة', 'engineer': 'هندسة', 'computer': 'الحاسوب', 'cs': 'علوم الحاسوب',
+    'informatics': 'علوم الحاسوب', 'ai': 'الذكاء الاصطناعي', 'artificial': 'الذكاء الاصطناعي',
+    'intelligence': 'الذكاء الاصطناعي', 'data': 'علوم البيانات', 'business': 'إدارة الأعمال',
+    'management': 'إدارة الأعمال', 'economics': 'الاقتصاد', 'physics': 'الفيزياء', 'medicine': 'الطب',
+    'chemistry': 'الكيمياء', 'chemical': 'الكيميائية', 'electrical': 'الإلكترونيات',
+    'electronics': 'الإلكترونيات', 'aerospace': 'الجوية', 'robotics': 'الروبوتات',
+    'neuroscience': 'علوم الأعصاب', 'journalism': 'الصحافة', 'energy': 'الطاقة', 'politics': 'السياسة',
+    'germany': 'ألمانيا', 'turkey': 'تركيا', 'uk': 'المملكة المتحدة', 'britain': 'المملكة المتحدة',
+}
+
+_DEGREE_WORDS = {alias: degree for degree, aliases in DEGREE_ALIASES.items() for alias in aliases}
+_DEGREE_WORDS.update({"master's": 'master', "bachelor's": 'bachelor'})
+
+
+def parse_tuition(text: Optional[str], degree: Optional[str] = None) -> Optional[float]:
+    """أعلى رسوم سنوية مذكورة في النص (للدرجة المحددة إن فُصّلت)؛ 0 للمجاني و None إن لم تُذكر
+
+    المساهمة الفصلية في الجامعات الألمانية ليست رسوماً دراسية فتُتجاهل.
+    """
+    if not text:
+        return None
+    norm = normalize_arabic(text)
+    candidates = []
+    for segment in re.split(r'[،;+]', norm):
+        if 'مساهمه' in segment or 'contribution' in segment:
+            continue
+        numbers = [float(n.replace(',', '')) for n in _NUMBER_RE.findall(segment)]
+        if not numbers:
+            continue
+        labels = {_DEGREE_WORDS[w] for word in re.findall(r'[^\W_]+', segment)
+                  for w in (word, word.removeprefix('لل'), word.removeprefix('ال')) if w in _DEGREE_WORDS}
+        if degree and labels and degree not in labels:
+            continue
+        candidates.append(max(numbers))
+    if candidates:
+        return max(candidates)
+    if any(word in norm for word in _FREE_WORDS):
+        return 0.0
+    return None
+
+
+def parse_languages(text: Optional[str]) -> int:
+    """قناع بت للغات الدراسة المقبولة من نص متطلبات اللغة"""
+    if not text:
+        return 0
+    norm = normalize_arabic(text)
+    mask = 0
+    for flag, markers in _LANGUAGE_MARKERS.items():
+        if any(marker in norm for marker in markers):
+            mask |= flag
+    return mask
+
+
+class HashingEmbedder:
+    """متجهات ثابتة الأبعاد من كلمات النص و n-grams حروفه (تتحمل الأخطاء الإملائية والبادئات)
+
+    crc32 بدلاً من hash() لأن الأخيرة تختلف بين العمليات فتُفسد الفهرس المحفوظ.
+    """
+
+    def __init__(self, dim: int = 1024, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+
+    @property
+    def name(self) -> str:
+        return f"hashing-{self.dim}-{self.ngram}"
+
+    def _features(self, text: str):
+        for token in tokenize(text):
+            yield token, 1.0
+            padded = f"#{token}#"
+            for i in range(max(1, len(padded) - self.ngram + 1)):
+                yield padded[i:i + self.ngram], 0.5
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode('utf-8'))
+                matrix[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class ANNIndex(Protocol):
+    def build(self, vectors: np.ndarray) -> None: ...
+
+    def query(self, vector: np.ndarray, k: int) -> np.ndarray: ...
+
+
+class RandomProjectionANN:
+    """فهرس تقريبي بسيط (LSH بمستويات عشوائية): يعيد مرشحين يُعاد ترتيبهم بالـ cosine الدقيق"""
+
+    def __init__(self, tables: int = 8, bits: int = 12, seed: int = 7):
+        self.tables = tables
+        self.bits = bits
+        self.seed = seed
+        self._planes: Optional[np.ndarray] = None
+        self._buckets: List[Dict[int, np.ndarray]] = []
+
+    def _keys(self, vectors: np.ndarray) -> np.ndarray:
+        # (tables, n) مفتاح لكل متجه في كل جدول
+        signs = np.einsum('tbd,nd->tnb', self._planes, vectors) > 0
+        return signs.astype(np.int64) @ (1 << np.arange(self.bits, dtype=np.int64))
+
+    def build(self, vectors: np.ndarray) -> None:
+        rng = np.random.default_rng(self.seed)
+        self._planes = rng.standard_normal((self.tables, self.bits, vectors.shape[1])).astype(np.float32)
+        self._buckets = []
+        for keys in self._keys(vectors):
+            order = np.argsort(keys, kind='stable')
+            unique, starts = np.unique(keys[order], return_index=True)
+            self._buckets.append(dict(zip(unique.tolist(), np.split(order, starts[1:]))))
+
+    def query(self, vector: np.ndarray, k: int) -> np.ndarray:
+        keys = self._keys(vector[None, :])[:, 0]
+        found = [buckets.get(int(key)) for buckets, key in zip(self._buckets, keys)]
+        found = [ids for ids in found if ids is not None]
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+
+@dataclass
+class SearchEntry:
+    kind: str  # program أو university أو country
+    title: str
+    country_key: str
+    university_key: Optional[str] = None
+    degree: Optional[str] = None
+    tuition: Optional[str] = None
+    language: Optional[str] = None
+
+
+@dataclass
+class SearchQuery:
+    text: str
+    degree: Optional[str] = None
+    max_tuition: Optional[float] = None
+    language: int = 0
+
+
+@dataclass
+class SearchResult:
+    score: float
+    entry: SearchEntry
+
+
+def parse_query(text: str, cheap_tuition: float = 3000.0) -> SearchQuery:
+    """استخراج المرشحات (الدرجة، سقف الرسوم، لغة الدراسة) من نص السؤال؛ الباقي هو المعنى المطلوب"""
+    norm = normalize_arabic(text)
+    query = SearchQuery(text)
+    ceiling = _CEILING_RE.search(norm)
+    if ceiling:
+        query.max_tuition = float(ceiling.group(1).replace(',', ''))
+        norm = norm[:ceiling.start()] + norm[ceiling.end():]
+    words = []
+    for word in re.findall(r"[^\W_]+(?:'s)?", norm):
+        degree = _DEGREE_WORDS.get(word) or _DEGREE_WORDS.get(word.removeprefix('لل').removeprefix('ال'))
+        if degree and query.degree is None:
+            query.degree = degree
+            continue
+        language = next((flag for flag, aliases in _LANGUAGE_WORDS.items() if word in aliases), 0)
+        if language:
+            query.language |= language
+            continue
+        if word in _FREE_WORDS:
+            query.max_tuition = 0.0 if query.max_tuition is None else min(query.max_tuition, 0.0)
+            continue
+        if word in _CHEAP_WORDS:
+            if query.max_tuition is None:
+                query.max_tuition = cheap_tuition
+            continue
+        words.append(word)
+        if word in QUERY_SYNONYMS:
+            words.append(QUERY_SYNONYMS[word])
+    query.text = ' '.join(words)
+    return query
+
+
+def catalog_entries(kb: KnowledgeBase) -> Tuple[List[SearchEntry], List[str], List[Tuple]]:
+    """عناصر الكتالوج ونص كل عنصر للتضمين وبيانات المرشحات (الدرجة، الرسوم، قناع اللغات)"""
+    entries, texts, filters = [], [], []
+    for country in kb.countries.values():
+        country_languages = 0
+        for university in country.universities.values():
+            languages = parse_languages(university.language_requirement)
+            country_languages |= languages
+            base = f"{university.name} {country.name}"
+            entries.append(SearchEntry('university', university.name, country.key, university.key,
+                                       tuition=university.tuition, language=university.language_requirement))
+            programs = ' '.join(name for names in university.programs.values() for name in names)
+            texts.append(f"{base} {programs}")
+            tuition = [parse_tuition(university.tuition, degree) for degree in DEGREES]
+            known = [t for t in tuition if t is not None]
+            filters.append((None, min(known) if known else None, languages))
+            for degree, names in university.programs.items():
+                for name in names:
+                    entries.append(SearchEntry('program', name, country.key, university.key, degree,
+                                               university.tuition, university.language_requirement))
+                    # اسم البرنامج مكرر ليطغى على اسم الجامعة في التشابه
+                    texts.append(f"{name} {name} {degree} {base}")
+                    filters.append((degree, parse_tuition(university.tuition, degree), languages))
+        tuition_text = country.tuition or ' '.join(country.tuition_range.values()) or None
+        entries.append(SearchEntry('country', country.name, country.key, tuition=tuition_text))
+        texts.append(' '.join(filter(None, (country.name, country.description, ' '.join(country.specialties),
+                                            ' '.join(country.cities)))))
+        filters.append((None, parse_tuition(tuition_text), country_languages))
+    return entries, texts, filters
+
+
+class SearchIndex:
+    """فهرس متجهات الكتالوج مع مرشحات رقمية محسوبة مسبقاً كمصفوفات NumPy"""
+
+    def __init__(self, entries: List[SearchEntry], vectors: np.ndarray, degrees: np.ndarray,
+                 tuition: np.ndarray, languages: np.ndarray, embedder: HashingEmbedder,
+                 version: str = '', ann: Optional[ANNIndex] = None, brute_force_limit: int = 20_000):
+        self.entries = entries
+        self.kinds = np.array([entry.kind for entry in entries])
+        self.vectors = vectors
+        self.degrees = degrees
+        self.tuition = tuition
+        self.languages = languages
+        self.embedder = embedder
+        self.version = version
+        self.ann = ann if len(entries) > brute_force_limit else None
+        if self.ann is not None:
+            self.ann.build(np.asarray(vectors))
+
+    @classmethod
+    def build(cls, kb: KnowledgeBase, embedder: Optional[HashingEmbedder] = None, **kwargs) -> 'SearchIndex':
+        embedder = embedder or HashingEmbedder()
+        entries, texts, filters = catalog_entries(kb)
+        degrees = np.array([DEGREES.index(d) if d else -1 for d, _, _ in filters], dtype=np.int8)
+        tuition = np.array([np.nan if t is None else t for _, t, _ in filters], dtype=np.float32)
+        languages = np.array([mask for _, _, mask in filters], dtype=np.uint8)
+        return cls(entries, embedder.embed(texts), degrees, tuition, languages, embedder, kb.version, **kwargs)
+
+    def save(self, path: str) -> None:
+        """المتجهات في path.npy (تُفتح لاحقاً بـ mmap) والبيانات الوصفية في path.json"""
+        # اسم مؤقت لكل عملية: عمال وضع supervisor قد يبنون نفس الفهرس معاً
+        tmp = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, np.ascontiguousarray(self.vectors))
+        os.replace(tmp, f"{path}.npy")
+        meta = {
+            'format': INDEX_FORMAT,
+            'version': self.version,
+            'embedder': self.embedder.name,
+            'entries': [asdict(entry) for entry in self.entries],
+            'degrees': self.degrees.tolist(),
+            'tuition': [None if np.isnan(t) else float(t) for t in self.tuition],
+            'languages': self.languages.tolist(),
+        }
+        tmp = f"{path}.{os.getpid()}.json.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str, expected_version: str, embedder: Optional[HashingEmbedder] = None,
+             **kwargs) -> Optional['SearchIndex']:
+        """فتح فهرس محفوظ؛ None إذا لم يوجد أو كان لنسخة أخرى من قاعدة المعرفة"""
+        embedder = embedder or HashingEmbedder()
+        try:
+            with open(f"{path}.json", encoding='utf-8') as f:
+                meta = json.load(f)
+            if (meta.get('format') != INDEX_FORMAT or meta.get('version') != expected_version
+                    or meta.get('embedder') != embedder.name):
+                return None
+            vectors = np.load(f"{path}.npy", mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"تعذر فتح فهرس البحث {path}: {e}")
+            return None
+        if vectors.shape != (len(meta['entries']), embedder.dim):
+            return None
+        return cls(
+            [SearchEntry(**entry) for entry in meta['entries']],
+            vectors,
+            np.array(meta['degrees'], dtype=np.int8),
+            np.array([np.nan if t is None else t for t in meta['tuition']], dtype=np.float32),
+            np.array(meta['languages'], dtype=np.uint8),
+            embedder,
+            expected_version,
+            **kwargs,
+        )
+
+    @classmethod
+    def for_knowledge_base(cls, kb: KnowledgeBase, path: Optional[str] = None, **kwargs) -> 'SearchIndex':
+        """الفهرس المحفوظ إن كان مطابقاً لنسخة قاعدة المعرفة، وإلا بناؤه وحفظه"""
+        if path:
+            index = cls.load(path, kb.version, **kwargs)
+            if index is not None:
+                return index
+        index = cls.build(kb, **kwargs)
+        if path:
+            try:
+                index.save(path)
+            except OSError as e:
+                logger.warning(f"تعذر حفظ فهرس البحث {path}: {e}")
+        return index
+
+    def _mask(self, query: SearchQuery, kinds: Tuple[str, ...]) -> np.ndarray:
+        mask = np.isin(self.kinds, kinds)
+        if query.degree is not None:
+            # مع تحديد الدرجة تبقى البرامج فقط (الجامعة والدولة ليس لها درجة)
+            mask &= self.degrees == DEGREES.index(query.degree)
+        if query.max_tuition is not None:
+            mask &= ~np.isnan(self.tuition) & (self.tuition <= query.max_tuition)
+        if query.language:
+            mask &= (self.languages & query.language) != 0
+        return mask
+
+    def search(self, query: SearchQuery, top_k: int = 5, min_score: float = 0.05,
+               kinds: Tuple[str, ...] = ('program', 'university', 'country')) -> List[SearchResult]:
+        vector = self.embedder.embed([query.text])[0]
+        mask = self._mask(query, kinds)
+        if self.ann is not None:
+            candidates = self.ann.query(vector, top_k)
+            candidates = candidates[mask[candidates]]
+        else:
+            candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+        scores = np.asarray(self.vectors[candidates]) @ vector
+        if len(candidates) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            best = np.arange(len(candidates))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [SearchResult(float(scores[i]), self.entries[int(candidates[i])])
+                for i in best if scores[i] >= min_score]
+
+
+_DEGREE_LABELS = {'bachelor': 'بكالوريوس', 'master': 'ماجستير', 'phd': 'دكتوراه'}
+
+
+def describe_query(query: SearchQuery) -> str:
+    """المرشحات المستخرجة من السؤال كما تُعرض للطالب"""
+    parts = []
+    if query.degree:
+        parts.append(_DEGREE_LABELS[query.degree])
+    if query.max_tuition is not None:
+        parts.append('مجاني' if query.max_tuition == 0 else f"رسوم حتى {query.max_tuition:,.0f}")
+    if query.language:
+        parts.append('الدراسة بـ' + ' أو '.join(name for flag, name in LANGUAGE_NAMES.items() if query.language & flag))
+    return '، '.join(parts)
+
+
+def format_results(kb: KnowledgeBase, results: List[SearchResult]) -> str:
+    """سطر لكل نتيجة: البرنامج والجامعة والدولة ثم الرسوم واللغة (نص عادي بدون Markdown)"""
+    blocks = []
+    for i, result in enumerate(results, 1):
+        entry = result.entry
+        country = kb.countries.get(entry.country_key)
+        university = kb.universities.get(entry.university_key) if entry.university_key else None
+        if entry.kind == 'program':
+            title = f"🎓 {entry.title} ({_DEGREE_LABELS.get(entry.degree, entry.degree)})"
+            where = ' - '.join(filter(None, (university and university.name, country and country.name)))
+        elif entry.kind == 'university':
+            title = f"🏫 {entry.title}"
+            where = country.name if country else ''
+        else:
+            title = f"🌍 {entry.title}"
+            where = ''
+        lines = [f"{i}. {title}"]
+        if where:
+            lines.append(f"   📍 {where}")
+        if entry.tuition:
+            lines.append(f"   💰 {entry.tuition}")
+        if entry.language:
+            lines.append(f"   🗣 {entry.language}")
+        blocks.append('\n'.join(lines))
+    return '\n\n'.join(blocks)
+
+
+def main(argv: List[str]) -> int:
+    """python program_search.py KB_PATH "cheap engineering master's in English"
+    python program_search.py build KB_PATH INDEX_PATH   (بناء الفهرس مسبقاً، مثلاً أثناء بناء صورة Docker)
+    """
+    from knowledge_base import load_knowledge_base
+
+    if len(argv) == 4 and argv[1] == 'build':
+        SearchIndex.build(load_knowledge_base(argv[2])).save(argv[3])
+        print(f"تم حفظ {argv[3]}")
+        return 0
+    if len(argv) != 3:
+        print(main.__doc__)
+        return 2
+    index = SearchIndex.build(load_knowledge_base(argv[1]))
+    query = parse_query(argv[2])
+    print(query)
+    for result in index.search(query):
+        print(f"{result.score:.3f}  {result.entry.kind}  {result.entry.title}  ({result.entry.university_key})")
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+
+    sys.exit(main(sys.argv))
@@ -0,0 +1,106 @@
+"""سجل أسئلة وأجوبة محدود لكل مستخدم لدعم أسئلة المتابعة ("وماذا عن TUM؟")
+
+السجل يُحفظ في user_data (ويُحفظ عبر طبقة الحفظ) لذلك يجب أن يبقى صغيراً:
+الأدوار الأخيرة مضغوطة في كائن bytes واحد، والأدوار الأقدم تُختصر إلى ملخص نصي قصير.
+"""
+import json
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+from knowledge_index import estimate_tokens
+
+Turn = Tuple[str, str]
+
+
+def _first_sentence(text: str, limit: int) -> str:
+    text = ' '.join(text.split())
+    for mark in ('.', '؟', '?', '!', '\n'):
+        index = text.find(mark)
+        if 0 < index < limit:
+            return text[:index + 1]
+    return text[:limit].rstrip() + ('…' if len(text) > limit else '')
+
+
+def summarize_turns(turns: List[Turn], limit: int = 120) -> str:
+    """ملخص استخراجي للأدوار القديمة: السؤال وأول جملة من الإجابة (بدون استدعاء النموذج)"""
+    return '\n'.join(f"- {_first_sentence(q, limit)} ← {_first_sentence(a, limit)}" for q, a in turns)
+
+
+class QAHistory:
+    """حلقة محدودة بعدد الأدوار وميزانية tokens مع ملخص للأدوار المستبعدة"""
+
+    __slots__ = ('summary', 'updated', '_blob', '_tokens')
+
+    def __init__(self):
+        self.summary = ''
+        self.updated = 0.0
+        self._blob = b''
+        self._tokens = 0
+
+    def __getstate__(self):
+        return self.summary, self.updated, self._blob, self._tokens
+
+    def __setstate__(self, state):
+        self.summary, self.updated, self._blob, self._tokens = state
+
+    def turns(self) -> List[Turn]:
+        if not self._blob:
+            return []
+        return [tuple(turn) for turn in json.loads(zlib.decompress(self._blob))]
+
+    def __len__(self) -> int:
+        return len(self.turns())
+
+    def __bool__(self) -> bool:
+        return bool(self._blob or self.summary)
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens + estimate_tokens(self.summary) if self.summary else self._tokens
+
+    def last_question(self) -> Optional[str]:
+        turns = self.turns()
+        return turns[-1][0] if turns else None
+
+    def expired(self, ttl: float, now: Optional[float] = None) -> bool:
+        return bool(self) and (now or time.time()) - self.updated > ttl
+
+    def add(self, question: str, answer: str, max_turns: int = 6, token_budget: int = 1200,
+            summary_tokens: int = 200, answer_chars: int = 600) -> None:
+        """إضافة دور جديد ثم إخراج الأقدم إلى الملخص حتى يعود السجل ضمن الحدود"""
+        # نهاية الإجابة نادراً ما تلزم لفهم سؤال المتابعة
+        if len(answer) > answer_chars:
+            answer = answer[:answer_chars].rstrip() + '…'
+        turns = self.turns()
+        turns.append((question, answer))
+        cost = [estimate_tokens(q) + estimate_tokens(a) for q, a in turns]
+        evicted = []
+        while len(turns) > 1 and (len(turns) > max_turns or sum(cost) > token_budget):
+            evicted.append(turns.pop(0))
+            cost.pop(0)
+        if evicted:
+            summary = '\n'.join(filter(None, (self.summary, summarize_turns(evicted))))
+            # الإبقاء على أحدث أسطر الملخص ضمن ميزانيته
+            lines = summary.split('\n')
+            while len(lines) > 1 and estimate_tokens('\n'.join(lines)) > summary_tokens:
+                lines.pop(0)
+            self.summary = '\n'.join(lines)
+        self._blob = zlib.compress(json.dumps(turns, ensure_ascii=False).encode('utf-8'))
+        self._tokens = sum(cost)
+        self.updated = time.time()
+
+    def clear(self) -> None:
+        self.summary = ''
+        self._blob = b''
+        self._tokens = 0
+
+    def messages(self) -> List[dict]:
+        """رسائل المحادثة السابقة بصيغة chat completions (تُوضع بين رسالة النظام والسؤال الحالي)"""
+        messages = []
+        if self.summary:
+            messages.append({'role': 'system', 'content': f"ملخص أسئلة سابقة لنفس الطالب:\n{self.summary}"})
+        for question, answer in self.turns():
+            messages.append({'role': 'user', 'content': question})
+            messages.append({'role': 'assistant', 'content': answer})
+        return messages
@@ -0,0 +1,375 @@
+"""تذكير المشتركين بمواعيد التقديم للجامعات والبرامج التي يتابعونها
+
+بدلاً من مهمة لكل مستخدم: كومة (heap) واحدة بأحداث التذكير القادمة (موعد × أيام قبله) ومهمة
+JobQueue واحدة مضبوطة على أقرب حدث. عند حلول الحدث يُقرأ المشتركون من SQLite على دفعات
+مرتبة بـ user_id، وتُرسل الرسائل عبر طابور بمعدل ثابت يحترم حدود Telegram للبث، ويُحفظ
+التقدم بعد كل دفعة فيُستأنف الإرسال من حيث توقف بعد إعادة التشغيل.
+"""
+import asyncio
+import heapq
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TimedOut
+
+from knowledge_base import Deadline, KnowledgeBase
+from knowledge_index import normalize_arabic
+from metrics import REMINDERS_SENT
+from scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+_TERM_LABELS = {'winter': 'الفصل الشتوي', 'summer': 'الفصل الصيفي', 'general': 'التقديم'}
+
+
+def university_target(key: str) -> str:
+    return f"university:{key}"
+
+
+def program_target(name: str) -> str:
+    return f"program:{normalize_arabic(name)}"
+
+
+class SubscriptionStore:
+    """اشتراكات المستخدمين وتقدم إرسال كل حدث في SQLite (وضع WAL)"""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS subscriptions ('
+            'target TEXT NOT NULL, user_id INTEGER NOT NULL, label TEXT NOT NULL, created REAL NOT NULL, '
+            'PRIMARY KEY (target, user_id))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS subscriptions_user ON subscriptions (user_id)')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS reminder_progress ('
+            'event_key TEXT PRIMARY KEY, last_user_id INTEGER NOT NULL, done INTEGER NOT NULL, updated REAL NOT NULL)'
+        )
+        self._db.commit()
+
+    def subscribe(self, user_id: int, target: str, label: str) -> bool:
+        """True إذا كان الاشتراك جديداً"""
+        with self._db:
+            cursor = self._db.execute(
+                'INSERT OR IGNORE INTO subscriptions VALUES (?, ?, ?, ?)', (target, user_id, label, time.time())
+            )
+        return cursor.rowcount > 0
+
+    def subscribe_many(self, rows: Iterable[Tuple[int, str, str]]) -> None:
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                'INSERT OR IGNORE INTO subscriptions VALUES (?, ?, ?, ?)',
+                ((target, user_id, label, now) for user_id, target, label in rows),
+            )
+
+    def unsubscribe(self, user_id: int, target: Optional[str] = None) -> int:
+        with self._db:
+            if target is None:
+                cursor = self._db.execute('DELETE FROM subscriptions WHERE user_id = ?', (user_id,))
+            else:
+                cursor = self._db.execute(
+                    'DELETE FROM subscriptions WHERE user_id = ? AND target = ?', (user_id, target)
+                )
+        return cursor.rowcount
+
+    def subscriptions(self, user_id: int) -> List[Tuple[str, str]]:
+        """(الهدف، الاسم المعروض) لاشتراكات المستخدم"""
+        return self._db.execute(
+            'SELECT target, label FROM subscriptions WHERE user_id = ? ORDER BY created', (user_id,)
+        ).fetchall()
+
+    def count(self) -> int:
+        return self._db.execute('SELECT COUNT(*) FROM subscriptions').fetchone()[0]
+
+    def subscribers(self, targets: Sequence[str], after_user_id: int, limit: int) -> List[int]:
+        """دفعة من المشتركين في أي من الأهداف بترتيب user_id (ترقيم بالمفتاح لا بـ OFFSET)"""
+        placeholders = ','.join('?' * len(targets))
+        rows = self._db.execute(
+            f'SELECT DISTINCT user_id FROM subscriptions WHERE target IN ({placeholders}) AND user_id > ? '
+            f'ORDER BY user_id LIMIT ?',
+            (*targets, after_user_id, limit),
+        )
+        return [row[0] for row in rows]
+
+    def progress(self, event_key: str) -> Tuple[int, bool]:
+        row = self._db.execute(
+            'SELECT last_user_id, done FROM reminder_progress WHERE event_key = ?', (event_key,)
+        ).fetchone()
+        return (row[0], bool(row[1])) if row else (0, False)
+
+    def save_progress(self, event_key: str, last_user_id: int, done: bool) -> None:
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO reminder_progress VALUES (?, ?, ?, ?)',
+                (event_key, last_user_id, int(done), time.time()),
+            )
+
+    def prune_progress(self, older_than: float) -> None:
+        with self._db:
+            self._db.execute('DELETE FROM reminder_progress WHERE updated < ?', (older_than,))
+
+    def close(self) -> None:
+        self._db.close()
+
+
+@dataclass(order=True, frozen=True)
+class ReminderEvent:
+    when: datetime
+    key: str
+    deadline: Deadline = field(compare=False)
+    deadline_date: date = field(compare=False)
+    days_before: int = field(compare=False)
+
+
+def build_events(kb: KnowledgeBase, now: datetime, days_before: Sequence[int], hour: int = 9,
+                 grace: timedelta = timedelta(hours=12)) -> List[ReminderEvent]:
+    """أحداث التذكير القادمة لكل موعد (والفائتة منذ أقل من grace لتعويض فترة توقف البوت)"""
+    events = []
+    today = now.date()
+    for deadline in kb.deadlines:
+        when_date = deadline.next_date(today)
+        if when_date is None or when_date < today:
+            continue
+        for days in days_before:
+            day = when_date - timedelta(days=days)
+            when = datetime(day.year, day.month, day.day, hour, tzinfo=timezone.utc)
+            if when < now - grace:
+                continue
+            key = f"{deadline.university_key}:{deadline.term}:{when_date.isoformat()}:{days}"
+            events.append(ReminderEvent(when, key, deadline, when_date, days))
+    heapq.heapify(events)
+    return events
+
+
+def event_targets(kb: KnowledgeBase, event: ReminderEvent) -> List[str]:
+    """أهداف الاشتراك التي يخصها الحدث: الجامعة نفسها وكل برنامج تقدمه"""
+    targets = [university_target(event.deadline.university_key)]
+    university = kb.universities.get(event.deadline.university_key)
+    if university is not None:
+        targets.extend(sorted({program_target(name) for names in university.programs.values() for name in names}))
+    return targets
+
+
+def reminder_text(kb: KnowledgeBase, event: ReminderEvent) -> str:
+    university = kb.universities.get(event.deadline.university_key)
+    name = university.name if university else event.deadline.university_key
+    term = _TERM_LABELS.get(event.deadline.term, event.deadline.term)
+    remaining = {0: 'اليوم', 1: 'غداً'}.get(event.days_before, f"بعد {event.days_before} يوماً")
+    lines = [
+        f"⏰ تذكير: آخر موعد {term} في {name} هو {event.deadline.text} ({remaining}).",
+    ]
+    if university and university.application_link:
+        lines.append(f"🔗 رابط التقديم: {university.application_link}")
+    lines.append("لإيقاف التذكيرات: /unfollow")
+    return '\n'.join(lines)
+
+
+class SendPacer:
+    """طابور إرسال بمعدل ثابت لكل البوت (Telegram يسمح بنحو 30 رسالة في الثانية للبث)
+
+    الطابور محدود فينتظر المُرسل عند امتلائه بدلاً من تحميل كل الرسائل في الذاكرة.
+    RetryAfter يوقف الإرسال كله المدة المطلوبة ثم يعيد المحاولة لنفس الرسالة.
+    """
+
+    def __init__(self, bot=None, rate: float = 25.0, burst: float = 30.0, max_queue: int = 1000,
+                 on_blocked: Optional[Callable[[int], None]] = None, max_attempts: int = 3):
+        self.bot = bot
+        self.rate = rate
+        self.max_queue = max_queue
+        self.on_blocked = on_blocked
+        self.max_attempts = max_attempts
+        self._limiter = TokenBucket(rate, burst)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def send(self, chat_id: int, text: str, **kwargs) -> None:
+        await self._queue.put((chat_id, text, kwargs))
+
+    async def join(self) -> None:
+        await self._queue.join()
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _acquire(self) -> None:
+        while not self._limiter.allow():
+            await asyncio.sleep(1 / self.rate if self.rate > 0 else 0)
+
+    async def _deliver(self, chat_id: int, text: str, kwargs: dict) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            await self._acquire()
+            try:
+                await self.bot.send_message(chat_id, text, **kwargs)
+                REMINDERS_SENT.inc(outcome='sent')
+                return
+            except RetryAfter as e:
+                REMINDERS_SENT.inc(outcome='throttled')
+                await asyncio.sleep(float(e.retry_after if isinstance(e.retry_after, (int, float))
+                                          else e.retry_after.total_seconds()))
+            except Forbidden:
+                # المستخدم حظر البوت: لا فائدة من تذكيره مرة أخرى
+                REMINDERS_SENT.inc(outcome='blocked')
+                if self.on_blocked is not None:
+                    self.on_blocked(chat_id)
+                return
+            except BadRequest as e:
+                REMINDERS_SENT.inc(outcome='failed')
+                logger.warning(f"تعذر إرسال تذكير إلى {chat_id}: {e}")
+                return
+            except (TimedOut, OSError) as e:
+                if attempt == self.max_attempts:
+                    REMINDERS_SENT.inc(outcome='failed')
+                    logger.warning(f"تعذر إرسال تذكير إلى {chat_id} بعد {attempt} محاولات: {e}")
+                    return
+                await asyncio.sleep(2 ** attempt)
+
+    async def _run(self) -> None:
+        while True:
+            chat_id, text, kwargs = await self._queue.get()
+            try:
+                await self._deliver(chat_id, text, kwargs)
+            except Exception as e:
+                REMINDERS_SENT.inc(outcome='failed')
+                logger.error(f"خطأ غير متوقع في إرسال تذكير إلى {chat_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def start(self, bot=None) -> None:
+        if bot is not None:
+            self.bot = bot
+        if self._task is None:
+            self._queue = asyncio.Queue(self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"بقيت {self._queue.qsize()} رسالة تذكير لم تُرسل")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+class ReminderScheduler:
+    """مهمة JobQueue واحدة تُضبط على أقرب حدث في الكومة بغض النظر عن عدد المشتركين"""
+
+    JOB_NAME = 'deadline_reminders'
+
+    def __init__(self, store: SubscriptionStore, pacer: SendPacer, days_before: Sequence[int] = (30, 7, 1),
+                 hour: int = 9, batch_size: int = 500):
+        self.store = store
+        self.pacer = pacer
+        self.days_before = tuple(sorted(set(days_before), reverse=True))
+        self.hour = hour
+        self.batch_size = batch_size
+        self.kb: Optional[KnowledgeBase] = None
+        self._events: List[ReminderEvent] = []
+        self._job_queue = None
+        self._job = None
+        self._running: Optional[asyncio.Task] = None
+
+    def start(self, application, kb: KnowledgeBase) -> None:
+        """يتطلب JobQueue (python-telegram-bot[job-queue])؛ بدونه تُحفظ الاشتراكات دون إرسال"""
+        self._job_queue = application.job_queue
+        if self._job_queue is None:
+            logger.warning("JobQueue غير متاح (ثبّت python-telegram-bot[job-queue])؛ تذكيرات المواعيد معطلة")
+        self.pacer.start(application.bot)
+        self.rebuild(kb)
+
+    def _pending(self, events: List[ReminderEvent]) -> List[ReminderEvent]:
+        events = [event for event in events if not self.store.progress(event.key)[1]]
+        heapq.heapify(events)
+        return events
+
+    def _install(self, kb: KnowledgeBase, events: List[ReminderEvent]) -> None:
+        self.kb = kb
+        self._events = events
+        self._schedule_next()
+
+    def rebuild(self, kb: KnowledgeBase, now: Optional[datetime] = None) -> None:
+        """إعادة بناء الكومة (عند التشغيل) وضبط المهمة على أقرب حدث"""
+        now = now or datetime.now(timezone.utc)
+        self._install(kb, self._pending(build_events(kb, now, self.days_before, self.hour)))
+
+    async def prepare_reload(self, kb: KnowledgeBase) -> Callable[[], None]:
+        """مستمع KnowledgeBaseStore: حساب الأحداث في خيط ثم استبدال الكومة مع قاعدة المعرفة"""
+        now = datetime.now(timezone.utc)
+        events = await asyncio.to_thread(build_events, kb, now, self.days_before, self.hour)
+        # الاشتراكات في SQLite على اتصال حلقة الأحداث؛ استعلام واحد لكل حدث
+        events = self._pending(events)
+        return lambda: self._install(kb, events)
+
+    def next_event(self) -> Optional[ReminderEvent]:
+        return self._events[0] if self._events else None
+
+    def _schedule_next(self) -> None:
+        if self._job_queue is None:
+            return
+        if self._job is not None:
+            self._job.schedule_removal()
+            self._job = None
+        if not self._events:
+            return
+        when = max(self._events[0].when, datetime.now(timezone.utc) + timedelta(seconds=1))
+        self._job = self._job_queue.run_once(self._on_job, when, name=self.JOB_NAME)
+
+    async def _on_job(self, context) -> None:
+        self._job = None
+        if self._running is not None and not self._running.done():
+            return
+        # الإرسال قد يستغرق دقائق مع آلاف المشتركين؛ لا يحجز منفذ JobQueue طوال المدة
+        self._running = asyncio.create_task(self.run_due())
+
+    async def run_due(self, now: Optional[datetime] = None) -> int:
+        """إرسال كل الأحداث التي حل وقتها ثم ضبط المهمة على الحدث التالي؛ يعيد عدد الرسائل"""
+        sent = 0
+        try:
+            while self._events and self._events[0].when <= (now or datetime.now(timezone.utc)):
+                event = heapq.heappop(self._events)
+                sent += await self.fan_out(event)
+        finally:
+            self._schedule_next()
+        return sent
+
+    async def fan_out(self, event: ReminderEvent) -> int:
+        """إرسال تذكير الحدث لكل مشتركيه على دفعات مع حفظ التقدم بعد كل دفعة"""
+        kb = self.kb
+        targets = event_targets(kb, event)
+        text = reminder_text(kb, event)
+        last_user_id, done = self.store.progress(event.key)
+        sent = 0
+        while not done:
+            batch = self.store.subscribers(targets, last_user_id, self.batch_size)
+            for user_id in batch:
+                await self.pacer.send(user_id, text)
+            # التقدم يُحفظ بعد خروج الدفعة فعلاً من الطابور
+            await self.pacer.join()
+            sent += len(batch)
+            if batch:
+                last_user_id = batch[-1]
+            done = len(batch) < self.batch_size
+            self.store.save_progress(event.key, last_user_id, done)
+        if sent:
+            logger.info(f"أُرسل تذكير {event.key} إلى {sent} مشترك")
+        return sent
+
+    async def stop(self) -> None:
+        # JobQueue يتوقف قبل post_shutdown ومعه المهمة المجدولة
+        self._job = None
+        self._job_queue = None
+        if self._running is not None:
+            self._running.cancel()
+            await asyncio.gather(self._running, return_exceptions=True)
+        await self.pacer.stop()
+        # سجل التقدم يلزم فقط للأحداث الحديثة
+        self.store.prune_progress(time.time() - 400 * 86400)
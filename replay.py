@@ -0,0 +1,329 @@
+"""إعادة تشغيل سجل تحديثات حقيقية (من RECORD_UPDATES_PATH) على البوت مع خوادم وهمية
+
+يشغّل التطبيق الحقيقي أمام Telegram و OpenAI و Make.com وهمية ويرسل تحديثات السجل بنفس
+ترتيبها لكل مستخدم وبسرعة مضاعفة (--speed)، ثم يقارن تسلسل الردود لكل مستخدم بنتيجة
+تشغيل سابق ويقيس معدل المعالجة. التحديثات تُقسم على عدة عمليات حسب المستخدم (--shards)
+لأن ردود كل مستخدم لا تعتمد على غيره، فتُدمج نتائج الأجزاء كأنها تشغيل واحد.
+
+مثال:
+    # ردود الإصدار السليم كخط أساس
+    python replay.py updates.log --save baseline.json
+    # بعد التعديل: رمز خروج 1 إذا اختلف أي رد
+    python replay.py updates.log --expect baseline.json --shards 4 --speed 100
+    # سجل مصطنع من مسارات benchmark.py للتجربة
+    python replay.py --synthesize 500 synthetic.log
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Update
+
+from benchmark import BackgroundServers, summarize
+from fake_servers import FakeOpenAIServer, FakeTelegramServer, FakeWebhookServer
+from update_log import UpdateRecorder, read_log, update_user_id
+
+# طلبات Bot API التي لا تُعد رداً على المستخدم
+IGNORED_METHODS = ('getMe', 'getFile', 'getUpdates', 'getWebhookInfo', 'setWebhook', 'deleteWebhook', 'setMyCommands')
+
+_FILE_MAGIC = {
+    'application/pdf': b'%PDF-1.4\n',
+    'image/jpeg': b'\xff\xd8\xff\xe0',
+    'image/png': b'\x89PNG\r\n\x1a\n',
+}
+
+
+def load_shard(path: str, shard: int = 0, shards: int = 1) -> Tuple[float, Dict[int, List[Tuple[float, dict]]]]:
+    """(وقت أول تحديث في السجل كله، تحديثات مستخدمي هذا الجزء مجمعة حسب المستخدم)"""
+    started = None
+    users: Dict[int, List[Tuple[float, dict]]] = defaultdict(list)
+    for timestamp, update in read_log(path):
+        started = timestamp if started is None else min(started, timestamp)
+        user_id = update_user_id(update)
+        if user_id % shards == shard:
+            users[user_id].append((timestamp, update))
+    return started or 0.0, users
+
+
+def synthetic_file(file_id: str, mime_type: Optional[str], size: Optional[int]) -> bytes:
+    """محتوى ثابت لكل معرف ملف بنفس النوع والحجم (الملفات الأصلية لا تُحفظ في السجل)"""
+    head = _FILE_MAGIC.get(mime_type or 'image/jpeg', b'')
+    body = hashlib.sha256(file_id.encode('utf-8')).digest()
+    size = min(size or 1024, 1024 * 1024)
+    return (head + body * (size // len(body) + 1))[:max(size, len(head) + len(body))]
+
+
+def register_files(telegram: FakeTelegramServer, users: Dict[int, List[Tuple[float, dict]]]) -> None:
+    for records in users.values():
+        for _, update in records:
+            message = update.get('message') or {}
+            if 'document' in message:
+                document = message['document']
+                telegram.add_file(document['file_id'], synthetic_file(
+                    document['file_id'], document.get('mime_type'), document.get('file_size')))
+            for size in message.get('photo', ()):
+                telegram.add_file(size['file_id'], synthetic_file(size['file_id'], 'image/jpeg', size.get('file_size')))
+
+
+def collect_responses(calls: List[tuple], users: Dict[int, List[Tuple[float, dict]]]) -> Dict[str, List[dict]]:
+    """تسلسل ردود البوت لكل مستخدم دون معرفات الرسائل (تختلف بين التشغيلات والأجزاء)"""
+    callback_users = {
+        update['callback_query']['id']: user_id
+        for user_id, records in users.items()
+        for _, update in records if 'callback_query' in update
+    }
+    responses: Dict[str, List[dict]] = defaultdict(list)
+    for method, params in calls:
+        if method in IGNORED_METHODS:
+            continue
+        if params.get('chat_id') is not None:
+            user_id = int(params['chat_id'])
+        elif str(params.get('callback_query_id')) in callback_users:
+            # الخادم الوهمي يحوّل القيم الرقمية النصية إلى أرقام
+            user_id = callback_users[str(params['callback_query_id'])]
+        else:
+            continue
+        response = {'method': method}
+        for key in ('text', 'reply_markup', 'show_alert'):
+            if params.get(key) is not None:
+                response[key] = params[key]
+        responses[str(user_id)].append(response)
+    return dict(responses)
+
+
+def configure_environment(telegram: FakeTelegramServer, openai_server: FakeOpenAIServer,
+                          webhook: FakeWebhookServer) -> None:
+    # يجب ضبط البيئة قبل استيراد bot لأن الإعدادات تُقرأ عند الاستيراد
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': '123456:REPLAY',
+        'TELEGRAM_API_BASE_URL': telegram.base_url,
+        'OPENAI_API_KEY': 'replay',
+        'OPENAI_BASE_URL': openai_server.base_url,
+        'MAKE_WEBHOOK_URL': webhook.url,
+        # الرد التدريجي يعدل الرسالة بعدد مرات يعتمد على التوقيت
+        'LLM_STREAMING': '0',
+        'ANSWER_CACHE_PATH': ':memory:',
+        'SEARCH_INDEX_PATH': os.path.join(tempfile.mkdtemp(prefix='glovuni-search-'), 'search_index'),
+        'OUTBOUND_QUEUE_PATH': ':memory:',
+        'SUBSCRIPTIONS_PATH': ':memory:',
+        'PERSISTENCE_BACKEND': 'none',
+        'UPLOAD_DIR': tempfile.mkdtemp(prefix='glovuni-uploads-'),
+        'DOC_PROCESS_WORKERS': '0',
+        'RECORD_UPDATES_PATH': '',
+        # السجل المسرّع يتجاوز حدود المعدل الحقيقية؛ الردود يجب ألا تعتمد على التوقيت
+        'USER_RATE_LIMIT': '0',
+        'LLM_RATE_LIMIT': '0',
+    })
+
+
+async def run_shard(args) -> dict:
+    log_started, users = load_shard(args.log, args.shard, args.shards)
+    telegram = FakeTelegramServer()
+    openai_server = FakeOpenAIServer(latency=args.openai_latency)
+    webhook = FakeWebhookServer()
+    register_files(telegram, users)
+    servers = BackgroundServers(telegram, openai_server, webhook)
+    servers.start()
+    configure_environment(telegram, openai_server, webhook)
+
+    import bot
+
+    logging.getLogger().setLevel(logging.WARNING)
+    application = bot.build_application()
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    errors = 0
+
+    async def count_error(update, context) -> None:
+        nonlocal errors
+        errors += 1
+
+    application.add_error_handler(count_error)
+    latencies: List[float] = []
+
+    async def replay_user(records: List[Tuple[float, dict]]) -> None:
+        for timestamp, data in records:
+            if args.speed > 0:
+                delay = (timestamp - log_started) / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            update = Update.de_json(data, application.bot)
+            start = time.perf_counter()
+            # نفس مسار التحديثات الحقيقية: المجدول ثم المعالجات
+            await application.update_processor.process_update(update, application.process_update(update))
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(replay_user(records) for records in users.values()))
+    elapsed = time.perf_counter() - started
+
+    await application.stop()
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+    servers.stop()
+
+    return {
+        'shard': args.shard,
+        'users': len(users),
+        'updates': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_updates_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency': summarize(latencies),
+        'backends': {
+            'telegram_calls': len(telegram.calls),
+            'openai_requests': len(openai_server.requests),
+            'make_submissions': len(webhook.received),
+        },
+        'responses': collect_responses(telegram.calls, users),
+    }
+
+
+def run_sharded(args) -> dict:
+    """تشغيل كل جزء في عملية منفصلة ودمج النتائج"""
+    workdir = tempfile.mkdtemp(prefix='glovuni-replay-')
+    processes = []
+    started = time.perf_counter()
+    for shard in range(args.shards):
+        output = os.path.join(workdir, f"shard-{shard}.json")
+        command = [sys.executable, os.path.abspath(__file__), args.log, '--shard', str(shard), '--shards',
+                   str(args.shards), '--speed', str(args.speed), '--openai-latency', str(args.openai_latency),
+                   '--shard-output', output]
+        processes.append((subprocess.Popen(command), output))
+    results = []
+    for shard, (process, output) in enumerate(processes):
+        if process.wait() != 0:
+            raise SystemExit(f"فشل الجزء {shard} من إعادة التشغيل برمز {process.returncode}")
+        with open(output, encoding='utf-8') as f:
+            results.append(json.load(f))
+    elapsed = time.perf_counter() - started
+
+    responses = {}
+    for result in results:
+        responses.update(result.pop('responses'))
+    updates = sum(result['updates'] for result in results)
+    return {
+        'users': sum(result['users'] for result in results),
+        'updates': updates,
+        'errors': sum(result['errors'] for result in results),
+        # يشمل زمن بدء العمليات؛ معدل كل جزء وحده في shards
+        'elapsed_s': round(elapsed, 3),
+        'throughput_updates_per_s': round(updates / elapsed, 1) if elapsed else 0.0,
+        'shards': results,
+        'responses': responses,
+    }
+
+
+def compare_responses(expected: Dict[str, List[dict]], actual: Dict[str, List[dict]]) -> List[str]:
+    """وصف أول اختلاف لكل مستخدم تغيرت ردوده"""
+    mismatches = []
+    for user_id in sorted(set(expected) | set(actual), key=int):
+        want, got = expected.get(user_id, []), actual.get(user_id, [])
+        if want == got:
+            continue
+        index = next((i for i, (a, b) in enumerate(zip(want, got)) if a != b), min(len(want), len(got)))
+        mismatches.append(
+            f"المستخدم {user_id}، الرد {index + 1}: متوقع {_describe(want, index)} وجاء {_describe(got, index)}")
+    return mismatches
+
+
+def _describe(responses: List[dict], index: int) -> str:
+    if index >= len(responses):
+        return '(لا شيء)'
+    response = responses[index]
+    text = (response.get('text') or '').replace('\n', ' ')
+    return f"{response['method']} «{text[:60]}{'…' if len(text) > 60 else ''}»"
+
+
+def synthesize(path: str, users: int, questions: int = 1) -> int:
+    """سجل مصطنع من مسار الطالب الكامل في benchmark.py (خطوة كل ثانيتين)"""
+    from telegram import Bot
+
+    from benchmark import UpdateFactory, user_journey
+
+    factory = UpdateFactory(Bot('123456:REPLAY'))
+    recorder = UpdateRecorder(path, salt='synthetic')
+    started = time.time()
+    for i in range(users):
+        for step, (_, update) in enumerate(user_journey(factory, 1_000_000 + i, questions)):
+            recorder.write(update.to_dict(), timestamp=started + i * 0.5 + step * 2)
+    recorder.close()
+    return recorder.recorded
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='إعادة تشغيل سجل تحديثات ومقارنة ردود البوت')
+    parser.add_argument('log', help='ملف السجل (RECORD_UPDATES_PATH)')
+    parser.add_argument('--speed', type=float, default=100.0,
+                        help='مضاعف سرعة التشغيل بالنسبة للتوقيت المسجل (0 بأقصى سرعة)')
+    parser.add_argument('--shards', type=int, default=1, help='عدد العمليات المتوازية')
+    parser.add_argument('--shard', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--shard-output', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--openai-latency', type=float, default=0.0)
+    parser.add_argument('--save', help='حفظ تسلسل الردود لكل مستخدم كخط أساس')
+    parser.add_argument('--expect', help='خط أساس سابق؛ أي اختلاف يعطي رمز خروج 1')
+    parser.add_argument('--output', default=None, help='ملف حفظ تقرير المعدل والزمن')
+    parser.add_argument('--synthesize', type=int, default=0, metavar='USERS',
+                        help='كتابة سجل مصطنع لهذا العدد من المستخدمين بدلاً من التشغيل')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.synthesize:
+        count = synthesize(args.log, args.synthesize)
+        print(f"{count} تحديث في {args.log}")
+        return 0
+    if args.shard is not None:
+        # عملية جزء واحد يشغلها run_sharded
+        result = asyncio.run(run_shard(args))
+        with open(args.shard_output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return 0
+
+    if args.shards > 1:
+        results = run_sharded(args)
+    else:
+        args.shard = 0
+        results = asyncio.run(run_shard(args))
+    responses = results.pop('responses')
+    print(f"{results['updates']} تحديث لـ {results['users']} مستخدم في {results['elapsed_s']} ثانية "
+          f"({results['throughput_updates_per_s']} تحديث/ثانية، {args.shards} جزء)، أخطاء={results['errors']}")
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(responses, f, ensure_ascii=False, sort_keys=True)
+        print(f"الردود محفوظة في {args.save}")
+
+    status = 0
+    if args.expect:
+        with open(args.expect, encoding='utf-8') as f:
+            mismatches = compare_responses(json.load(f), responses)
+        results['mismatches'] = mismatches
+        for line in mismatches[:20]:
+            print(line)
+        if mismatches:
+            print(f"{len(mismatches)} مستخدم تغيرت ردوده")
+            status = 1
+        else:
+            print("الردود مطابقة لخط الأساس")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
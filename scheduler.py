@@ -0,0 +1,154 @@
+"""جدولة التحديثات قبل وصولها للمعالجات: حدود معدل لكل مستخدم وعامة ومسارات أولوية منفصلة"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import LANE_DEPTH, UPDATES_SHED
+
+logger = logging.getLogger(__name__)
+
+FAST_LANE = 'fast'
+LLM_LANE = 'llm'
+
+
+class TokenBucket:
+    """حد معدل بخوارزمية token bucket لمفاتيح متعددة (مستخدمين) أو مفتاح واحد
+
+    rate = 0 يعطل الحد. الدلاء الممتلئة تُحذف دورياً حتى لا تكبر الذاكرة مع عدد المستخدمين.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        # مفتاح -> [الرصيد، آخر تحديث]
+        self._buckets: Dict[Any, list] = {}
+
+    def allow(self, key: Any = None, now: Optional[float] = None) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune(now)
+            bucket = self._buckets[key] = [self.burst, now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def _prune(self, now: float) -> None:
+        full = [key for key, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+@dataclass
+class Lane:
+    """مسار تنفيذ بحد تزامن وحد لطول الانتظار"""
+    name: str
+    concurrency: int
+    max_queue: int
+    running: int = 0
+    waiting: int = 0
+
+    def __post_init__(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+
+
+ShedCallback = Callable[[object, str], Awaitable[None]]
+
+
+class UpdateScheduler(BaseUpdateProcessor):
+    """معالج تحديثات يوزعها على مسارات أولوية بدلاً من حد تزامن واحد للجميع
+
+    - المسار السريع: أزرار القوائم والأوامر والرسائل الخفيفة.
+    - مسار النموذج: أسئلة تحتاج OpenAI بتزامن محدود وحد معدل عام.
+    التحديثات التي تتجاوز الحدود تُرفض فوراً ويُرسل للمستخدم رد "مشغول" بدلاً من تكديسها.
+    """
+
+    def __init__(self, classify: Optional[Callable[[object], str]] = None, fast_concurrency: int = 16,
+                 llm_concurrency: int = 8, fast_queue: int = 1000, llm_queue: int = 50,
+                 user_rate: float = 1.0, user_burst: float = 10.0,
+                 llm_rate: float = 10.0, llm_burst: float = 20.0,
+                 on_shed: Optional[ShedCallback] = None, notice_interval: float = 10.0):
+        self.lanes = {
+            FAST_LANE: Lane(FAST_LANE, fast_concurrency, fast_queue),
+            LLM_LANE: Lane(LLM_LANE, llm_concurrency, llm_queue),
+        }
+        # حد BaseUpdateProcessor الخارجي يجب ألا يحجب أي مسار؛ المسارات هي التي تحدد التزامن
+        super().__init__(sum(lane.concurrency + lane.max_queue for lane in self.lanes.values()))
+        self.classify = classify
+        self.user_limiter = TokenBucket(user_rate, user_burst)
+        self.llm_limiter = TokenBucket(llm_rate, llm_burst)
+        self.on_shed = on_shed
+        self.notice_interval = notice_interval
+        # آخر مرة أُبلغ فيها كل مستخدم بالرفض حتى لا نرد على كل رسالة في حالة الإغراق
+        self._notified = TokenBucket(1 / notice_interval if notice_interval > 0 else 0, 1)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @staticmethod
+    def _user_id(update) -> Optional[int]:
+        user = getattr(update, 'effective_user', None)
+        return user.id if user is not None else None
+
+    async def _shed(self, update, coroutine: Awaitable, lane: str, reason: str) -> None:
+        coroutine.close()
+        UPDATES_SHED.inc(lane=lane, reason=reason)
+        user_id = self._user_id(update)
+        if self.on_shed is None or not self._notified.allow(user_id):
+            return
+        try:
+            await self.on_shed(update, reason)
+        except Exception as e:
+            logger.warning(f"تعذر إرسال رد الانشغال: {e}")
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        lane_name = self.classify(update) if self.classify is not None else FAST_LANE
+        lane = self.lanes[lane_name]
+        user_id = self._user_id(update)
+        if user_id is not None and not self.user_limiter.allow(user_id):
+            await self._shed(update, coroutine, lane_name, 'user_rate')
+            return
+        if lane_name == LLM_LANE and not self.llm_limiter.allow():
+            await self._shed(update, coroutine, lane_name, 'global_rate')
+            return
+        if lane.running >= lane.concurrency and lane.waiting >= lane.max_queue:
+            await self._shed(update, coroutine, lane_name, 'queue_full')
+            return
+        lane.waiting += 1
+        LANE_DEPTH.set(lane.waiting, lane=lane_name)
+        try:
+            await lane.semaphore.acquire()
+        finally:
+            lane.waiting -= 1
+            LANE_DEPTH.set(lane.waiting, lane=lane_name)
+        lane.running += 1
+        try:
+            await coroutine
+        finally:
+            lane.running -= 1
+            lane.semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            name: {'running': lane.running, 'waiting': lane.waiting}
+            for name, lane in self.lanes.items()
+        }
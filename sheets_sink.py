@@ -0,0 +1,139 @@
+"""تصدير طلبات التقديم إلى Google Sheets بدفعات مع احترام حصة الـ API"""
+import asyncio
+import json
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from metrics import SHEETS_ROWS
+from scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SUBMISSION_COLUMNS = ('timestamp', 'name', 'email', 'phone', 'field', 'documents')
+
+
+def open_worksheet(creds_json: str, spreadsheet_key: str, worksheet_name: str = ''):
+    """فتح ورقة العمل باستخدام بيانات اعتماد حساب الخدمة (استدعاء محجوب؛ يُنفذ في خيط)"""
+    import gspread
+
+    client = gspread.service_account_from_dict(json.loads(creds_json))
+    spreadsheet = client.open_by_key(spreadsheet_key)
+    return spreadsheet.worksheet(worksheet_name) if worksheet_name else spreadsheet.sheet1
+
+
+def _cell(value) -> str:
+    if isinstance(value, list):
+        # قائمة الوثائق تظهر كأسماء ملفات؛ التفاصيل الكاملة تُرسل إلى Make.com
+        return ', '.join(item.get('file_name', '') if isinstance(item, dict) else str(item) for item in value)
+    return str(value or '')
+
+
+def submission_row(payload: dict) -> List[str]:
+    return [_cell(payload.get(column)) for column in SUBMISSION_COLUMNS]
+
+
+class SheetsSink:
+    """تجميع الصفوف في الذاكرة وإرسالها عبر append_rows عند امتلاء الدفعة أو مرور flush_interval
+
+    مكتبة gspread محجوبة (blocking) لذلك كل استدعاءاتها تتم في خيط منفصل، وعدد الطلبات
+    محدود بـ token bucket محلي حتى لا نتجاوز حصة Sheets API (60 طلب كتابة في الدقيقة افتراضياً).
+    """
+
+    def __init__(self, worksheet_factory: Callable[[], object], batch_size: int = 50,
+                 flush_interval: float = 5.0, rate: float = 1.0, burst: float = 5.0,
+                 max_buffer: int = 10_000, backoff_base: float = 2.0, backoff_max: float = 120.0):
+        self.worksheet_factory = worksheet_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limiter = TokenBucket(rate, burst)
+        self._rate = rate
+        self._buffer: List[List[str]] = []
+        self._worksheet = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sheets')
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0
+
+    def add(self, row: List[str]) -> None:
+        """إضافة صف دون انتظار؛ الإرسال يتم في الخلفية"""
+        if len(self._buffer) >= self.max_buffer:
+            # الطلب محفوظ أيضاً في طابور Make.com؛ نفضل إسقاط الأقدم على استهلاك الذاكرة بلا حد
+            self._buffer.pop(0)
+            SHEETS_ROWS.inc(outcome='dropped')
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    async def _call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    async def _acquire(self) -> None:
+        while not self._limiter.allow():
+            await asyncio.sleep(1 / self._rate if self._rate > 0 else 0)
+
+    async def _flush_batch(self) -> bool:
+        """إرسال دفعة واحدة؛ يعيد False عند الفشل (تبقى الصفوف في المخزن)"""
+        batch = self._buffer[:self.batch_size]
+        if not batch:
+            return True
+        await self._acquire()
+        try:
+            if self._worksheet is None:
+                self._worksheet = await self._call(self.worksheet_factory)
+            # RAW: ما كتبه الطالب يُحفظ كنص كما هو؛ USER_ENTERED ينفذ "=..." كمعادلة
+            # ويحوّل "+966..." إلى رقم فيحذف + والأصفار البادئة
+            await self._call(self._worksheet.append_rows, batch, value_input_option='RAW')
+        except Exception as e:
+            self._failures += 1
+            SHEETS_ROWS.inc(len(batch), outcome='retry')
+            logger.warning(f"فشل إرسال {len(batch)} صف إلى Google Sheets (محاولة {self._failures}): {e}")
+            return False
+        # الصفوف المضافة أثناء الإرسال تبقى في نهاية المخزن
+        del self._buffer[:len(batch)]
+        self._failures = 0
+        SHEETS_ROWS.inc(len(batch), outcome='appended')
+        return True
+
+    async def flush(self) -> None:
+        while self._buffer:
+            if not await self._flush_batch():
+                return
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if self._failures:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (self._failures - 1))
+                await asyncio.sleep(random.uniform(0, delay))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        if self._buffer:
+            logger.warning(f"بقي {len(self._buffer)} صف لم يُرسل إلى Google Sheets")
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import logging
+import pickle
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# (namespace, key, value) حيث value = None تعني الحذف
+WriteOp = Tuple[str, str, Optional[bytes]]
+
+
+class SQLiteBackend:
+    """تخزين الحالة في SQLite بوضع WAL؛ كل العمليات تتم في خيط منفصل"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='state-sqlite')
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS state ('
+                'namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, '
+                'PRIMARY KEY (namespace, key))'
+            )
+        return self._db
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _load_all(self, namespace: str) -> Dict[str, bytes]:
+        rows = self._connect().execute('SELECT key, value FROM state WHERE namespace = ?', (namespace,))
+        return dict(rows.fetchall())
+
+    def _load(self, namespace: str, key: str) -> Optional[bytes]:
+        row = self._connect().execute(
+            'SELECT value FROM state WHERE namespace = ? AND key = ?', (namespace, key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _write_batch(self, ops: List[WriteOp]) -> None:
+        db = self._connect()
+        with db:
+            db.executemany(
+                'INSERT OR REPLACE INTO state VALUES (?, ?, ?)',
+                [op for op in ops if op[2] is not None],
+            )
+            db.executemany(
+                'DELETE FROM state WHERE namespace = ? AND key = ?',
+                [(ns, key) for ns, key, value in ops if value is None],
+            )
+
+    async def load_all(self, namespace: str) -> Dict[str, bytes]:
+        return await self._run(self._load_all, namespace)
+
+    async def load(self, namespace: str, key: str) -> Optional[bytes]:
+        return await self._run(self._load, namespace, key)
+
+    async def write_batch(self, ops: List[WriteOp]) -> None:
+        await self._run(self._write_batch, ops)
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=True)
+
+
+class RedisError(Exception):
+    """خطأ أرجعه خادم Redis"""
+
+
+class RedisBackend:
+    """تخزين الحالة في Redis (أو أي خادم يتحدث بروتوكول RESP) لمشاركتها بين عدة عمليات"""
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', prefix: str = 'glovuni'):
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.lstrip('/') or 0)
+        self.prefix = prefix
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(out)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError('انقطع الاتصال مع Redis')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RedisError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(rest)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RedisError(f"رد غير متوقع: {line!r}")
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            await self._pipeline(setup)
+
+    async def _pipeline(self, commands: List[tuple]) -> list:
+        self._writer.write(b''.join(self._encode(*cmd) for cmd in commands))
+        await self._writer.drain()
+        return [await self._read_reply() for _ in commands]
+
+    async def execute(self, *commands: tuple) -> list:
+        """تنفيذ عدة أوامر دفعة واحدة (pipeline) مع إعادة الاتصال مرة عند الانقطاع"""
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await self._pipeline(list(commands))
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    self._writer = None
+                    if attempt:
+                        raise
+
+    def _hash(self, namespace: str) -> str:
+        return f"{self.prefix}:{namespace}"
+
+    async def load_all(self, namespace: str) -> Dict[str, bytes]:
+        (flat,) = await self.execute(('HGETALL', self._hash(namespace)))
+        return {flat[i].decode('utf-8'): flat[i + 1] for i in range(0, len(flat), 2)}
+
+    async def load(self, namespace: str, key: str) -> Optional[bytes]:
+        (value,) = await self.execute(('HGET', self._hash(namespace), key))
+        return value
+
+    async def write_batch(self, ops: List[WriteOp]) -> None:
+        commands = [
+            ('HSET', self._hash(ns), key, value) if value is not None else ('HDEL', self._hash(ns), key)
+            for ns, key, value in ops
+        ]
+        if commands:
+            await self.execute(*commands)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def _conv_key(key: tuple) -> str:
+    return json.dumps(list(key))
+
+
+class StatePersistence(BasePersistence):
+    """طبقة حفظ لحالات المحادثة و user_data و bot_data فوق أي backend
+
+    الكتابة لا تنتظر القرص أو الشبكة: التغييرات تُجمع في الذاكرة وتُكتب دفعة واحدة
+    من مهمة خلفية كل flush_interval ثانية. الحالة تُقرأ من الـ backend عند بدء التشغيل فقط،
+    لذلك عند تشغيل عدة نسخ يجب أن يصل كل مستخدم دائماً إلى نفس النسخة (كما في وضع supervisor).
+    """
+
+    def __init__(self, backend, update_interval: float = 5.0, flush_interval: float = 1.0):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._dirty: Dict[Tuple[str, str], Optional[bytes]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def _mark(self, namespace: str, key: str, value) -> None:
+        self._dirty[(namespace, key)] = None if value is None else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self._write_dirty()
+
+    async def _write_dirty(self) -> None:
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            ops = [(ns, key, value) for (ns, key), value in dirty.items()]
+            try:
+                await self.backend.write_batch(ops)
+            except Exception as e:
+                logger.error(f"فشل حفظ الحالة ({len(ops)} عنصر): {e}")
+                # إعادة التغييرات غير المحفوظة دون الكتابة فوق ما هو أحدث منها
+                for item, value in dirty.items():
+                    self._dirty.setdefault(item, value)
+
+    @staticmethod
+    def _loads(raw: Dict[str, bytes]) -> dict:
+        return {key: pickle.loads(value) for key, value in raw.items()}
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {int(k): v for k, v in self._loads(await self.backend.load_all('user_data')).items()}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        value = await self.backend.load('bot_data', 'bot_data')
+        return pickle.loads(value) if value is not None else {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        raw = self._loads(await self.backend.load_all(f"conv:{name}"))
+        return {tuple(json.loads(k)): v for k, v in raw.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._mark(f"conv:{name}", _conv_key(key), new_state)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._mark('user_data', str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._mark('bot_data', 'bot_data', data)
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._mark('user_data', str(user_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._write_dirty()
+        await self.backend.close()
+
+
+def create_persistence(backend: str, sqlite_path: str, redis_url: str,
+                       update_interval: float = 5.0) -> Optional[StatePersistence]:
+    """إنشاء طبقة الحفظ حسب الإعدادات (sqlite أو redis أو none)"""
+    if backend == 'none':
+        return None
+    if backend == 'redis':
+        return StatePersistence(RedisBackend(redis_url), update_interval)
+    if backend == 'sqlite':
+        return StatePersistence(SQLiteBackend(sqlite_path), update_interval)
+    raise ValueError(f"PERSISTENCE_BACKEND غير معروف: {backend}")
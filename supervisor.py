@@ -0,0 +1,506 @@
+"""تشغيل البوت على عدة عمليات (BOT_MODE=supervisor): كل عامل يملك شريحة ثابتة من المستخدمين
+
+العملية الأمامية تستقبل webhook من Telegram وتوجه كل تحديث إلى العامل المالك لمستخدمه عبر
+Unix socket، فتبقى حالة المحادثة وملفات SQLite الخاصة بالمستخدم في عملية واحدة ولا تحتاج
+العمال أي تنسيق بينهم. المشرف يعيد تشغيل العامل المتوقف ويجمع حمل كل عامل ومقاييسه.
+
+بروتوكول الـ socket: إطارات بطول 4 بايت ثم المحتوى. الطلب يبدأ بحرف نوعه (U تحديث،
+S إحصاءات، M مقاييس) والرد إطار لكل طلب وبنفس الترتيب، أوله + للنجاح أو - للرفض المؤقت
+(الإيقاف؛ يرد المشرف 503 فيعيد Telegram الإرسال) أو ! لتحديث لا يمكن معالجته أبداً (يرد 200
+فيُسقطه Telegram بدلاً من إعادة إرساله إلى الأبد).
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import re
+import resource
+import signal
+import struct
+import time
+import zlib
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence
+
+import httpx
+from telegram import Update
+from telegram.ext import Application
+
+from http_server import HTTPServer, Request, Response
+from metrics import REGISTRY, Counter, Gauge, Registry
+from webhook_server import SECRET_HEADER, UpdateReceiver
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+UPDATE_FRAME = b'U'
+STATS_FRAME = b'S'
+METRICS_FRAME = b'M'
+OK = b'+'
+REJECTED = b'-'
+INVALID = b'!'
+
+# العامل الذي يعمل أكثر من هذا قبل توقفه يُعاد تشغيله فوراً؛ التوقف المتكرر يضاعف الانتظار
+STABLE_UPTIME = 60.0
+MAX_RESTART_DELAY = 30.0
+
+# مقاييس المشرف نفسه؛ مقاييس العمال تُجمع منهم مع وسم worker
+SUPERVISOR_REGISTRY = Registry()
+ROUTED = SUPERVISOR_REGISTRY.register(Counter(
+    'glovuni_supervisor_routed_total', 'Updates routed to each worker.', ['worker']))
+ROUTE_FAILURES = SUPERVISOR_REGISTRY.register(Counter(
+    'glovuni_supervisor_route_failures_total', 'Updates answered 503 because the owning worker was down.', ['worker']))
+RESTARTS = SUPERVISOR_REGISTRY.register(Counter(
+    'glovuni_supervisor_worker_restarts_total', 'Worker restarts after an unexpected exit.', ['worker']))
+INVALID_UPDATES = SUPERVISOR_REGISTRY.register(Counter(
+    'glovuni_supervisor_invalid_updates_total', 'Malformed updates dropped instead of routed.', ['worker']))
+WORKER_UP = SUPERVISOR_REGISTRY.register(Gauge(
+    'glovuni_supervisor_worker_up', 'Whether the supervisor is connected to the worker.', ['worker']))
+
+class InvalidUpdate(Exception):
+    """رفض العامل التحديث لأنه غير صالح؛ إعادة إرساله لن تفيد"""
+
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})? (.+)$')
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"إطار أكبر من المسموح: {length}")
+    return await reader.readexactly(length)
+
+
+def write_frame(writer: asyncio.StreamWriter, payload: bytes) -> None:
+    writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def route_user_id(data: dict) -> int:
+    """معرف المستخدم (أو المحادثة) صاحب التحديث أياً كان نوعه؛ 0 للتحديثات بلا مستخدم"""
+    for value in data.values():
+        if isinstance(value, dict):
+            for key in ('from', 'user', 'chat'):
+                owner = value.get(key)
+                if isinstance(owner, dict) and 'id' in owner:
+                    return owner['id']
+    return 0
+
+
+def shard_for(user_id: int, workers: int) -> int:
+    """العامل المالك للمستخدم؛ ثابت ما دام عدد العمال ثابتاً"""
+    return zlib.crc32(str(user_id).encode('ascii')) % workers
+
+
+def shard_path(path: str, index: int) -> str:
+    """bot_state.sqlite3 -> bot_state.worker2.sqlite3"""
+    root, extension = os.path.splitext(path)
+    return f"{root}.worker{index}{extension}"
+
+
+def merge_metrics(texts: Dict[int, str]) -> str:
+    """دمج مقاييس العمال بصيغة Prometheus مع وسم worker لكل عينة ووصف واحد لكل مقياس"""
+    families: Dict[str, tuple] = {}
+    for worker, text in texts.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# '):
+                parts = line.split(' ', 3)
+                family = parts[2]
+                headers = families.setdefault(family, ([], []))[0]
+                if line not in headers:
+                    headers.append(line)
+                continue
+            match = _SAMPLE_RE.match(line)
+            if match is None:
+                continue
+            name, labels, value = match.groups()
+            labels = f'worker="{worker}",{labels}' if labels else f'worker="{worker}"'
+            families.setdefault(family or name, ([], []))[1].append(f"{name}{{{labels}}} {value}")
+    lines = [line for headers, samples in families.values() for line in headers + samples]
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+class WorkerServer(UpdateReceiver):
+    """عامل: يستقبل تحديثات شريحته من المشرف عبر Unix socket بدلاً من HTTP"""
+
+    def __init__(self, application: Application, socket_path: str, drain_timeout: float = 25.0):
+        super().__init__(application, drain_timeout)
+        self.socket_path = socket_path
+        self.started = time.monotonic()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: set = set()
+
+    def stats(self) -> dict:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        lanes = getattr(self.application.update_processor, 'lanes', {})
+        return {
+            'pid': os.getpid(),
+            'received': self.received,
+            'queued': self.application.update_queue.qsize(),
+            'running': sum(lane.running for lane in lanes.values()),
+            'waiting': sum(lane.waiting for lane in lanes.values()),
+            'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 3),
+            'max_rss_mb': round(usage.ru_maxrss / 1024, 1),
+            'uptime_s': round(time.monotonic() - self.started, 1),
+        }
+
+    async def _reply(self, kind: bytes, body: bytes) -> bytes:
+        if kind == UPDATE_FRAME:
+            if self.draining:
+                return REJECTED + b'draining'
+            try:
+                update = Update.de_json(json.loads(body), self.application.bot)
+            except Exception as e:
+                # حقل بنوع خاطئ قد يرفع أي استثناء من de_json (AttributeError مثلاً)
+                logger.warning(f"تحديث غير صالح من المشرف: {e!r}")
+                return INVALID + str(e).encode('utf-8')
+            self.received += 1
+            await self.application.update_queue.put(update)
+            return OK
+        if kind == STATS_FRAME:
+            return OK + json.dumps(self.stats()).encode('utf-8')
+        if kind == METRICS_FRAME:
+            return OK + REGISTRY.render().encode('utf-8')
+        return REJECTED + b'unknown frame'
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                payload = await read_frame(reader)
+                try:
+                    reply = await self._reply(payload[:1], payload[1:])
+                except Exception as e:
+                    # خطأ في طلب واحد لا يقطع الاتصال ولا يُسقط بقية تحديثات الشريحة
+                    logger.exception(f"فشل معالجة طلب من المشرف: {e!r}")
+                    reply = REJECTED + str(e).encode('utf-8')
+                write_frame(writer, reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def start_transport(self) -> None:
+        # socket متبقٍ من عامل سابق توقف فجأة
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_connection, self.socket_path)
+        logger.info(f"العامل يستقبل التحديثات على {self.socket_path}")
+
+    async def stop_transport(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # إغلاق اتصال المشرف حتى يرد 503 على تحديثات هذه الشريحة أثناء الإيقاف
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def run_worker(application: Application, socket_path: str, drain_timeout: float = 25.0) -> None:
+    """تشغيل البوت كعامل تحت المشرف"""
+    asyncio.run(WorkerServer(application, socket_path, drain_timeout).serve())
+
+
+class WorkerProcess:
+    """عامل من جهة المشرف: العملية واتصال الـ socket بها وآخر حمل معروف"""
+
+    def __init__(self, index: int, command: Sequence[str], env: Dict[str, str], socket_path: str):
+        self.index = index
+        self.command = list(command)
+        self.env = env
+        self.socket_path = socket_path
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.load: dict = {}
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        # الردود تصل بنفس ترتيب الطلبات على الاتصال الواحد
+        self._pending: Deque[asyncio.Future] = deque()
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def label(self) -> str:
+        return str(self.index)
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def spawn(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.process = await asyncio.create_subprocess_exec(*self.command, env=self.env)
+        self.started_at = time.monotonic()
+        logger.info(f"بدأ العامل {self.index} (pid {self.process.pid})")
+
+    async def connect(self, timeout: float) -> bool:
+        """الاتصال بالعامل مع الانتظار حتى timeout إن كان ما زال يبدأ"""
+        async with self._connect_lock:
+            if self.connected:
+                return True
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() >= deadline:
+                        return False
+                    await asyncio.sleep(0.1)
+            self._read_task = asyncio.create_task(self._read_replies(self._reader))
+            WORKER_UP.set(1, worker=self.label)
+            return True
+
+    async def _read_replies(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                payload = await read_frame(reader)
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(payload)
+        except (asyncio.IncompleteReadError, ConnectionError, IndexError, ValueError):
+            pass
+        finally:
+            if self._reader is reader:
+                self.disconnect()
+
+    def disconnect(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        WORKER_UP.set(0, worker=self.label)
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(f"انقطع الاتصال بالعامل {self.index}"))
+
+    async def request(self, kind: bytes, body: bytes = b'', timeout: float = 5.0) -> bytes:
+        if not await self.connect(timeout):
+            raise ConnectionError(f"العامل {self.index} غير متاح")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        write_frame(self._writer, kind + body)
+        await self._writer.drain()
+        reply = await asyncio.wait_for(future, timeout)
+        if reply[:1] == INVALID:
+            raise InvalidUpdate(reply[1:].decode('utf-8', 'replace'))
+        if reply[:1] != OK:
+            raise ConnectionError(f"رفض العامل {self.index}: {reply[1:].decode('utf-8', 'replace')}")
+        return reply[1:]
+
+    async def close(self) -> None:
+        if self._read_task is not None:
+            self._read_task.cancel()
+            await asyncio.gather(self._read_task, return_exceptions=True)
+        self.disconnect()
+
+
+class Supervisor:
+    """العملية الأمامية: webhook واحد، وتوجيه كل مستخدم إلى عامله، وإعادة تشغيل العمال"""
+
+    def __init__(self, command: Sequence[str], workers: int, socket_dir: str,
+                 worker_env: Optional[Callable[[int], Dict[str, str]]] = None,
+                 listen: str = '0.0.0.0', port: int = 8443, url_path: str = '/telegram',
+                 secret_token: Optional[str] = None, webhook_url: Optional[str] = None,
+                 bot_token: Optional[str] = None, api_base_url: Optional[str] = None,
+                 route_timeout: float = 5.0, report_interval: float = 30.0, drain_timeout: float = 25.0,
+                 restart_delay: float = 1.0, max_body_size: int = 1024 * 1024):
+        self.socket_dir = socket_dir
+        self.url_path = '/' + url_path.lstrip('/')
+        self.secret_token = secret_token
+        self.webhook_url = webhook_url
+        self.bot_token = bot_token
+        self.api_base_url = api_base_url or 'https://api.telegram.org/bot'
+        self.route_timeout = route_timeout
+        self.report_interval = report_interval
+        self.drain_timeout = drain_timeout
+        self.restart_delay = restart_delay
+        self.draining = False
+        self.rejected = 0
+        self.workers: List[WorkerProcess] = []
+        for index in range(workers):
+            socket_path = os.path.join(socket_dir, f"worker-{index}.sock")
+            env = dict(os.environ, **(worker_env(index) if worker_env else {}),
+                       BOT_MODE='worker', WORKER_INDEX=str(index), WORKER_SOCKET=socket_path)
+            self.workers.append(WorkerProcess(index, command, env, socket_path))
+        self.server = HTTPServer(listen, port, max_body_size=max_body_size)
+        self.server.route('POST', self.url_path, self._handle_update)
+        self.server.route('GET', '/healthz', self._healthz)
+        self.server.route('GET', '/metrics', self._metrics)
+        self._stop_event: Optional[asyncio.Event] = None
+        self._last_report = {}
+
+    async def _handle_update(self, request: Request) -> Response:
+        if self.secret_token and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ''), self.secret_token
+        ):
+            self.rejected += 1
+            return Response.text('', 403)
+        if self.draining:
+            return Response.text('', 503)
+        try:
+            data = request.json()
+            user_id = route_user_id(data)
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"تحديث غير صالح: {e}")
+            return Response.text('', 400)
+        worker = self.workers[shard_for(user_id, len(self.workers))]
+        try:
+            # يُرد على Telegram بعد أن يضع العامل التحديث في طابوره؛ وإلا 503 فيعيد إرساله لاحقاً
+            await worker.request(UPDATE_FRAME, request.body, self.route_timeout)
+        except InvalidUpdate as e:
+            INVALID_UPDATES.inc(worker=worker.label)
+            logger.warning(f"أُسقط تحديث غير صالح: {e}")
+            return Response.text('')
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            ROUTE_FAILURES.inc(worker=worker.label)
+            logger.warning(f"تعذر توجيه تحديث إلى العامل {worker.index}: {e}")
+            return Response.text('', 503)
+        ROUTED.inc(worker=worker.label)
+        return Response.text('')
+
+    def _worker_status(self, worker: WorkerProcess) -> dict:
+        return {
+            'worker': worker.index,
+            'pid': worker.process.pid if worker.process is not None else None,
+            'up': worker.connected,
+            'restarts': worker.restarts,
+            'routed': int(ROUTED.value(worker=worker.label)),
+            'route_failures': int(ROUTE_FAILURES.value(worker=worker.label)),
+            **worker.load,
+        }
+
+    async def _healthz(self, request: Request) -> Response:
+        up = sum(worker.connected for worker in self.workers)
+        if self.draining:
+            status = 'draining'
+        else:
+            status = 'ok' if up == len(self.workers) else ('degraded' if up else 'starting')
+        return Response.json({
+            'status': status,
+            'rejected': self.rejected,
+            'workers': [self._worker_status(worker) for worker in self.workers],
+        }, status=200 if status in ('ok', 'degraded') else 503)
+
+    async def _metrics(self, request: Request) -> Response:
+        replies = await asyncio.gather(
+            *(worker.request(METRICS_FRAME, timeout=2.0) for worker in self.workers), return_exceptions=True)
+        texts = {worker.index: reply.decode('utf-8') for worker, reply in zip(self.workers, replies)
+                 if isinstance(reply, bytes)}
+        body = SUPERVISOR_REGISTRY.render() + merge_metrics(texts)
+        return Response(body=body.encode('utf-8'), content_type='text/plain; version=0.0.4')
+
+    async def _monitor(self, worker: WorkerProcess) -> None:
+        """تشغيل العامل وإعادة تشغيله كلما توقف حتى بدء الإيقاف"""
+        failures = 0
+        while not self.draining:
+            await worker.spawn()
+            code = await worker.process.wait()
+            await worker.close()
+            if self.draining:
+                break
+            uptime = time.monotonic() - worker.started_at
+            failures = failures + 1 if uptime < STABLE_UPTIME else 1
+            delay = min(self.restart_delay * 2 ** (failures - 1), MAX_RESTART_DELAY)
+            worker.restarts += 1
+            RESTARTS.inc(worker=worker.label)
+            logger.error(f"توقف العامل {worker.index} (رمز {code}) بعد {uptime:.0f} ثانية؛ "
+                         f"إعادة التشغيل بعد {delay:.1f} ثانية")
+            await asyncio.sleep(delay)
+
+    async def collect_load(self) -> None:
+        """آخر حمل لكل عامل: تحديثات ونسبة المعالج في الثانية منذ القراءة السابقة"""
+        now = time.monotonic()
+        for worker in self.workers:
+            try:
+                stats = json.loads(await worker.request(STATS_FRAME, timeout=2.0))
+            except (ConnectionError, asyncio.TimeoutError, ValueError):
+                worker.load = {}
+                continue
+            previous_time, previous = self._last_report.get(worker.index, (None, None))
+            if previous is not None and previous['pid'] == stats['pid'] and now > previous_time:
+                elapsed = now - previous_time
+                stats['updates_per_s'] = round((stats['received'] - previous['received']) / elapsed, 1)
+                stats['cpu_percent'] = round((stats['cpu_seconds'] - previous['cpu_seconds']) / elapsed * 100, 1)
+            self._last_report[worker.index] = (now, stats)
+            worker.load = stats
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.report_interval)
+            await self.collect_load()
+            logger.info("حمل العمال: " + '، '.join(
+                f"{worker.index}: {worker.load.get('updates_per_s', 0)} تحديث/ث "
+                f"{worker.load.get('cpu_percent', 0)}% معالج، {worker.load.get('queued', 0)} بالانتظار"
+                if worker.load else f"{worker.index}: متوقف"
+                for worker in self.workers
+            ))
+
+    async def _set_webhook(self) -> None:
+        async with httpx.AsyncClient() as client:
+            response = await client.post(f"{self.api_base_url}{self.bot_token}/setWebhook", json={
+                'url': self.webhook_url,
+                'secret_token': self.secret_token,
+                'allowed_updates': Update.ALL_TYPES,
+            })
+            response.raise_for_status()
+        logger.info(f"تم تسجيل webhook: {self.webhook_url}")
+
+    def request_stop(self) -> None:
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    async def serve(self) -> None:
+        """تشغيل العمال والخادم حتى SIGTERM، ثم إيقاف العمال بانتظار إنهاء تحديثاتهم الجارية"""
+        self._stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        os.makedirs(self.socket_dir, exist_ok=True)
+        monitors = [asyncio.create_task(self._monitor(worker)) for worker in self.workers]
+        await self.server.start()
+        if self.webhook_url:
+            await self._set_webhook()
+        reporter = asyncio.create_task(self._report())
+        logger.info(f"المشرف يوزع التحديثات على {len(self.workers)} عامل")
+
+        try:
+            await self._stop_event.wait()
+        finally:
+            logger.info("إيقاف المشرف: رفض التحديثات الجديدة وإيقاف العمال")
+            self.draining = True
+            await self.server.stop()
+            reporter.cancel()
+            processes = [worker.process for worker in self.workers
+                         if worker.process is not None and worker.process.returncode is None]
+            for process in processes:
+                process.send_signal(signal.SIGTERM)
+            if processes:
+                _, running = await asyncio.wait([asyncio.ensure_future(p.wait()) for p in processes],
+                                                timeout=self.drain_timeout + 5)
+                if running:
+                    logger.warning(f"{len(running)} عامل لم يتوقف في المهلة؛ إنهاء قسري")
+                    for process in processes:
+                        if process.returncode is None:
+                            process.kill()
+            await asyncio.gather(*monitors, reporter, return_exceptions=True)
+            for worker in self.workers:
+                await worker.close()
+            logger.info("تم إيقاف المشرف")
+
+
+def run_supervisor(command: Sequence[str], workers: int, socket_dir: str, **kwargs) -> None:
+    asyncio.run(Supervisor(command, workers, socket_dir, **kwargs).serve())
@@ -0,0 +1,298 @@
+"""نصوص الرسائل ولوحات الأزرار مبنية مرة واحدة عند التشغيل بدلاً من إعادة بنائها مع كل تحديث"""
+from string import Formatter
+from typing import Dict, Sequence, Tuple, Union
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.helpers import escape_markdown
+
+
+class Template:
+    """نص ثابت بخانات صغيرة للبيانات الخاصة بكل مستخدم
+
+    يُحلل النص مرة واحدة إلى أجزاء ثابتة وأسماء حقول؛ render يدمجها فقط.
+    قيم الخانات تُهرّب لـ Markdown حتى لا يكسر اسم مثل "ali_99" تنسيق الرسالة.
+    """
+
+    __slots__ = ('text', '_parts', 'markdown')
+
+    def __init__(self, text: str, markdown: bool = True):
+        self.text = text
+        self.markdown = markdown
+        self._parts: Tuple[Tuple[str, str], ...] = tuple(
+            (literal, field or '') for literal, field, _, _ in Formatter().parse(text)
+        )
+
+    def render(self, **values) -> str:
+        out = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field:
+                value = str(values[field])
+                out.append(escape_markdown(value) if self.markdown else value)
+        return ''.join(out)
+
+
+class CachedKeyboard(InlineKeyboardMarkup):
+    """لوحة أزرار ثابتة يُحسب شكلها المُرسل (to_dict) مرة واحدة فقط"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self._unfrozen():
+            self._serialized = super().to_dict()
+
+    def to_dict(self, recursive: bool = True) -> dict:
+        return self._serialized
+
+
+Button = Union[Tuple[str, str], InlineKeyboardButton]
+
+
+def keyboard(*rows: Sequence[Button]) -> CachedKeyboard:
+    """بناء لوحة أزرار من صفوف (النص، callback_data) أو أزرار جاهزة"""
+    return CachedKeyboard([
+        [b if isinstance(b, InlineKeyboardButton) else InlineKeyboardButton(b[0], callback_data=b[1]) for b in row]
+        for row in rows
+    ])
+
+
+# الأزرار المشتركة
+INSTAGRAM_BUTTON = InlineKeyboardButton("📱 تابعنا على إنستقرام", url="https://www.instagram.com/glovuni")
+BACK = ("👈 العودة", "back_to_menu")
+ASK = ("❓ اسأل سؤال", "ask_question")
+SERVICES = ("📋 معلومات عن الخدمات", "services")
+
+MAIN_MENU_KEYBOARD = keyboard(
+    [INSTAGRAM_BUTTON],
+    [("✅ تحقق من المتابعة", "verify_instagram")],
+    [ASK],
+    [SERVICES],
+)
+VERIFY_KEYBOARD = keyboard([("✅ نعم، أنا متابع", "start_application")], [BACK])
+FIELD_KEYBOARD = keyboard(
+    [("🔬 العلوم والهندسة", "field_science")],
+    [("📊 الاقتصاد والإدارة", "field_business")],
+    [("🎓 العلوم الإنسانية", "field_humanities")],
+    [("💻 تكنولوجيا المعلومات", "field_it")],
+)
+SUBMITTED_KEYBOARD = keyboard([ASK], [SERVICES])
+UPLOAD_KEYBOARD = keyboard([("✅ انتهيت من رفع الوثائق", "done_uploads")], [("⏭ تخطي", "skip_uploads")])
+CONFIRM_KEYBOARD = keyboard([("📤 تأكيد وإرسال الطلب", "confirm_submission")], [("📎 رفع وثائق أخرى", "upload_more")])
+BACK_KEYBOARD = keyboard([BACK])
+ANSWER_KEYBOARD = keyboard([("❓ سؤال آخر", "ask_question")], [SERVICES], [BACK])
+SERVICES_KEYBOARD = keyboard([("📝 ابدأ التقديم", "start_application")], [ASK], [BACK])
+
+FIELD_NAMES: Dict[str, str] = {
+    'field_science': 'العلوم والهندسة',
+    'field_business': 'الاقتصاد والإدارة',
+    'field_humanities': 'العلوم الإنسانية',
+    'field_it': 'تكنولوجيا المعلومات',
+}
+
+WELCOME = Template("""
+🎓 **أهلاً بك يا {first_name} في Glovuni!**
+
+نحن متخصصون في مساعدة الطلاب الدوليين للدراسة في أفضل الجامعات الألمانية والعالمية.
+
+**للاستفادة من خدماتنا:**
+1️⃣ تابع صفحتنا على Instagram
+2️⃣ تحقق من المتابعة
+3️⃣ ملء استمارة التقديم
+
+دعنا نبدأ! 🚀
+""")
+
+VERIFY_TEXT = """
+✅ **شكراً لمتابعتك لنا على Instagram!**
+
+تأكد من أنك متابع لصفحتنا @glovuni للحصول على آخر المستجدات والعروض الخاصة.
+
+الآن يمكنك متابعة عملية التقديم معنا! 🎓
+"""
+
+APPLICATION_START_TEXT = """
+📝 **شكراً لتحقق من المتابعة!**
+
+الآن سننقل معك خطوة بخطوة لملء استمارة التقديم.
+
+**الخطوة 1️⃣: ما اسمك الكامل؟**
+"""
+
+# ردود خطوات الاستمارة تُرسل بدون parse_mode لذلك لا تُهرّب قيمها
+NAME_RECEIVED = Template("شكراً {name}! 👋\n\n**الخطوة 2️⃣: ما بريدك الإلكتروني؟**", markdown=False)
+EMAIL_RECEIVED = "ممتاز! ✅\n\n**الخطوة 3️⃣: ما رقم هاتفك؟**"
+PHONE_RECEIVED = "رائع! 🎯\n\n**الخطوة 4️⃣: ما مجال دراستك المفضل؟**"
+
+SUBMISSION_SUMMARY = Template("""
+✅ **تم حفظ بيانات التقديم:**
+
+👤 **الاسم:** {name}
+📧 **البريد:** {email}
+📱 **الهاتف:** {phone}
+🎓 **المجال:** {field}
+""")
+
+UPLOAD_PROMPT_TEXT = """
+**الخطوة 5️⃣: ارفع وثائقك**
+
+أرسل كشف الدرجات والشهادات وشهادة اللغة كملفات PDF أو صور (JPG/PNG)،
+ثم اضغط "انتهيت". يمكنك التخطي وإرسالها لاحقاً لفريقنا.
+"""
+
+UPLOAD_MORE_TEXT = "📎 أرسل الوثائق الإضافية ثم اضغط \"انتهيت\"."
+
+DOCUMENT_RECEIVED = Template("📥 تم استلام {file_name}، جارٍ المعالجة...", markdown=False)
+
+CONFIRM_TEXT = Template("""
+📋 **مراجعة الطلب قبل الإرسال**
+
+👤 **الاسم:** {name}
+🎓 **المجال:** {field}
+
+📎 **الوثائق:**
+{documents}
+""")
+
+NO_DOCUMENTS_TEXT = "لا توجد وثائق مرفقة"
+
+SUBMITTED_TEXT = """
+**تم إرسال بيانات التقديم إلى فريقنا للمراجعة.**
+
+شكراً لاختيارك Glovuni! 🎉
+سيتواصل معك فريقنا قريباً لمتابعة الخطوات التالية.
+"""
+
+ASK_QUESTION_TEXT = """
+❓ **اسأل أي سؤال عن الدراسة بالخارج**
+
+يمكنك السؤال عن:
+- 🏫 الجامعات والبرامج
+- 💰 التكاليف والمنح
+- 📝 متطلبات التقديم
+- 🌍 الدول والمدن
+- 📚 التخصصات والمسارات الدراسية
+
+اكتب سؤالك الآن:
+"""
+
+QUESTION_ERROR_TEXT = "عذراً، حدث خطأ في معالجة سؤالك. يرجى المحاولة مرة أخرى."
+
+SERVICES_TEXT = """
+📋 **خدمات Glovuni:**
+
+1️⃣ **استشارات التقديم**
+   - تقييم ملفك الأكاديمي
+   - اختيار أفضل الجامعات
+   - استراتيجية التقديم
+
+2️⃣ **إعداد الملفات**
+   - ترجمة الوثائق
+   - كتابة خطاب الدافع
+   - إعداد السيرة الذاتية
+
+3️⃣ **متابعة الطلب**
+   - الرد على استفسارات الجامعات
+   - متابعة حالة الطلب
+   - دعم مستمر
+
+4️⃣ **دعم اللغة**
+   - تحضير اختبارات اللغة
+   - دروس تقوية
+   - نصائح للنجاح
+
+5️⃣ **المنح الدراسية**
+   - البحث عن المنح المتاحة
+   - مساعدة في التقديم
+   - متابعة النتائج
+
+🎯 **هدفنا:** مساعدتك في تحقيق حلمك الأكاديمي! 🌟
+"""
+
+MAIN_MENU_TEXT = """
+🎓 **قائمة Glovuni الرئيسية**
+
+اختر ما تريد:
+"""
+
+# نصوص الأوامر في /help بترتيب ظهورها؛ تظهر فقط أوامر الميزات المفعلة
+COMMAND_HELP: Dict[str, str] = {
+    'start': 'بدء المحادثة',
+    'help': 'عرض هذه المساعدة',
+    'about': 'معلومات عن البوت',
+    'services': 'معلومات الخدمات',
+    'contact': 'معلومات التواصل',
+    'search': 'البحث عن برنامج أو جامعة (مثال: /search ماجستير هندسة بالإنجليزي)',
+    'follow': 'تذكير بمواعيد التقديم لجامعة أو برنامج',
+    'following': 'الجامعات والبرامج التي تتابعها',
+    'unfollow': 'إيقاف التذكيرات',
+}
+
+HELP_TEXT = """
+🆘 **مساعدة Glovuni Bot**
+
+الأوامر المتاحة:
+{commands}
+
+📱 تابعنا على Instagram: @glovuni
+💬 أي استفسار؟ اسأل الآن!
+"""
+
+
+def help_text(commands: Sequence[str]) -> str:
+    """نص /help لأوامر الميزات المفعلة (يُبنى مرة واحدة عند إنشاء التطبيق)"""
+    lines = [f"/{name} - {text}" for name, text in COMMAND_HELP.items() if name in commands]
+    return HELP_TEXT.format(commands='\n'.join(lines))
+
+
+CONTACT_TEXT = """
+📞 **معلومات التواصل:**
+
+📱 Instagram: @glovuni
+🌐 Website: www.glovuni.com
+📧 Email: contact@glovuni.com
+
+🕐 ساعات العمل: 24/7
+💬 نحن هنا لمساعدتك!
+"""
+
+SEARCH_USAGE_TEXT = """
+🔎 **البحث عن برنامج أو جامعة**
+
+اكتب ما تبحث عنه بعد الأمر، مثلاً:
+/search ماجستير ذكاء اصطناعي مجاني
+/search cheap engineering master's in English
+/search بكالوريوس هندسة أقل من 3000
+"""
+
+# نتائج البحث تُرسل بدون parse_mode لأن أسماء البرامج قد تحوي رموز Markdown
+SEARCH_RESULTS_HEADER = Template("🔎 نتائج البحث{filters}:\n\n", markdown=False)
+SEARCH_NO_RESULTS = Template("لم نجد برامج مطابقة (المرشحات: {filters}). جرّب صياغة أخرى أو اسأل فريقنا مباشرة.", markdown=False)
+
+FOLLOW_USAGE_TEXT = """
+⏰ **تذكير بمواعيد التقديم**
+
+تابع جامعة أو برنامجاً وسنذكرك قبل آخر موعد للتقديم بـ 30 و 7 أيام ويوم واحد:
+/follow TUM
+/follow الذكاء الاصطناعي
+"""
+
+# ردود الاشتراكات تُرسل بدون parse_mode
+FOLLOW_NOT_FOUND = Template("لم نجد جامعة أو برنامجاً باسم \"{text}\". جرّب /search للبحث أولاً.", markdown=False)
+FOLLOWED = Template("✅ ستصلك تذكيرات مواعيد التقديم لـ {label}.\nلإيقافها: /unfollow", markdown=False)
+UNFOLLOWED = Template("تم إيقاف تذكيرات {label}.", markdown=False)
+NOT_FOLLOWING = Template("أنت لا تتابع \"{text}\". اكتب /following لعرض اشتراكاتك.", markdown=False)
+UNFOLLOWED_ALL_TEXT = "تم إيقاف كل تذكيرات المواعيد."
+FOLLOWING_LIST = Template("⏰ تتابع مواعيد التقديم لـ:\n{labels}\n\nلإيقاف أحدها: /unfollow الاسم", markdown=False)
+
+BUSY_TEXT = "⏳ هناك ضغط كبير حالياً، يرجى المحاولة بعد قليل."
+UNAVAILABLE_TEXT = "هذه الخدمة غير متاحة حالياً."
+
+# وضع الأسئلة المخفف عند تعطل النموذج أو بطئه (قاطع الدائرة مفتوح)؛ يُرسل بدون parse_mode
+QA_DEGRADED = Template("⚠️ المساعد الذكي غير متاح مؤقتاً، هذه أقرب معلومة من قاعدة معرفتنا:\n\n{excerpt}", markdown=False)
+QA_UNAVAILABLE_TEXT = "⚠️ المساعد الذكي غير متاح مؤقتاً. جرّب /search للبحث عن البرامج أو تواصل مع فريقنا عبر /contact."
+
+# الوضع الخفيف (FEATURES=echo)؛ يُرسل بدون parse_mode
+ECHO_WELCOME = Template("مرحباً {first_name}! 👋\nأنا بوت مساعد جامعة جلوفيوني الذكي.\nكيف يمكنني مساعدتك؟", markdown=False)
+ECHO_REPLY = Template("شكراً على رسالتك: {text}\nسيتم معالجتها قريباً!", markdown=False)
+ABOUT_TEXT = """🤖 بوت مساعد جامعة جلوفيوني الذكي
+الإصدار: 1.0
+مطور بواسطة: فريق جلوفيوني"""
@@ -0,0 +1,194 @@
+"""تسجيل تحديثات Telegram الحقيقية بعد إخفاء هوية أصحابها لإعادة تشغيلها لاحقاً (replay.py)
+
+السجل ملف JSON Lines يُضاف إليه فقط؛ كل سطر {"t": وقت الاستلام، "u": التحديث}. يُحفظ من
+التحديث ما تستخدمه المعالجات فقط، والمعرفات تُستبدل بقيم مشتقة من مفتاح سري (نفس المستخدم
+يحمل نفس المعرف المجهول عبر إعادة التشغيل إذا ثُبّت المفتاح)، والأسماء والبريد والهواتف
+ومعرفات الملفات تُستبدل بقيم صالحة لنفس الخطوة في الاستمارة.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from typing import Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(\.[\w-]+)+')
+PHONE_RE = re.compile(r'\+?\d[\d\s()-]{6,}\d')
+
+# قيم user_data التي أدخلها الطالب في الاستمارة؛ النص المطابق لها يُستبدل بالكامل
+FORM_FIELDS = ('name', 'email', 'phone')
+
+_MESSAGE_FIELDS = ('message_id', 'date', 'text', 'entities')
+_DOCUMENT_FIELDS = ('mime_type', 'file_size')
+_PHOTO_FIELDS = ('width', 'height', 'file_size')
+
+
+class UpdateAnonymizer:
+    """تحويل تحديث (dict كما من Bot API) إلى نسخة مختصرة بلا بيانات شخصية"""
+
+    def __init__(self, salt: bytes):
+        self.salt = salt
+
+    def _digest(self, value) -> int:
+        digest = hashlib.blake2b(str(value).encode('utf-8'), key=self.salt, digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def user_id(self, value: int) -> int:
+        """معرف مجهول ثابت لنفس المستخدم مع الحفاظ على الإشارة (المجموعات سالبة)"""
+        anonymous = 10 ** 9 + self._digest(value) % (9 * 10 ** 11)
+        return -anonymous if value < 0 else anonymous
+
+    def file_id(self, value: str) -> str:
+        return f"f{self._digest(value):016x}"
+
+    @staticmethod
+    def placeholders(anonymous_id: int) -> dict:
+        """قيم الاستمارة البديلة لمستخدم مجهول (صالحة لنفس الخطوات عند إعادة التشغيل)"""
+        n = abs(anonymous_id) % 10 ** 8
+        return {
+            'name': f"طالب {n}",
+            'email': f"student{n}@example.com",
+            'phone': f"+9627{n:08d}",
+        }
+
+    def _user(self, user: dict) -> dict:
+        if user.get('is_bot'):
+            return {'id': user['id'], 'is_bot': True, 'first_name': user.get('first_name', '')}
+        anonymous = {'id': self.user_id(user['id']), 'is_bot': user.get('is_bot', False), 'first_name': 'طالب'}
+        if user.get('language_code'):
+            anonymous['language_code'] = user['language_code']
+        return anonymous
+
+    def _chat(self, chat: dict) -> dict:
+        return {'id': self.user_id(chat['id']), 'type': chat.get('type', 'private')}
+
+    def _text(self, text: str, sender: Optional[int], user_data: Optional[dict]) -> str:
+        values = self.placeholders(sender or 0)
+        if user_data:
+            for field in FORM_FIELDS:
+                if user_data.get(field) == text:
+                    return values[field]
+        # الهواتف أولاً حتى لا تُطابق أرقام البريد البديل
+        text = PHONE_RE.sub(values['phone'], text)
+        return EMAIL_RE.sub(values['email'], text)
+
+    def _message(self, message: dict, user_data: Optional[dict]) -> dict:
+        result = {key: message[key] for key in _MESSAGE_FIELDS if key in message}
+        result['chat'] = self._chat(message['chat'])
+        sender = None
+        if 'from' in message:
+            result['from'] = self._user(message['from'])
+            sender = result['from']['id']
+        if 'text' in result:
+            if result.get('from', {}).get('is_bot'):
+                # نص رسالة البوت تحت الأزرار قد يحتوي اسم الطالب ولا تحتاجه المعالجات
+                del result['text']
+                result.pop('entities', None)
+            else:
+                result['text'] = self._text(result['text'], sender, user_data)
+                if 'entities' in result:
+                    # الإزاحات قد لا تطابق النص بعد الاستبدال؛ يكفي كيان الأمر في البداية
+                    result['entities'] = [e for e in result['entities'] if e.get('type') == 'bot_command'
+                                          and e.get('offset') == 0]
+                    if not result['entities']:
+                        del result['entities']
+        if 'document' in message:
+            document = message['document']
+            _, extension = os.path.splitext(document.get('file_name') or '')
+            file_id = self.file_id(document['file_unique_id'])
+            result['document'] = {
+                'file_id': file_id,
+                'file_unique_id': file_id,
+                'file_name': f"document{extension.lower()}",
+                **{key: document[key] for key in _DOCUMENT_FIELDS if key in document},
+            }
+        if 'photo' in message:
+            result['photo'] = [
+                {'file_id': self.file_id(size['file_unique_id']), 'file_unique_id': self.file_id(size['file_unique_id']),
+                 **{key: size[key] for key in _PHOTO_FIELDS if key in size}}
+                for size in message['photo']
+            ]
+        return result
+
+    def anonymize(self, data: dict, user_data: Optional[dict] = None) -> Optional[dict]:
+        """None لأنواع التحديثات التي لا يعالجها البوت"""
+        result = {'update_id': data['update_id']}
+        if 'message' in data:
+            result['message'] = self._message(data['message'], user_data)
+        elif 'callback_query' in data:
+            query = data['callback_query']
+            result['callback_query'] = {
+                'id': str(self._digest(query['id'])),
+                'chat_instance': str(self._digest(query.get('chat_instance', ''))),
+                'from': self._user(query['from']),
+            }
+            if 'data' in query:
+                result['callback_query']['data'] = query['data']
+            if 'message' in query:
+                result['callback_query']['message'] = self._message(query['message'], None)
+        else:
+            return None
+        return result
+
+
+class UpdateRecorder:
+    """إضافة التحديثات المجهولة إلى ملف السجل
+
+    يُسجل كمعالج في آخر مجموعة حتى يرى user_data بعد معالجة التحديث (فيعرف أن النص كان
+    اسماً أو بريداً في الاستمارة). كل سطر يُكتب باستدعاء write واحد على ملف O_APPEND
+    فلا تتداخل الأسطر إذا كتبت عدة عمليات في نفس الملف.
+    """
+
+    def __init__(self, path: str, salt: str = ''):
+        self.path = path
+        if not salt:
+            logger.warning("RECORD_UPDATES_SALT غير محدد: معرفات المستخدمين المجهولة تتغير مع كل تشغيل")
+            salt = secrets.token_hex(16)
+        self.anonymizer = UpdateAnonymizer(salt.encode('utf-8'))
+        self.recorded = 0
+        self._fd: Optional[int] = None
+
+    def write(self, data: dict, user_data: Optional[dict] = None, timestamp: Optional[float] = None) -> bool:
+        update = self.anonymizer.anonymize(data, user_data)
+        if update is None:
+            return False
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        record = {'t': round(time.time() if timestamp is None else timestamp, 3), 'u': update}
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        os.write(self._fd, line.encode('utf-8'))
+        self.recorded += 1
+        return True
+
+    async def record(self, update, context) -> None:
+        """معالج TypeHandler"""
+        try:
+            self.write(update.to_dict(), context.user_data)
+        except (OSError, KeyError, TypeError) as e:
+            logger.warning(f"تعذر تسجيل التحديث {getattr(update, 'update_id', '?')}: {e}")
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def read_log(path: str) -> Iterator[Tuple[float, dict]]:
+    """(وقت الاستلام، التحديث) لكل سطر؛ السطر الأخير غير المكتمل (توقف أثناء الكتابة) يُتجاهل"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            yield record['t'], record['u']
+
+
+def update_user_id(update: dict) -> int:
+    """معرف المستخدم صاحب التحديث (لتقسيم السجل وتجميع الردود)"""
+    body = update.get('message') or update.get('callback_query') or {}
+    return (body.get('from') or body.get('chat') or {}).get('id', 0)
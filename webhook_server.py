@@ -0,0 +1,155 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+import sys
+from typing import Optional
+
+import httpx
+from telegram import Update
+from telegram.ext import Application
+
+from http_server import HTTPServer, Request, Response
+from metrics import metrics_endpoint
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+
+class UpdateReceiver:
+    """دورة حياة التطبيق المشتركة لكل طرق استقبال التحديثات: التشغيل ثم الإيقاف التدريجي عند SIGTERM
+
+    الصنف الفرعي يعرّف start_transport و stop_transport ويضع التحديثات في application.update_queue.
+    """
+
+    def __init__(self, application: Application, drain_timeout: float = 25.0):
+        self.application = application
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.received = 0
+        self._stop_event: Optional[asyncio.Event] = None
+
+    async def start_transport(self) -> None:
+        raise NotImplementedError
+
+    async def stop_transport(self) -> None:
+        raise NotImplementedError
+
+    def request_stop(self) -> None:
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    async def serve(self) -> None:
+        """تشغيل التطبيق والخادم حتى وصول SIGTERM/SIGINT ثم إنهاء التحديثات الجارية"""
+        self._stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        application = self.application
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await self.start_transport()
+
+        try:
+            await self._stop_event.wait()
+        finally:
+            logger.info("بدء الإيقاف التدريجي: رفض التحديثات الجديدة وإنهاء الجارية")
+            self.draining = True
+            await self.stop_transport()
+            try:
+                await asyncio.wait_for(application.stop(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("انتهت مهلة إنهاء التحديثات الجارية")
+            if application.post_stop:
+                await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+            logger.info("تم إيقاف البوت")
+
+
+class WebhookServer(UpdateReceiver):
+    """استقبال تحديثات Telegram عبر webhook بدلاً من long polling"""
+
+    def __init__(self, application: Application, listen: str = '0.0.0.0', port: int = 8443,
+                 url_path: str = '/telegram', secret_token: Optional[str] = None,
+                 webhook_url: Optional[str] = None, drain_timeout: float = 25.0,
+                 max_body_size: int = 1024 * 1024):
+        super().__init__(application, drain_timeout)
+        self.url_path = '/' + url_path.lstrip('/')
+        self.secret_token = secret_token
+        self.webhook_url = webhook_url
+        self.rejected = 0
+        self.server = HTTPServer(listen, port, max_body_size=max_body_size)
+        self.server.route('POST', self.url_path, self._handle_update)
+        self.server.route('GET', '/healthz', self._healthz)
+        self.server.route('GET', '/metrics', metrics_endpoint)
+
+    async def _handle_update(self, request: Request) -> Response:
+        if self.secret_token and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ''), self.secret_token
+        ):
+            self.rejected += 1
+            return Response.text('', 403)
+        if self.draining:
+            # Telegram يعيد إرسال التحديث لاحقاً (أو إلى نسخة أخرى خلف موزع الحمل)
+            return Response.text('', 503)
+        try:
+            update = Update.de_json(request.json(), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"تحديث غير صالح: {e}")
+            return Response.text('', 400)
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return Response.text('')
+
+    async def _healthz(self, request: Request) -> Response:
+        status = 503 if self.draining or not self.application.running else 200
+        return Response.json({
+            'status': 'draining' if self.draining else ('ok' if status == 200 else 'starting'),
+            'pending_updates': self.application.update_queue.qsize(),
+            'received': self.received,
+            'rejected': self.rejected,
+        }, status=status)
+
+    async def start_transport(self) -> None:
+        await self.server.start()
+        if self.webhook_url:
+            await self.application.bot.set_webhook(
+                self.webhook_url,
+                secret_token=self.secret_token,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logger.info(f"تم تسجيل webhook: {self.webhook_url}")
+
+    async def stop_transport(self) -> None:
+        await self.server.stop()
+
+
+def run_webhook(application: Application, **kwargs) -> None:
+    """تشغيل البوت بوضع webhook (بديل run_polling)"""
+    asyncio.run(WebhookServer(application, **kwargs).serve())
+
+
+async def post_updates(url: str, path: str, secret_token: Optional[str] = None) -> None:
+    """إرسال تحديثات مسجلة (سطر JSON لكل تحديث) إلى خادم webhook محلي"""
+    headers = {SECRET_HEADER: secret_token} if secret_token else {}
+    async with httpx.AsyncClient() as client:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    response = await client.post(url, json=json.loads(line), headers=headers)
+                    print(response.status_code)
+
+
+if __name__ == '__main__':
+    # مثال: python webhook_server.py http://127.0.0.1:8443/telegram updates.jsonl [secret]
+    asyncio.run(post_updates(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None))